@@ -2,6 +2,7 @@
 
 pytest_plugins = [
     # Plugins
+    'pytest_plugins.command_stats',
     'pytest_plugins.disable_rp_params',
     'pytest_plugins.fixture_markers',
     'pytest_plugins.infra_dependent_markers',
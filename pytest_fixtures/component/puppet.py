@@ -42,7 +42,9 @@ enable_capsule_cmd = InstallerCommand(
 def session_puppet_enabled_sat(session_satellite_host):
     """Satellite with enabled puppet plugin"""
     session_satellite_host.register_to_dogfood()
-    result = session_satellite_host.execute(enable_satellite_cmd.get_command(), timeout='20m')
+    result = session_satellite_host.execute_stream(
+        enable_satellite_cmd.get_command(), timeout='20m'
+    )
     assert result.status == 0
     session_satellite_host.execute('hammer -r')  # workaround for BZ#2039696
     yield session_satellite_host
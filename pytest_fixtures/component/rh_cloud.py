@@ -6,6 +6,7 @@ from robottelo.constants import DEFAULT_SUBSCRIPTION_NAME
 from robottelo.constants import DISTRO_RHEL7
 from robottelo.constants import DISTRO_RHEL8
 from robottelo.helpers import file_downloader
+from robottelo.hosts import ContentHost
 
 
 @pytest.fixture(scope='module')
@@ -70,7 +71,10 @@ def organization_ak_setup(rhcloud_sat_host, rhcloud_manifest_org):
 def rhcloud_registered_hosts(organization_ak_setup, content_hosts, rhcloud_sat_host):
     """Fixture that registers content hosts to Satellite and Insights."""
     org, ak = organization_ak_setup
-    for vm in content_hosts:
+
+    # only the satellite hostname and urls are used, no command is run on the satellite
+    # by the host threads
+    def register(vm):
         vm.configure_rhai_client(
             satellite=rhcloud_sat_host,
             activation_key=ak.name,
@@ -78,6 +82,8 @@ def rhcloud_registered_hosts(organization_ak_setup, content_hosts, rhcloud_sat_h
             rhel_distro=DISTRO_RHEL7,
         )
         assert vm.subscribed
+
+    ContentHost.fan_out(content_hosts, register, fail_fast=True)
     return content_hosts
 
 
@@ -4,6 +4,8 @@ This module is to define pytest functions for content hosts
 The functions in this module are read in the pytest_plugins/fixture_markers.py module
 All functions in this module will be treated as fixtures that apply the contenthost mark
 """
+from contextlib import contextmanager
+
 import pytest
 from broker import VMBroker
 from fauxfactory import gen_string
@@ -11,6 +13,7 @@ from nailgun import entities
 
 from robottelo import constants
 from robottelo.config import settings
+from robottelo.host_pool import ContentHostPools
 from robottelo.hosts import ContentHost
 
 
@@ -34,19 +37,64 @@ def host_conf(request):
     return conf
 
 
+# function-level fixtures providing their hosts from the warm pools
+pooled_fixtures = (
+    'rhel_contenthost',
+    'rhel6_contenthost',
+    'rhel7_contenthost',
+    'rhel8_contenthost',
+)
+
+
+@pytest.fixture(scope='session')
+def contenthost_pools(request):
+    """The warm pools of the function-level content hosts, when
+    ``settings.content_host.pool_size`` is set
+
+    The pools planned by ``pytest_plugins.fixture_markers`` at the end of the collection
+    are used when there are some.
+    """
+    planned = getattr(request.config, '_contenthost_pools', None)
+    pools = planned or ContentHostPools(
+        settings.content_host.pool_size,
+        max_idle=settings.content_host.pool_max_idle,
+        recycle=settings.content_host.pool_recycle,
+    )
+    yield pools
+    if planned is None:
+        # the planned pools are closed at the end of the session by fixture_markers
+        pools.close()
+
+
+@contextmanager
+def pooled_contenthost(request, pools):
+    """Provide a content host from the warm pool of its configuration, or checked out
+    when requested if the pools are disabled"""
+    if not pools.size:
+        with VMBroker(**host_conf(request), host_classes={'host': ContentHost}) as host:
+            yield host
+        return
+    pool = pools.get(host_conf(request))
+    host = pool.acquire()
+    try:
+        yield host
+    finally:
+        pool.release(host)
+
+
 @pytest.fixture
-def rhel_contenthost(request):
+def rhel_contenthost(request, contenthost_pools):
     """A function-level fixture that provides a content host object parametrized"""
     # Request should be parametrized through pytest_fixtures.fixture_markers
     # unpack params dict
-    with VMBroker(**host_conf(request), host_classes={'host': ContentHost}) as host:
+    with pooled_contenthost(request, contenthost_pools) as host:
         yield host
 
 
 @pytest.fixture(params=[{'rhel_version': '7'}])
-def rhel7_contenthost(request):
+def rhel7_contenthost(request, contenthost_pools):
     """A function-level fixture that provides a rhel7 content host object"""
-    with VMBroker(**host_conf(request), host_classes={'host': ContentHost}) as host:
+    with pooled_contenthost(request, contenthost_pools) as host:
         yield host
 
 
@@ -65,9 +113,9 @@ def rhel7_contenthost_module(request):
 
 
 @pytest.fixture(params=[{'rhel_version': '8'}])
-def rhel8_contenthost(request):
+def rhel8_contenthost(request, contenthost_pools):
     """A fixture that provides a rhel8 content host object"""
-    with VMBroker(**host_conf(request), host_classes={'host': ContentHost}) as host:
+    with pooled_contenthost(request, contenthost_pools) as host:
         yield host
 
 
@@ -79,9 +127,9 @@ def rhel8_contenthost_module(request):
 
 
 @pytest.fixture(params=[{'rhel_version': 6}])
-def rhel6_contenthost(request):
+def rhel6_contenthost(request, contenthost_pools):
     """A function-level fixture that provides a rhel6 content host object"""
-    with VMBroker(**host_conf(request), host_classes={'host': ContentHost}) as host:
+    with pooled_contenthost(request, contenthost_pools) as host:
         yield host
 
 
@@ -97,11 +145,16 @@ def content_hosts(request):
 def registered_hosts(organization_ak_setup, content_hosts, default_sat):
     """Fixture that registers content hosts to Satellite, based on rh_cloud setup"""
     org, ak = organization_ak_setup
-    for vm in content_hosts:
+    # read on the satellite once, its ssh session must not be shared by the host threads
+    rex_key = default_sat.rex_pub_key
+
+    def register(vm):
         vm.install_katello_ca(default_sat)
         vm.register_contenthost(org.label, ak.name)
-        vm.add_rex_key(default_sat)
+        vm.add_authorized_key(pub_key=rex_key)
         assert vm.subscribed
+
+    ContentHost.fan_out(content_hosts, register, fail_fast=True)
     return content_hosts
 
 
@@ -4,18 +4,75 @@ import random
 import pytest
 from broker import VMBroker
 
+from pytest_fixtures.core.broker import _resolve_deploy_args
 from robottelo.config import configure_airgun
 from robottelo.config import configure_nailgun
 from robottelo.config import settings
+from robottelo.host_pool import checkout_hosts
+from robottelo.hosts import Satellite
 from robottelo.logging import logger
 
 
+@pytest.hookimpl(optionalhook=True)
+def pytest_xdist_setupnodes(config, specs):
+    """Check out the on-demand satellites of all the xdist workers in parallel, before
+    the workers are started"""
+    if settings.server.xdist_behavior != 'on-demand' or config.option.collectonly:
+        return
+    hostnames = list(settings.server.hostnames)
+    if settings.server.inventory_filter:
+        hosts = VMBroker().from_inventory(filter=settings.server.inventory_filter)
+        hostnames += [host.hostname for host in hosts]
+    satellites = []
+    if len(specs) > len(hostnames):
+        _resolve_deploy_args(settings.server.deploy_arguments)
+        satellites = checkout_hosts(
+            len(specs) - len(hostnames),
+            dict(workflow=settings.server.deploy_workflow, **settings.server.deploy_arguments),
+            Satellite,
+            retry_limit=settings.server.on_demand_retry_limit,
+            backoff=settings.server.on_demand_backoff,
+        )
+    config._on_demand_satellites = satellites
+    config._satellite_hostnames = hostnames + [sat.hostname for sat in satellites]
+    if not config._satellite_hostnames:
+        # each worker would try its own checkout again, after the same failures
+        pytest.exit(
+            f'No satellite for the xdist workers: all the {len(specs)} on-demand satellite '
+            'checkouts failed and no server.hostnames or server.inventory_filter is set',
+            returncode=pytest.ExitCode.INTERNAL_ERROR,
+        )
+    logger.info(f'Satellites of the xdist workers: {config._satellite_hostnames}')
+
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_configure_node(node):
+    """Tell each xdist worker the satellite aligned to it by the master"""
+    hostnames = getattr(node.config, '_satellite_hostnames', None)
+    if not hostnames:
+        return
+    worker_pos = int(node.workerinput['workerid'].replace('gw', ''))
+    # the workers whose satellite could not be checked out are balanced on the others
+    node.workerinput['satellite_hostname'] = (
+        hostnames[worker_pos] if worker_pos < len(hostnames) else random.choice(hostnames)
+    )
+
+
+def pytest_sessionfinish(session):
+    satellites = getattr(session.config, '_on_demand_satellites', None)
+    if satellites and settings.server.auto_checkin:
+        VMBroker(hosts=satellites).checkin()
+
+
 @pytest.fixture(scope="session", autouse=True)
-def align_to_satellite(worker_id, satellite_factory):
+def align_to_satellite(request, worker_id, satellite_factory):
     """Attempt to align a Satellite to the current xdist worker"""
     # clear any hostname that may have been previously set
     settings.set("server.hostname", None)
     on_demand_sat = None
+    # the satellite aligned by the master when the on-demand satellites were checked out
+    # for all the workers at once
+    planned_hostname = getattr(request.config, 'workerinput', {}).get('satellite_hostname')
 
     if worker_id in ['master', 'local']:
         worker_pos = 0
@@ -23,12 +80,14 @@ def align_to_satellite(worker_id, satellite_factory):
         worker_pos = int(worker_id.replace('gw', ''))
 
     # attempt to add potential satellites from the broker inventory file
-    if settings.server.inventory_filter:
+    if settings.server.inventory_filter and not planned_hostname:
         hosts = VMBroker().from_inventory(filter=settings.server.inventory_filter)
         settings.server.hostnames += [host.hostname for host in hosts]
 
     # attempt to align a worker to a satellite
-    if settings.server.xdist_behavior == 'run-on-one' and settings.server.hostnames:
+    if planned_hostname:
+        settings.set("server.hostname", planned_hostname)
+    elif settings.server.xdist_behavior == 'run-on-one' and settings.server.hostnames:
         settings.set("server.hostname", settings.server.hostnames[0])
     elif settings.server.hostnames and worker_pos < len(settings.server.hostnames):
         settings.set("server.hostname", settings.server.hostnames[worker_pos])
@@ -0,0 +1,56 @@
+"""Report the latency statistics of the commands run on the remote hosts"""
+import json
+import shutil
+from pathlib import Path
+from tempfile import mkdtemp
+
+import pytest
+
+from robottelo.command_stats import command_stats
+from robottelo.command_stats import format_report
+from robottelo.config import robottelo_tmp_dir
+from robottelo.config import settings
+from robottelo.logging import robottelo_log_dir
+
+
+def _dump_dir(config):
+    """Directory where the xdist workers dump their samples, created by the master"""
+    if not hasattr(config, '_command_stats_dir'):
+        robottelo_tmp_dir.mkdir(parents=True, exist_ok=True)
+        config._command_stats_dir = mkdtemp(prefix='command_stats_', dir=robottelo_tmp_dir)
+    return config._command_stats_dir
+
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_configure_node(node):
+    """Tell the xdist workers where to dump their samples"""
+    node.workerinput['command_stats_dir'] = _dump_dir(node.config)
+
+
+def pytest_sessionfinish(session):
+    workerinput = getattr(session.config, 'workerinput', None)
+    if workerinput is not None and settings.performance.command_stats:
+        command_stats.dump(
+            Path(workerinput['command_stats_dir'], f'{workerinput["workerid"]}.json')
+        )
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    """Write the statistics of the commands run by all the workers to
+    ``settings.performance.command_stats_file`` and show the slowest ones"""
+    if not settings.performance.command_stats:
+        return
+    if hasattr(config, '_command_stats_dir'):
+        for dump in Path(config._command_stats_dir).glob('*.json'):
+            command_stats.load(dump)
+        shutil.rmtree(config._command_stats_dir, ignore_errors=True)
+    if not command_stats.samples:
+        return
+    report = command_stats.report()
+    report_file = robottelo_log_dir.joinpath(settings.performance.command_stats_file)
+    report_file.parent.mkdir(parents=True, exist_ok=True)
+    report_file.write_text(json.dumps(report, indent=2))
+    terminalreporter.write_sep('=', 'slowest remote commands (seconds)')
+    for line in format_report(report):
+        terminalreporter.write_line(line)
+    terminalreporter.write_line(f'Command statistics written to {report_file}')
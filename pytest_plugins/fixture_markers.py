@@ -1,8 +1,12 @@
+import math
 import re
+from collections import Counter
 from inspect import getmembers
 from inspect import isfunction
+from types import SimpleNamespace
 
 from robottelo.config import settings
+from robottelo.logging import logger
 
 
 def pytest_generate_tests(metafunc):
@@ -70,3 +74,44 @@ def pytest_collection_modifyitems(session, items, config):
                 client_property = ('ClientOS', str(settings.content_host.default_rhel_version))
             item.user_properties.append(client_property)
             item.add_marker('content_host')
+
+
+def pytest_collection_finish(session):
+    """Plan the content hosts of the warm pools from the collected tests
+
+    Each pooled content host fixture used by a test needs a host of the configuration
+    of its parameters. The hosts needed by this xdist worker are estimated as its share
+    of all of them, and the pools of each configuration start checking them out right
+    away, in a single bulk broker call per pool.
+    """
+    from pytest_fixtures.core import contenthosts
+    from robottelo.host_pool import ContentHostPools
+
+    if not settings.content_host.pool_size or session.config.option.collectonly:
+        return
+    demand, confs = Counter(), {}
+    for item in session.items:
+        params = getattr(item, 'callspec', None) and item.callspec.params
+        for name in set(item.fixturenames).intersection(contenthosts.pooled_fixtures):
+            conf = contenthosts.host_conf(SimpleNamespace(param=(params or {}).get(name, {})))
+            key = tuple(sorted(conf.items()))
+            confs[key] = conf
+            demand[key] += 1
+    if not demand:
+        return
+    workers = int(getattr(session.config, 'workerinput', {}).get('workercount', 1))
+    plan = [(confs[key], math.ceil(count / workers)) for key, count in demand.items()]
+    logger.info(f'Planned content hosts per worker: {plan}')
+    pools = ContentHostPools(
+        settings.content_host.pool_size,
+        max_idle=settings.content_host.pool_max_idle,
+        recycle=settings.content_host.pool_recycle,
+    )
+    pools.plan(plan)
+    session.config._contenthost_pools = pools
+
+
+def pytest_sessionfinish(session):
+    pools = getattr(session.config, '_contenthost_pools', None)
+    if pools is not None:
+        pools.close()
@@ -4,6 +4,8 @@ import logzero
 import pytest
 from xdist import is_xdist_worker
 
+from robottelo import ssh
+from robottelo.cli import hammer_shell
 from robottelo.logging import DEFAULT_DATE_FORMAT
 from robottelo.logging import logger
 from robottelo.logging import robottelo_log_dir
@@ -67,3 +69,16 @@ def pytest_runtest_logstart(nodeid, location):
 
 def pytest_runtest_logfinish(nodeid, location):
     logger.info(f'Finished Test: {nodeid}')
+
+
+def pytest_sessionfinish(session, exitstatus):
+    """Log the ssh connection pool and caches statistics and close the remote
+    connections"""
+    from robottelo.cli.base import Base
+    from robottelo.hosts import FactCache
+
+    logger.info(f'SSH connection pool statistics: {ssh.pool_stats()}')
+    logger.info(f'Host facts cache statistics: {FactCache.total_stats}')
+    logger.info(f'CLI cache statistics: {Base.cache.report()}')
+    hammer_shell.close_shells()
+    ssh.close_connections()
@@ -0,0 +1,65 @@
+"""Nailgun entity classes bound to a server config on first use"""
+import functools
+import threading
+
+from nailgun import entities
+from nailgun.entity_mixins import Entity
+
+# entity classes injected with a server config, keyed by the config and the entity name
+_injected = {}
+_injected_lock = threading.Lock()
+
+
+def _config_key(server_config):
+    auth = server_config.auth
+    return (
+        server_config.url,
+        tuple(auth) if isinstance(auth, list) else auth,
+        server_config.verify,
+    )
+
+
+def inject_config(cls, server_config):
+    """Subclass a nailgun entity class to inject a server config into its init"""
+
+    class DecClass(cls):
+        __init__ = functools.partialmethod(cls.__init__, server_config=server_config)
+
+    return DecClass
+
+
+class APINamespace:
+    """The entity classes of ``nailgun.entities`` bound to a server config
+
+    Each entity class is subclassed with the server config on its first access only.
+    The subclasses are shared by the namespaces of the configs with the same url,
+    credentials and verification, and stored as attributes of the namespace, so later
+    accesses are plain attribute lookups.
+
+    :param nailgun.config.ServerConfig server_config: the config injected in the entities
+    """
+
+    def __init__(self, server_config):
+        self.server_config = server_config
+        self._key = _config_key(server_config)
+
+    def __getattr__(self, name):
+        cls = getattr(entities, name, None)
+        if name.startswith('_') or not (isinstance(cls, type) and issubclass(cls, Entity)):
+            raise AttributeError(f'{type(self).__name__} has no nailgun entity {name!r}')
+        key = self._key + (name,)
+        with _injected_lock:
+            if key not in _injected:
+                _injected[key] = inject_config(cls, self.server_config)
+        setattr(self, name, _injected[key])
+        return _injected[key]
+
+    def __dir__(self):
+        return sorted(
+            set(super().__dir__())
+            | {
+                name
+                for name, obj in vars(entities).items()
+                if isinstance(obj, type) and issubclass(obj, Entity)
+            }
+        )
@@ -32,6 +32,8 @@ class ActivationKey(Base):
     """Manipulates Katello's activation-key."""
 
     command_base = 'activation-key'
+    # adding or removing subscriptions changes their consumed quantities
+    cache_dependents = ('subscription',)
 
     @classmethod
     def add_host_collection(cls, options=None):
@@ -1,12 +1,20 @@
 """Generic base class for cli hammer commands."""
+import copy
 import re
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
 
+from broker.session import Result
 from wait_for import wait_for
 
 from robottelo import ssh
 from robottelo.cli import hammer
+from robottelo.cli import hammer_shell
 from robottelo.config import settings
 from robottelo.logging import logger
+from robottelo.logging import robottelo_root_dir
 from robottelo.ssh import get_client
 
 
@@ -59,17 +67,248 @@ class CLIDataBaseError(CLIBaseError):
     """
 
 
-class Base:
+class _ThreadLocalClassAttribute:
+    """A class attribute whose assigned values are only seen by the assigning thread
+
+    The cli methods assign ``cls.command_sub`` right before building their command,
+    keeping the assigned value per thread prevents concurrent invocations from
+    overwriting each other's subcommand. The value defined in the class body is
+    used until the current thread assigns one.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._local = threading.local()
+
+    @property
+    def _values(self):
+        if not hasattr(self._local, 'values'):
+            self._local.values = weakref.WeakKeyDictionary()
+        return self._local.values
+
+    def __get__(self, cls, metacls=None):
+        values = self._values
+        for klass in cls.__mro__:
+            if klass in values:
+                return values[klass]
+            if self.name in vars(klass):
+                return vars(klass)[self.name]
+        raise AttributeError(self.name)
+
+    def __set__(self, cls, value):
+        self._values[cls] = value
+
+    def __delete__(self, cls):
+        self._values.pop(cls, None)
+
+
+class _BaseMeta(type):
+    """Metaclass of the cli classes keeping their subcommand per thread"""
+
+    command_sub = _ThreadLocalClassAttribute('command_sub')
+
+
+class HammerCommand(str):
+    """A hammer command line built for a single invocation
+
+    Besides the command line, it carries the parts of the command and the target
+    it was built for, so executing it does not depend on the cli class state that
+    another thread, or another satellite, may have changed in the meantime.
+    """
+
+    def __new__(
+        cls,
+        command,
+        command_base=None,
+        command_sub=None,
+        command_end=None,
+        hostname=None,
+        username=None,
+        password=None,
+    ):
+        obj = super().__new__(cls, command)
+        obj.command_base = command_base
+        obj.command_sub = command_sub
+        obj.command_end = command_end
+        obj.hostname = hostname
+        obj.username = username
+        obj.password = password
+        return obj
+
+
+class LazyRecord(dict):
+    """The record of an entity created by :meth:`Base.create` in lazy mode
+
+    The entity id is available at once, its information is read with the cli class
+    ``info`` the first time another field is read, or with
+    :func:`resolve_records` for many records at once.
+    """
+
+    def __init__(self, cli, info_options):
+        super().__init__(id=info_options['id'])
+        self.cli = cli
+        self.info_options = info_options
+        self.resolved = False
+
+    def resolve(self, info=None):
+        """Read the entity information, unless done already
+
+        :param dict info: the entity information, when already read
+        """
+        if not self.resolved:
+            if info is None:
+                info = self.cli._info_created(self.info_options)
+            dict.update(self, info)
+            self.resolved = True
+        return self
+
+    def __getitem__(self, key):
+        if key != 'id':
+            self.resolve()
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        if key != 'id':
+            self.resolve()
+        return super().get(key, default)
+
+    def __contains__(self, key):
+        if key != 'id':
+            self.resolve()
+        return super().__contains__(key)
+
+    def __bool__(self):
+        # the entity was created, there is no need to read it to know it exists
+        return True
+
+    def __reduce_ex__(self, protocol):
+        return dict, (dict(self.resolve()),)
+
+
+def _resolving(name):
+    """Return the ``name`` dict method, reading the record information first"""
+    method = getattr(dict, name)
+
+    def resolving(self, *args, **kwargs):
+        self.resolve()
+        return method(self, *args, **kwargs)
+
+    resolving.__name__ = name
+    return resolving
+
+
+for _name in (
+    '__delitem__',
+    '__eq__',
+    '__iter__',
+    '__len__',
+    '__ne__',
+    '__repr__',
+    '__setitem__',
+    'clear',
+    'copy',
+    'items',
+    'keys',
+    'pop',
+    'popitem',
+    'setdefault',
+    'update',
+    'values',
+):
+    setattr(LazyRecord, _name, _resolving(_name))
+
+
+def resolve_records(records):
+    """Read the information of many lazy records, a single ssh round trip per cli class
+
+    :param records: records returned by the cli classes, the ones not lazy or already
+        resolved are skipped
+    """
+    pending = {}
+    for record in records:
+        if isinstance(record, LazyRecord) and not record.resolved:
+            pending.setdefault(record.cli, []).append(record)
+    for cli, cli_records in pending.items():
+        infos = cli.info_batch([record.info_options for record in cli_records])
+        for record, info in zip(cli_records, infos):
+            # failed reads, e.g. an organization still being created, are retried alone
+            record.resolve(None if isinstance(info, CLIBaseError) else info)
+
+
+class CLICache:
+    """Read-through cache of the cli ``info`` and ``list`` results, per satellite
+
+    The results are grouped by the first word of their command base, so writing
+    ``content-view filter`` invalidates the ``content-view`` results too.
+    ``stats`` counts the hits, misses and invalidated results.
+    """
+
+    def __init__(self):
+        self._results = {}
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+    @staticmethod
+    def group(command_base):
+        return (command_base or '').split(' ', 1)[0]
+
+    def get(self, hostname, command, key, compute):
+        """Return a copy of the cached result of ``command``, calling ``compute`` on a miss
+
+        :param hostname: the satellite the command is run on
+        :param HammerCommand command: the read command
+        :param key: identifies the result among the ones of the command
+        """
+        group = (hostname, self.group(command.command_base))
+        key = (str(command), command.username) + key
+        with self._lock:
+            if key in self._results.get(group, {}):
+                self.stats['hits'] += 1
+                return copy.deepcopy(self._results[group][key])
+            self.stats['misses'] += 1
+        result = compute()
+        with self._lock:
+            self._results.setdefault(group, {})[key] = copy.deepcopy(result)
+        return result
+
+    def invalidate(self, hostname, command_bases=None):
+        """Forget the results of ``command_bases`` on ``hostname``, all of them when None"""
+        with self._lock:
+            if command_bases is None:
+                groups = [group for group in self._results if group[0] == hostname]
+            else:
+                groups = {(hostname, self.group(command_base)) for command_base in command_bases}
+            for group in groups:
+                self.stats['invalidations'] += len(self._results.pop(group, ()))
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+
+    def report(self):
+        """Return the statistics with the hit rate"""
+        lookups = self.stats['hits'] + self.stats['misses']
+        return dict(
+            self.stats, hit_rate=round(self.stats['hits'] / lookups, 3) if lookups else None
+        )
+
+
+class Base(metaclass=_BaseMeta):
     """Base class for hammer CLI interaction
 
     See Subcommands section in `hammer --help` output on your Satellite.
     """
 
     command_base = None  # each inherited instance should define this
-    command_sub = None  # specific to instance, like: create, update, etc.
+    command_sub = None  # specific to invocation, like: create, update, etc. kept per thread
     command_end = None  # extending commands like for directory to pass
     command_requires_org = False  # True when command requires organization-id
     hostname = None  # Now used for Satellite class hammer execution
+    json_output = None  # hammer json output for info, list and create, None follows settings
+    json_native_types = None  # keep the json integers as int, None follows settings
+    cache_dependents = ()  # command bases whose cached results are changed by this one writes
+    cache = CLICache()
+    _read_subcommands = ('info', 'list')
     logger = logger
     _db_error_regex = re.compile(r'.*INSERT INTO|.*SELECT .*FROM|.*violates foreign key')
 
@@ -119,9 +358,12 @@ class Base:
         return cls.execute(cls._construct_command(options))
 
     @classmethod
-    def create(cls, options=None, timeout=None):
+    def create(cls, options=None, timeout=None, lazy=None):
         """
         Creates a new record using the arguments passed via dictionary.
+
+        In lazy mode, set by ``lazy`` or ``settings.performance.lazy_create`` when it
+        is None, a :class:`LazyRecord` is returned without reading the new record.
         """
 
         cls.command_sub = 'create'
@@ -129,7 +371,13 @@ class Base:
         if options is None:
             options = {}
 
-        result = cls.execute(cls._construct_command(options), output_format='csv', timeout=timeout)
+        output_format = cls._output_format('csv')
+        result = cls.execute(
+            cls._construct_command(options), output_format=output_format, timeout=timeout
+        )
+        if output_format == 'json':
+            # hammer outputs the created object, or nothing
+            result = [result] if isinstance(result, dict) else result or []
 
         # Extract new object ID if it was successfully created
         if len(result) > 0 and 'id' in result[0]:
@@ -144,17 +392,12 @@ class Base:
                     raise CLIError(tmpl.format(cls.__name__))
                 info_options['organization-id'] = options['organization-id']
 
-            # organization creation can take some time
-            if cls.command_base == 'organization':
-                new_obj, _ = wait_for(
-                    lambda: cls.info(info_options),
-                    timeout=300000,
-                    delay=5,
-                    silent_failure=True,
-                    handle_exception=True,
-                )
-            else:
-                new_obj = cls.info(info_options)
+            if lazy is None:
+                lazy = settings.performance.lazy_create
+            if lazy:
+                return LazyRecord(cls, info_options)
+
+            new_obj = cls._info_created(info_options)
 
             # stdout should be a dictionary containing the object
             if len(new_obj) > 0:
@@ -162,6 +405,21 @@ class Base:
 
         return result
 
+    @classmethod
+    def _info_created(cls, info_options):
+        """Read the information of a record just created"""
+        # organization creation can take some time
+        if cls.command_base == 'organization':
+            new_obj, _ = wait_for(
+                lambda: cls.info(info_options),
+                timeout=300000,
+                delay=5,
+                silent_failure=True,
+                handle_exception=True,
+            )
+            return new_obj
+        return cls.info(info_options)
+
     @classmethod
     def delete(cls, options=None, timeout=None):
         """Deletes existing record."""
@@ -218,6 +476,68 @@ class Base:
 
         return (username, password)
 
+    @classmethod
+    def _cached(cls, command, key, compute):
+        """Return the result of the read ``command`` from the cli cache when enabled
+
+        The cache is enabled by ``settings.performance.cli_cache``.
+        """
+        if not settings.performance.cli_cache:
+            return compute()
+        hostname = command.hostname or cls.hostname or settings.server.hostname
+        return cls.cache.get(hostname, command, key, compute)
+
+    @classmethod
+    def _invalidate_cache(cls, command, hostname):
+        """Forget the cached results a command run on ``hostname`` may change"""
+        if not settings.performance.cli_cache:
+            return
+        if not isinstance(command, HammerCommand):
+            # the changed entities are unknown
+            cls.cache.invalidate(hostname)
+        elif (command.command_sub or '').split(' ')[-1] not in cls._read_subcommands:
+            cls.cache.invalidate(hostname, (command.command_base,) + tuple(cls.cache_dependents))
+
+    @classmethod
+    def _output_format(cls, default):
+        """Return json in json output mode, ``default`` otherwise
+
+        The json output mode is set by the class ``json_output`` attribute, or by
+        ``settings.performance.json_output`` when the attribute is None.
+        """
+        json_output = cls.json_output
+        if json_output is None:
+            json_output = settings.performance.json_output
+        return 'json' if json_output else default
+
+    @classmethod
+    def _native_types(cls):
+        """Return whether the integers of a json output are kept as int
+
+        This is set by the class ``json_native_types`` attribute, or by
+        ``settings.performance.json_native_types`` when the attribute is None.
+        """
+        if cls.json_native_types is None:
+            return settings.performance.json_native_types
+        return cls.json_native_types
+
+    @classmethod
+    def _hammer_args(cls, command, hostname, user, password, output_format):
+        """Return the hostname to run ``command`` on and the hammer arguments running it"""
+        if isinstance(command, HammerCommand):
+            hostname = hostname or command.hostname
+            user = user or command.username
+            password = password or command.password
+        user, password = cls._get_username_password(user, password)
+        hostname = hostname or cls.hostname or settings.server.hostname
+        hammer_args = '-v {} {} {} {}'.format(
+            f'-u {user}' if user else "--interactive no",
+            f'-p {password}' if password else "",
+            f'--output={output_format}' if output_format else "",
+            command,
+        )
+        return hostname, hammer_args
+
     @classmethod
     def execute(
         cls,
@@ -230,30 +550,97 @@ class Base:
         ignore_stderr=None,
         return_raw_response=None,
     ):
-        """Executes the cli ``command`` on the server via ssh"""
-        user, password = cls._get_username_password(user, password)
-        time_hammer = settings.performance.time_hammer
+        """Executes the cli ``command`` on the server via ssh
 
-        # add time to measure hammer performance
-        cmd = 'LANG={} {} hammer -v {} {} {} {}'.format(
-            settings.robottelo.locale,
-            'time -p' if time_hammer else '',
-            f'-u {user}' if user else "--interactive no",
-            f'-p {password}' if password else "",
-            f'--output={output_format}' if output_format else "",
-            command,
-        )
-        response = ssh.command(
-            cmd.encode('utf-8'),
-            hostname=hostname or cls.hostname or settings.server.hostname,
-            output_format=output_format,
-            timeout=timeout,
+        When ``command`` is a :class:`HammerCommand`, the hostname and credentials it
+        was built for are used unless given as parameters.
+        """
+        hostname, hammer_args = cls._hammer_args(command, hostname, user, password, output_format)
+        cls._invalidate_cache(command, hostname)
+        time_hammer = settings.performance.time_hammer
+        base, sub = (
+            (command.command_base, command.command_sub)
+            if isinstance(command, HammerCommand)
+            else (cls.command_base, cls.command_sub)
         )
+        stats_group = f'hammer {base or ""} {sub or ""}'.strip()
+        response = None
+        if settings.performance.hammer_shell and not time_hammer:
+            start = time.monotonic()
+            try:
+                response = hammer_shell.execute(hammer_args, hostname=hostname, timeout=timeout)
+            except hammer_shell.HammerShellCommandError as err:
+                # not run again over ssh, the command may have been run already
+                raise CLIReturnCodeError(
+                    -1,
+                    str(err),
+                    f'Command "{stats_group}" result was lost by the hammer shell',
+                ) from err
+        if response is not None:
+            ssh.record_command(
+                hostname, hammer_args, response, time.monotonic() - start, group=stats_group
+            )
+            ssh.parse_output(
+                response, output_format=output_format, native_types=cls._native_types()
+            )
+        else:
+            # add time to measure hammer performance
+            cmd = 'LANG={} {} hammer {}'.format(
+                settings.robottelo.locale,
+                'time -p' if time_hammer else '',
+                hammer_args,
+            )
+            response = ssh.command(
+                cmd.encode('utf-8'),
+                hostname=hostname,
+                output_format=output_format,
+                timeout=timeout,
+                stats_group=stats_group,
+                native_types=cls._native_types(),
+            )
         if return_raw_response:
             return response
         else:
             return cls._handle_response(response, ignore_stderr=ignore_stderr)
 
+    @classmethod
+    def execute_iter(cls, command, hostname=None, user=None, password=None, timeout=None):
+        """Executes the cli ``command`` with a csv output, parsing its rows as they arrive
+
+        Only the row being parsed is held in memory, and closing the iterator before
+        its end terminates the command.
+
+        :return: an iterator of dicts, one per row
+        :raises robottelo.cli.base.CLIReturnCodeError: once all the rows were read, if
+            the command failed
+        """
+        hostname, hammer_args = cls._hammer_args(command, hostname, user, password, 'csv')
+        if ssh.get_transport() is not None:
+            # recorded and replayed commands are not streamed
+            response = ssh.command(
+                f'LANG={settings.robottelo.locale} hammer {hammer_args}'.encode('utf-8'),
+                hostname=hostname,
+                timeout=timeout,
+            )
+            yield from hammer.parse_csv_iter(cls._handle_response(response).splitlines())
+            return
+        client = get_client(hostname=hostname)
+        stream = client.stream(f'LANG={settings.robottelo.locale} hammer {hammer_args}', timeout)
+        stderr = []
+
+        def stdout_lines():
+            for name, line in stream:
+                if name == 'stderr':
+                    stderr.append(line)
+                else:
+                    yield line
+
+        try:
+            yield from hammer.parse_csv_iter(stdout_lines())
+        finally:
+            stream.close()
+        cls._handle_response(Result(status=stream.status, stdout='', stderr='\n'.join(stderr)))
+
     @classmethod
     def sm_execute(
         cls,
@@ -284,11 +671,11 @@ class Base:
         if search is not None and 'search' not in options:
             options.update({'search': f'{search[0]}=\\"{search[1]}\\"'})
 
-        result = cls.list(options)
+        # only the first row is needed
+        result = cls.list(dict(options, **{'per-page': 1}))
         if result:
-            result = result[0]
-
-        return result
+            return result[0]
+        return []
 
     @classmethod
     def info(cls, options=None, output_format=None, return_raw_response=None):
@@ -301,27 +688,76 @@ class Base:
         if cls.command_requires_org and 'organization-id' not in options:
             raise CLIError(f'organization-id option is required for {cls.__name__}.info')
 
-        result = cls.execute(
-            command=cls._construct_command(options),
-            output_format=output_format,
-            return_raw_response=return_raw_response,
-        )
-        if not return_raw_response and output_format != 'json':
-            result = hammer.parse_info(result)
-        return result
+        output_format = output_format or cls._output_format(None)
+        command = cls._construct_command(options)
+
+        def info():
+            result = cls.execute(
+                command=command,
+                output_format=output_format,
+                return_raw_response=return_raw_response,
+            )
+            if not return_raw_response and output_format != 'json':
+                result = hammer.parse_info(result)
+            return result
+
+        if return_raw_response:
+            return info()
+        return cls._cached(command, (output_format,), info)
+
+    @classmethod
+    def info_batch(cls, options_list, timeout=None):
+        """Reads the information of several entities in a single ssh round trip
+
+        :param list options_list: the ``info`` options of each entity
+        :return: a list holding the information of each entity, or the
+            :class:`CLIBaseError` raised reading it
+        """
+        cls.command_sub = 'info'
+        output_format = cls._output_format(None)
+        hostname, commands = None, []
+        for options in options_list:
+            hostname, hammer_args = cls._hammer_args(
+                cls._construct_command(options), None, None, None, output_format
+            )
+            commands.append(f'LANG={settings.robottelo.locale} hammer {hammer_args}')
+        infos = []
+        for response in ssh.command_batch(commands, hostname=hostname, timeout=timeout):
+            try:
+                result = cls._handle_response(
+                    ssh.parse_output(response, output_format, native_types=cls._native_types())
+                )
+            except CLIBaseError as err:
+                infos.append(err)
+            else:
+                infos.append(result if output_format == 'json' else hammer.parse_info(result))
+        return infos
 
     @classmethod
-    def list(cls, options=None, per_page=True, output_format='csv'):
+    def list(cls, options=None, per_page=True, output_format=None):
         """
         List information.
         @param options: ID (sometimes name works as well) to retrieve info.
+        @param output_format: csv or json, defaults to json in json output mode
         """
 
         cls.command_sub = 'list'
+        output_format = output_format or cls._output_format('csv')
 
         if options is None:
             options = {}
 
+        page_size = settings.performance.list_page_size
+        if 'per-page' not in options and per_page and page_size:
+            # split the listing in several lighter requests
+            return cls._cached(
+                cls._construct_command(options),
+                (output_format, page_size),
+                lambda: list(
+                    cls.list_paged(options, page_size=page_size, output_format=output_format)
+                ),
+            )
+
         if 'per-page' not in options and per_page:
             options['per-page'] = 10000
 
@@ -331,7 +767,84 @@ class Base:
         # if cls.command_requires_org and 'organization-id' not in options:
         #     raise CLIError(f'organization-id option is required for {cls.__name__}.list')
 
-        return cls.execute(cls._construct_command(options), output_format=output_format)
+        command = cls._construct_command(options)
+        return cls._cached(
+            command, (output_format,), lambda: cls.execute(command, output_format=output_format)
+        )
+
+    @classmethod
+    def list_paged(cls, options=None, page_size=None, output_format=None, limit=None):
+        """
+        List information page by page, as a single iterator over the rows.
+
+        The first page is fetched in the calling thread. Each next page is fetched in
+        background while the rows of the current one are consumed, and no more page is
+        fetched once the iterator is closed, so taking only the first rows makes as few
+        requests as possible.
+
+        @param options: ID (sometimes name works as well) to retrieve info.
+        @param page_size: number of rows per page, defaults to
+            ``settings.performance.list_page_size``
+        @param limit: maximum number of rows to list, no page past it is fetched
+        """
+
+        cls.command_sub = 'list'
+        output_format = output_format or cls._output_format('csv')
+        page_size = page_size or settings.performance.list_page_size or 10000
+        options = {key: val for key, val in (options or {}).items() if key != 'page'}
+        options['per-page'] = page_size
+
+        def fetch(command, command_sub):
+            # the per thread command_sub names the subcommand in the error messages
+            cls.command_sub = command_sub
+            return cls.execute(command, output_format=output_format) or []
+
+        # the commands are built in this thread, the per thread command_sub is not shared
+        command_sub = cls.command_sub
+        page, listed = 1, 0
+        rows = fetch(cls._construct_command(dict(options, page=page)), command_sub)
+        # the background thread is only started when there is a next page
+        executor = future = None
+        try:
+            while rows is not None:
+                if len(rows) >= page_size and (limit is None or page * page_size < limit):
+                    page += 1
+                    if executor is None:
+                        executor = ThreadPoolExecutor(
+                            max_workers=1, thread_name_prefix='list_paged'
+                        )
+                    future = executor.submit(
+                        fetch, cls._construct_command(dict(options, page=page)), command_sub
+                    )
+                for row in rows:
+                    if limit is not None and listed >= limit:
+                        return
+                    listed += 1
+                    yield row
+                rows = future.result() if future is not None else None
+                future = None
+        finally:
+            if future is not None:
+                future.cancel()
+            if executor is not None:
+                executor.shutdown(wait=False)
+
+    @classmethod
+    def list_iter(cls, options=None, per_page=True):
+        """
+        List information, parsing the rows lazily as they are received.
+        @param options: ID (sometimes name works as well) to retrieve info.
+        """
+
+        cls.command_sub = 'list'
+
+        if options is None:
+            options = {}
+
+        if 'per-page' not in options and per_page:
+            options['per-page'] = 10000
+
+        return cls.execute_iter(cls._construct_command(options))
 
     @classmethod
     def puppetclasses(cls, options=None):
@@ -402,9 +915,29 @@ class Base:
 
         return Wrapper
 
+    @classmethod
+    def _check_command(cls, command_sub, options):
+        """Check the subcommand and options of a hammer command against the index of
+        ``settings.performance.hammer_commands_file``, without running it
+
+        :raise CLIError: when hammer does not know the subcommand or an option
+        """
+        index = hammer.load_command_index(
+            robottelo_root_dir.joinpath(settings.performance.hammer_commands_file)
+        )
+        errors = index.check(
+            f"{cls.command_base} {command_sub or ''}",
+            [key for key, val in options.items() if val is not None and val is not False],
+        )
+        if errors:
+            raise CLIError('\n'.join(errors))
+
     @classmethod
     def _construct_command(cls, options=None):
-        """Build a hammer cli command based on the options passed"""
+        """Build a hammer cli command based on the options passed
+
+        :return: a :class:`HammerCommand` bound to the class hostname and credentials
+        """
         tail = ''
 
         if options is None:
@@ -419,6 +952,17 @@ class Base:
                 if isinstance(val, list):
                     val = ','.join(str(el) for el in val)
                 tail += f' --{key}="{val}"'
-        cmd = f"{cls.command_base} {cls.command_sub or ''} {tail.strip()} {cls.command_end or ''}"
-
-        return cmd
+        command_sub = cls.command_sub
+        if settings.performance.validate_hammer_options:
+            cls._check_command(command_sub, options)
+        cmd = f"{cls.command_base} {command_sub or ''} {tail.strip()} {cls.command_end or ''}"
+
+        return HammerCommand(
+            cmd,
+            command_base=cls.command_base,
+            command_sub=command_sub,
+            command_end=cls.command_end,
+            hostname=cls.hostname,
+            username=getattr(cls, 'foreman_admin_username', None),
+            password=getattr(cls, 'foreman_admin_password', None),
+        )
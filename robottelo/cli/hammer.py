@@ -1,7 +1,9 @@
 """Helpers to interact with hammer command line utility."""
 import csv
+import difflib
 import json
 import re
+from functools import lru_cache
 
 
 def _normalize(header):
@@ -9,29 +11,38 @@ def _normalize(header):
     return header.replace(' ', '-').lower()
 
 
-def parse_json(stdout):
+def _normalize_pairs(pairs):
+    """Build a dict from the decoded json ``pairs``, normalizing its keys"""
+    return {key.replace(' ', '-').lower(): value for key, value in pairs}
+
+
+def _int_str(value):
+    # doing this to conform to csv parser
+    return str(int(value))
+
+
+_json_decoder = json.JSONDecoder(object_pairs_hook=_normalize_pairs, parse_int=_int_str)
+_native_json_decoder = json.JSONDecoder(object_pairs_hook=_normalize_pairs)
+_json_whitespace = re.compile(r'\s*')
+
+
+def parse_json(stdout, native_types=False):
     """Parse JSON output from Hammer CLI and convert it to python dictionary
     while normalizing keys.
-    """
-    new_object_index = stdout.find('\n}\n{')
-    if new_object_index > -1:
-        stdout = stdout[new_object_index + 3 :]  # noqa: E203
-    parsed = json.loads(stdout)
-    return _normalize_obj(parsed)
 
+    The keys are normalized while decoding, without copying the decoded objects.
+    When the output holds several JSON documents, the last one is returned.
 
-def _normalize_obj(obj):
-    """Normalize all dict's keys replacing empty spaces with "-" and lowering
-    chars
+    :param bool native_types: keep the integers as int, by default they are
+        converted to str to conform to csv parser
     """
-    if isinstance(obj, dict):
-        return {_normalize(k): _normalize_obj(v) for k, v in obj.items()}
-    elif isinstance(obj, list):
-        return [_normalize_obj(v) for v in obj]
-    # doing this to conform to csv parser
-    elif isinstance(obj, int) and not isinstance(obj, bool):
-        return str(obj)
-    return obj
+    decoder = _native_json_decoder if native_types else _json_decoder
+    index = _json_whitespace.match(stdout).end()
+    while True:
+        parsed, index = decoder.raw_decode(stdout, index)
+        index = _json_whitespace.match(stdout, index).end()
+        if index == len(stdout):
+            return parsed
 
 
 def parse_csv(output):
@@ -45,6 +56,24 @@ def parse_csv(output):
     return [dict(zip(keys, values)) for values in reader if len(values) > 0]
 
 
+def parse_csv_iter(lines):
+    """Parse CSV output from Hammer CLI lazily, yielding a dictionary per row.
+
+    Only the current row is held in memory, so a large output can be parsed as it
+    is read and the iteration can be stopped at any time.
+
+    :param lines: an iterable of the output lines, the first one being the header
+    """
+    reader = csv.reader(lines)
+    try:
+        keys = [_normalize(header) for header in next(reader)]
+    except StopIteration:
+        return
+    for values in reader:
+        if len(values) > 0:
+            yield dict(zip(keys, values))
+
+
 def parse_help(output):
     """Parse the help output from a hammer command and return a dictionary
     mapping the subcommands and options accepted by that command.
@@ -120,6 +149,74 @@ def parse_help(output):
     return contents
 
 
+class HammerCommandIndex:
+    """Index of the hammer subcommands and options, to check a command locally
+
+    :param dict tree: the hammer command tree, as written to ``hammer_commands.json`` by
+        ``scripts/hammer_command_tree.py``
+    """
+
+    def __init__(self, tree):
+        # maps each command path, e.g. ('content-view', 'filter', 'create'), to the
+        # names of its subcommands and options
+        self._commands = {}
+        self._add(tree, ())
+        self._global_options = self._commands[()][1]
+
+    def _add(self, node, path):
+        self._commands[path] = (
+            frozenset(subcommand['name'] for subcommand in node['subcommands']),
+            frozenset(option['name'] for option in node['options']),
+        )
+        for subcommand in node['subcommands']:
+            self._add(subcommand, path + (subcommand['name'],))
+
+    def check(self, command, options=()):
+        """Return the errors found in a hammer command, an empty list when it is valid
+
+        Commands which are not hammer commands, i.e. whose first word is not a hammer
+        subcommand, are not checked.
+
+        :param str command: the hammer subcommands, e.g. ``'content-view filter create'``
+        :param options: the long names of the options given to the command
+        """
+        path = ()
+        for name in command.split():
+            subcommands = self._commands[path][0]
+            if name not in subcommands:
+                if not path:
+                    return []
+                return [
+                    'Unknown subcommand "{}" of "hammer {}"{}'.format(
+                        name, ' '.join(path), _suggest(name, subcommands)
+                    )
+                ]
+            path += (name,)
+        known = self._commands[path][1]
+        return [
+            'Unknown option "--{}" of "hammer {}"{}'.format(
+                option, ' '.join(path), _suggest(option, known)
+            )
+            for option in options
+            if option not in known and option not in self._global_options
+            # boolean options accept a [no-] prefix, stripped by parse_help
+            and not (option.startswith('no-') and option[3:] in known)
+        ]
+
+
+def _suggest(name, names):
+    matches = difflib.get_close_matches(name, names, n=3)
+    return ', did you mean {}?'.format(' or '.join(matches)) if matches else ''
+
+
+@lru_cache(maxsize=None)
+def load_command_index(path):
+    """Return the :class:`HammerCommandIndex` of the ``hammer_commands.json`` at ``path``,
+    loaded once"""
+    with open(path) as tree_file:
+        return HammerCommandIndex(json.load(tree_file))
+
+
 def get_line_indentation_spaces(line, tab_spaces=4):
     """Return the number of spaces chars the line begin with
 
@@ -163,9 +260,23 @@ def get_line_indentation_level(line, tab_spaces=4, indentation_spaces=4):
     return get_line_indentation_spaces(line, tab_spaces=tab_spaces) // indentation_spaces
 
 
+_info_numbered_value = re.compile(r'\d+\)\s+(.+)$')
+_info_numbered_key = re.compile(r'(\d+)\)')
+_info_number = re.compile(r'\d+\)')
+
+
 def parse_info(output):
-    """Parse the info output and returns a dict mapping the values."""
-    # info dictionary
+    """Parse the info output and returns a dict mapping the values.
+
+    The output is parsed in a single pass, each line updating the state of the
+    property being parsed:
+
+    * ``sub_prop``: the last top level property without value, holding the
+      indented lines following it as a dict, a list of values or a list of dicts
+    * ``sub_num``: set while the indented lines are numbered dicts
+    * ``second_level_key``: the last second level key without value, holding the
+      third level lines following it
+    """
     contents = {}
     sub_prop = None  # stores name of the last group of sub-properties
     sub_num = None  # is not None when list of properties
@@ -175,108 +286,91 @@ def parse_info(output):
         # skip empty lines and dividers
         if line == '' or line == '---':
             continue
-        current_indent_level = get_line_indentation_level(line)
-        if current_indent_level <= 1:
+        # same as get_line_indentation_level
+        if len(line) < 4 or line[0] not in ' \t':
+            indent_level = 0
+        else:
+            indent = line[: len(line) - len(line.lstrip(' \t'))]
+            indent_level = (len(indent) + 3 * indent.count('\t')) // 4
+        if indent_level <= 1:
             # we are entering or leaving a second level from lower/upper levels
             # clear the second level key
             second_level_key = None
-        if line.startswith(' '):  # sub-properties are indented
-            # values are separated by ':' or '=>', but not by '::' which can be
-            # entity name like 'test::params::keys'
-            if line.find(':') != -1 and not line.find('::') != -1:
-                key, value = line.lstrip().split(":", 1)
-            elif line.find('=>') != -1 and len(line.lstrip().split(" =>", 1)) == 2:
-                key, value = line.lstrip().split(" =>", 1)
+        stripped = line.lstrip()
+
+        if line[0] != ' ':
+            # 'key: value' line, or 'key:' with no value starting a new sub-property
+            sub_num = None
+            key, value = stripped.split(':', 1)
+            key = key.replace(' ', '-').lower()
+            value = value.lstrip()
+            if value:
+                contents[key] = value
             else:
-                key = value = None
-
-            if key is None and value is None:
-                # Parse single attribute collection properties
-                # Template
-                #  1) template1
-                #  2) template2
-                #
-                # or
-                # Template
-                #  template1
-                #  template2
-                match = re.match(r'\d+\)\s+(.+)$', line.lstrip())
-
-                if match is None:
-                    match = re.match(r'(.*)$', line.lstrip())
-
-                value = match.group(1)
-
-                # adding list to 1 level, for example:
-                # {'template': ['template1', 'template2']}
-                if isinstance(contents[sub_prop], dict) and not contents[sub_prop]:
-                    contents[sub_prop] = []
-                    contents[sub_prop].append(value)
-                elif isinstance(contents[sub_prop], list):
-                    contents[sub_prop].append(value)
-                else:
-                    # adding list to 2 level, for example:
-                    # {'subscription-information':
-                    #      {'registered-by-activation-keys': ['ak1', 'ak2']}
-                    #  }
-                    last_key = list(contents[sub_prop].keys())[-1]
-                    if not contents[sub_prop][last_key]:
-                        contents[sub_prop][last_key] = [value]
-                    else:
-                        contents[sub_prop][last_key].append(value)
+                sub_prop = key
+                contents[sub_prop] = {}
+            continue
+
+        # sub-properties are indented, values are separated by ':' or '=>', but not
+        # by '::' which can be entity name like 'test::params::keys'
+        sub_values = contents.get(sub_prop)
+        if ':' in line and '::' not in line:
+            key, value = stripped.split(':', 1)
+        elif '=>' in line and ' =>' in stripped:
+            key, value = stripped.split(' =>', 1)
+        else:
+            # single attribute collection properties, numbered or not:
+            #  1) template1
+            # or
+            #  template1
+            match = _info_numbered_value.match(stripped)
+            value = match.group(1) if match else stripped
+            if isinstance(sub_values, dict) and not sub_values:
+                # adding list to 1 level: {'template': ['template1', 'template2']}
+                contents[sub_prop] = [value]
+            elif isinstance(sub_values, list):
+                sub_values.append(value)
             else:
-                # some properties have many numbered values
-                # Example:
-                # Content:
-                #  1) Repo Name: repo1
-                #     URL:       /custom/4f84fc90-9ffa-...
-                #  2) Repo Name: puppet1
-                #     URL:       /custom/4f84fc90-9ffa-...
-                starts_with_number = re.match(r'(\d+)\)', key)
-                if starts_with_number:
-                    sub_num = int(starts_with_number.group(1))
-                    # no. 1) we need to change dict() to list()
-                    if sub_num == 1:
-                        contents[sub_prop] = []
-                    # remove number from key
-                    key = re.sub(r'\d+\)', '', key)
-                    # append empty dict to array
-                    contents[sub_prop].append({})
-
-                key = key.lstrip().replace(' ', '-').lower()
-                value = value.lstrip()
-                # add value to dictionary
-                if sub_num is not None:
-                    contents[sub_prop][-1][key] = value
+                # adding list to 2 level, to the last key:
+                # {'subscription-information': {'registered-by-activation-keys': ['ak1']}}
+                last_key = next(reversed(sub_values))
+                if not sub_values[last_key]:
+                    sub_values[last_key] = [value]
                 else:
-                    # a third level is always represented as a dictionary and
-                    # we need to detect if we are at third level
-                    # example:
-                    # Content Information:
-                    #     Content View:
-                    #         ID:   10
-                    #         Name: Default Organization View
-                    # the "ID" and "Name" are located at third indent level
-                    # "content view" is located at second indent level
-                    if current_indent_level == 2 and second_level_key:
-                        # we are at third level indentation
-                        if not contents[sub_prop][second_level_key]:
-                            contents[sub_prop][second_level_key] = {}
-                        contents[sub_prop][second_level_key][key] = value
-                    else:
-                        contents[sub_prop][key] = value
-                    if current_indent_level == 1 and not value:
-                        # always set the last possible second level key
-                        # that can form a third level
-                        second_level_key = key
+                    sub_values[last_key].append(value)
+            continue
+
+        # some properties have many numbered values
+        #  1) Repo Name: repo1
+        #     URL:       /custom/4f84fc90-9ffa-...
+        if key[:1].isdigit():
+            match = _info_numbered_key.match(key)
+            if match:
+                sub_num = int(match.group(1))
+                # no. 1) we need to change dict() to list()
+                if sub_num == 1:
+                    sub_values = contents[sub_prop] = []
+                # remove number from key
+                key = _info_number.sub('', key)
+                sub_values.append({})
+
+        key = key.lstrip().replace(' ', '-').lower()
+        value = value.lstrip()
+        if sub_num is not None:
+            sub_values[-1][key] = value
+        elif indent_level == 2 and second_level_key:
+            # a third level is always represented as a dictionary:
+            # Content Information:
+            #     Content View:
+            #         ID:   10
+            if not sub_values[second_level_key]:
+                sub_values[second_level_key] = {}
+            sub_values[second_level_key][key] = value
         else:
-            sub_num = None  # new property implies no sub property
-            key, value = line.lstrip().split(":", 1)
-            key = key.lstrip().replace(' ', '-').lower()
-            if value.lstrip() == '':  # 'key:' no value, new sub-property
-                sub_prop = key
-                contents[sub_prop] = {}
-            else:  # 'key: value' line
-                contents[key] = value.lstrip()
+            sub_values[key] = value
+            if indent_level == 1 and not value:
+                # always set the last possible second level key
+                # that can form a third level
+                second_level_key = key
 
     return contents
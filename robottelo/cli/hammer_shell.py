@@ -0,0 +1,313 @@
+"""Persistent hammer process used to run hammer commands without paying the
+ruby interpreter startup and hammer modules loading for each command.
+
+A small ruby driver is started per satellite and user, at most
+``settings.performance.hammer_shell_pool_size`` of them being run at the same time,
+each one by a single thread at a time. It loads hammer
+a single time then, for each command received on its stdin, forks a child
+running the hammer script with the command arguments, credentials included.
+The child's stdout, stderr and exit status are sent back framed by a
+delimiter line::
+
+    <delimiter> <status> <stdout size> <stderr size>
+    <stdout bytes><stderr bytes>
+
+so the result is identical to a regular ``hammer`` execution over ssh.
+"""
+import json
+import shlex
+import threading
+import uuid
+from contextlib import contextmanager
+
+from broker.session import Result
+from ssh2.exceptions import Timeout
+
+from robottelo import ssh
+from robottelo.config import settings
+from robottelo.logging import logger
+
+DRIVER_PATH = '/tmp/robottelo_hammer_shell.rb'
+
+DRIVER_SCRIPT = '''\
+require 'fileutils'
+require 'json'
+require 'tmpdir'
+
+hammer, delimiter = ARGV
+tmp_dir = Dir.mktmpdir('robottelo_hammer_shell')
+driver_pid = Process.pid
+# the forked children run the at_exit handlers too
+at_exit { FileUtils.remove_entry(tmp_dir) if Process.pid == driver_pid }
+stdout, stderr = $stdout.dup, $stderr.dup
+# load hammer and all its modules once, the forked children will inherit them
+$stdout.reopen(File::NULL)
+$stderr.reopen(File::NULL)
+begin
+  ARGV.replace(['--version'])
+  load hammer
+rescue SystemExit
+end
+$stdout.reopen(stdout)
+$stderr.reopen(stderr)
+$stdout.sync = true
+$stdout.write("#{delimiter} ready\\n")
+while (line = $stdin.gets)
+  out_file, err_file = File.join(tmp_dir, 'stdout'), File.join(tmp_dir, 'stderr')
+  pid = fork do
+    $stdout.reopen(out_file, 'w')
+    $stderr.reopen(err_file, 'w')
+    ARGV.replace(JSON.parse(line))
+    load hammer
+  end
+  Process.wait(pid)
+  status = $?.exitstatus || 1
+  out, err = File.binread(out_file), File.binread(err_file)
+  $stdout.write("#{delimiter} #{status} #{out.bytesize} #{err.bytesize}\\n#{out}#{err}")
+end
+'''
+
+# commands using any of these shell features can not be run without a shell
+SHELL_METACHARACTERS = ('$', '`', '|', ';', '&', '<', '>', '(', ')')
+
+_pools = {}
+_unsupported_hosts = set()
+_lock = threading.Lock()
+
+
+class HammerShellError(Exception):
+    """Indicates that the persistent hammer process can not be used."""
+
+
+class HammerShellCommandError(HammerShellError):
+    """Indicates that the result of a command sent to the hammer process was lost, the
+    command may have been run already."""
+
+
+class HammerShell:
+    """A persistent hammer process running on a satellite
+
+    :param hostname: the satellite hostname
+    """
+
+    def __init__(self, hostname):
+        self.hostname = hostname
+        self._delimiter = f'--robottelo-hammer-shell-{uuid.uuid4().hex}--'.encode()
+        self._client = None
+        self._channel = None
+        self._buffer = b''
+
+    @property
+    def running(self):
+        return self._channel is not None
+
+    def _read(self):
+        try:
+            size, data = self._channel.read()
+        except Timeout as err:
+            raise HammerShellError(f'hammer shell on {self.hostname} timed out') from err
+        if size <= 0:
+            raise HammerShellError(f'hammer shell on {self.hostname} exited unexpectedly')
+        self._buffer += data
+
+    def _read_line(self):
+        while b'\n' not in self._buffer:
+            self._read()
+        line, self._buffer = self._buffer.split(b'\n', 1)
+        return line
+
+    def _read_exact(self, size):
+        while len(self._buffer) < size:
+            self._read()
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def start(self):
+        """Upload the driver script and start the hammer process"""
+        from robottelo.hosts import ContentHost
+
+        self._client = ContentHost(
+            hostname=self.hostname,
+            username=settings.server.ssh_username,
+            password=settings.server.ssh_password,
+        )
+        hammer_bin = self._client.execute('readlink -f "$(command -v hammer)"').stdout.strip()
+        shebang = self._client.execute(f'head -n 1 {hammer_bin}').stdout.strip()
+        if not hammer_bin or not shebang.startswith('#!') or 'ruby' not in shebang:
+            raise HammerShellError(f'hammer on {self.hostname} is not a ruby script: {shebang}')
+        # written aside then moved, the shells started at the same time never run a
+        # partially written driver
+        upload_path = f'{DRIVER_PATH}.{uuid.uuid4().hex}'
+        result = self._client.execute(
+            f"cat > {upload_path} <<'ROBOTTELO_HAMMER_SHELL'\n"
+            f"{DRIVER_SCRIPT}ROBOTTELO_HAMMER_SHELL\n"
+            f"mv -f {upload_path} {DRIVER_PATH}"
+        )
+        if result.status != 0:
+            raise HammerShellError(f'Failed to upload the hammer shell driver: {result.stderr}')
+        self._channel = self._client.session.session.open_session()
+        self._channel.execute(
+            f'LANG={settings.robottelo.locale} {shebang[2:]} {DRIVER_PATH} '
+            f'{hammer_bin} {self._delimiter.decode()}'
+        )
+        if self._read_line() != self._delimiter + b' ready':
+            self.close()
+            raise HammerShellError(f'Failed to start the hammer shell on {self.hostname}')
+        logger.debug(f'Started hammer shell on {self.hostname}')
+
+    def execute(self, args, timeout=None):
+        """Run hammer with the list of ``args`` and return its result
+
+        :param list args: the arguments passed to hammer
+        :param int timeout: time in ms to wait for the command to finish
+        :return: a result object with status, stdout and stderr, the same shape as the
+            results of ``broker.session.Session.run``
+        :raises HammerShellError: when the command could not be sent
+        :raises HammerShellCommandError: when the command was sent but its result could
+            not be read
+        """
+        if not self.running:
+            self.start()
+        self._client.session.session.set_timeout(timeout or self._client.default_timeout)
+        try:
+            self._channel.write(json.dumps(args) + '\n')
+        except Exception as err:
+            self.close()
+            raise HammerShellError(
+                f'Failed to send the command to the hammer shell: {err}'
+            ) from err
+        try:
+            header = self._read_line().split()
+            if len(header) != 4 or header[0] != self._delimiter:
+                raise HammerShellError(f'Unexpected hammer shell output: {header}')
+            status, stdout_size, stderr_size = (int(value) for value in header[1:])
+            stdout = self._read_exact(stdout_size).decode('utf-8', errors='replace')
+            stderr = self._read_exact(stderr_size)
+        except Exception as err:
+            # the process state is unknown, a new one will be started for the next command
+            self.close()
+            raise HammerShellCommandError(
+                f'Lost the result of hammer {" ".join(args)} on {self.hostname}: {err}'
+            ) from err
+        return Result(status=status, stdout=stdout, stderr=(len(stderr), stderr))
+
+    def close(self):
+        if self._channel is not None:
+            self._channel.close()
+            self._channel = None
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+        self._buffer = b''
+
+
+def split_command(command):
+    """Split a hammer command line in arguments as a shell would do
+
+    :return: the list of arguments or None if the command requires a shell
+    """
+    if any(char in command for char in SHELL_METACHARACTERS):
+        return None
+    return shlex.split(command)
+
+
+class HammerShellPool:
+    """The hammer shells of a satellite and user, checked out by a thread at a time
+
+    :param hostname: the satellite hostname
+    :param int size: maximum number of hammer shells, the threads needing one more
+        waiting for one to be checked in
+    """
+
+    def __init__(self, hostname, size):
+        self.hostname = hostname
+        self.size = size
+        self._idle = []
+        self._count = 0  # shells idle or checked out
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def shell(self):
+        """Check out an idle hammer shell, a new one if there is none and the pool is
+        not full"""
+        with self._cond:
+            while not self._idle and self._count >= self.size:
+                self._cond.wait()
+            if self._idle:
+                shell = self._idle.pop()
+            else:
+                shell = HammerShell(self.hostname)
+                self._count += 1
+        try:
+            yield shell
+        finally:
+            with self._cond:
+                # a shell which failed to start or stopped is dropped
+                if shell.running:
+                    self._idle.append(shell)
+                else:
+                    self._count -= 1
+                self._cond.notify()
+
+    def close(self):
+        """Stop the idle hammer shells"""
+        with self._cond:
+            for shell in self._idle:
+                shell.close()
+            self._count -= len(self._idle)
+            self._idle.clear()
+
+
+def get_pool(hostname, user=None):
+    """Return the pool of hammer shells of ``user`` on ``hostname``"""
+    key = (hostname, user)
+    with _lock:
+        if key not in _pools:
+            _pools[key] = HammerShellPool(
+                hostname, max(settings.performance.hammer_shell_pool_size, 1)
+            )
+        return _pools[key]
+
+
+def execute(command, hostname, timeout=None):
+    """Run the hammer ``command`` line through the persistent hammer process
+
+    :param str command: hammer arguments, as they would be passed to hammer in a shell
+    :param str hostname: the satellite hostname
+    :param int timeout: time in ms to wait for the command to finish
+    :return: a result object or None if the command can not be run by a hammer shell
+    :raises HammerShellCommandError: when the command was sent to the hammer shell but
+        its result was lost, the command is not run over ssh then as it may have been
+        run already
+    """
+    # commands recorded or replayed by a ssh transport are run by ContentHost.execute
+    if hostname in _unsupported_hosts or ssh.get_transport() is not None:
+        return None
+    args = split_command(command)
+    if args is None:
+        return None
+    user = args[args.index('-u') + 1] if '-u' in args[:-1] else None
+    with get_pool(hostname, user).shell() as shell:
+        if not shell.running:
+            try:
+                shell.start()
+            except HammerShellError as err:
+                logger.warning(f'Not using hammer shell on {hostname}: {err}')
+                _unsupported_hosts.add(hostname)
+                return None
+        try:
+            return shell.execute(args, timeout=timeout)
+        except HammerShellCommandError:
+            raise
+        except HammerShellError as err:
+            # the command was not sent, it is run by a new hammer
+            logger.warning(f'Hammer shell on {hostname} failed, running hammer over ssh: {err}')
+            return None
+
+
+def close_shells():
+    """Stop all the hammer processes"""
+    with _lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
@@ -30,6 +30,8 @@ class Product(Base):
 
     command_base = 'product'
     command_requires_org = True
+    # synchronizing or deleting a product changes its repositories
+    cache_dependents = ('repository',)
 
     @classmethod
     def remove_sync_plan(cls, options=None):
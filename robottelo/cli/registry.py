@@ -0,0 +1,117 @@
+"""Registry of the cli entity classes, bound to a satellite on first use"""
+import importlib
+
+# cli entity class name: module of robottelo.cli defining it
+CLI_CLASSES = {
+    'ActivationKey': 'activationkey',
+    'Admin': 'admin',
+    'Ansible': 'ansible',
+    'Architecture': 'architecture',
+    'Arfreport': 'arfreport',
+    'Auth': 'auth',
+    'AuthLogin': 'auth',
+    'Backup': 'sm_backup',
+    'Base': 'base',
+    'Capsule': 'capsule',
+    'ComputeProfile': 'computeprofile',
+    'ComputeResource': 'computeresource',
+    'ContentCredential': 'content_credentials',
+    'ContentExport': 'content_export',
+    'ContentImport': 'content_import',
+    'ContentView': 'contentview',
+    'ContentViewFilter': 'contentview',
+    'ContentViewFilterRule': 'contentview',
+    'Defaults': 'defaults',
+    'DiscoveredHost': 'discoveredhost',
+    'DiscoveryRule': 'discoveryrule',
+    'Docker': 'docker',
+    'DockerManifest': 'docker',
+    'DockerTag': 'docker',
+    'Domain': 'domain',
+    'Environment': 'environment',
+    'Erratum': 'erratum',
+    'ExternalAuthSource': 'ldapauthsource',
+    'Fact': 'fact',
+    'File': 'file',
+    'Filter': 'filter',
+    'GPGKey': 'gpgkey',
+    'GlobalParameter': 'globalparam',
+    'Health': 'sm_health',
+    'Host': 'host',
+    'HostCollection': 'hostcollection',
+    'HostGroup': 'hostgroup',
+    'HostInterface': 'host',
+    'HostTraces': 'host',
+    'HttpProxy': 'http_proxy',
+    'JobInvocation': 'job_invocation',
+    'JobTemplate': 'job_template',
+    'LDAPAuthSource': 'ldapauthsource',
+    'LifecycleEnvironment': 'lifecycleenvironment',
+    'Location': 'location',
+    'Medium': 'medium',
+    'Model': 'model',
+    'ModuleStream': 'module_stream',
+    'OperatingSys': 'operatingsys',
+    'Org': 'org',
+    'OstreeBranch': 'ostreebranch',
+    'Package': 'package',
+    'PartitionTable': 'partitiontable',
+    'Product': 'product',
+    'Proxy': 'proxy',
+    'Puppet': 'puppet',
+    'Realm': 'realm',
+    'RecurringLogic': 'recurring_logic',
+    'Report': 'report',
+    'ReportTemplate': 'report_template',
+    'Repository': 'repository',
+    'RepositorySet': 'repository_set',
+    'Restore': 'sm_restore',
+    'Role': 'role',
+    'Scapcontent': 'scapcontent',
+    'Scappolicy': 'scap_policy',
+    'Service': 'sm_service',
+    'Settings': 'settings',
+    'SmartClassParameter': 'scparams',
+    'Srpm': 'srpm',
+    'Subnet': 'subnet',
+    'Subscription': 'subscription',
+    'SyncPlan': 'syncplan',
+    'TailoringFiles': 'scap_tailoring_files',
+    'Task': 'task',
+    'Template': 'template',
+    'TemplateInput': 'template_input',
+    'TemplateSync': 'template_sync',
+    'Upgrade': 'sm_upgrade',
+    'User': 'user',
+    'UserGroup': 'usergroup',
+    'UserGroupExternal': 'usergroup',
+    'VirtWhoConfig': 'virt_who_config',
+}
+
+
+class CLINamespace:
+    """The cli entity classes of :data:`CLI_CLASSES` bound to a satellite
+
+    Each class is imported on its first access and subclassed with the satellite
+    hostname, leaving the shared class untouched for the other satellites. The bound
+    class is then stored as an attribute of the namespace, so later accesses are plain
+    attribute lookups.
+
+    :param str hostname: the satellite the commands of the bound classes are run on
+    """
+
+    def __init__(self, hostname):
+        self._hostname = hostname
+
+    def __getattr__(self, name):
+        try:
+            module = CLI_CLASSES[name]
+        except KeyError:
+            raise AttributeError(f'{type(self).__name__} has no cli class {name!r}') from None
+        cls = getattr(importlib.import_module(f'robottelo.cli.{module}'), name)
+        bound = type(name, (cls,), {'hostname': self._hostname, '__module__': cls.__module__})
+        # a class bound concurrently by another thread wins, so each name has one class
+        return self.__dict__.setdefault(name, bound)
+
+    def __dir__(self):
+        return sorted(set(super().__dir__()) | CLI_CLASSES.keys())
@@ -29,6 +29,8 @@ class Repository(Base):
 
     command_base = 'repository'
     command_requires_org = True
+    # synchronizing or removing repositories changes their product and content views
+    cache_dependents = ('product', 'content-view')
 
     @classmethod
     def create(cls, options=None):
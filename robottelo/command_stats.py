@@ -0,0 +1,148 @@
+"""Latency and volume statistics of the commands run on the remote hosts.
+
+Every command run by :func:`robottelo.ssh.command` is recorded with its wall
+time, the remote time reported by ``time -p`` when the command was timed, the
+bytes sent and received and its exit status. Hammer commands are grouped by
+``hammer <command_base> <command_sub>``, the other commands by their first word.
+
+At the end of the session, each xdist worker dumps its samples and the
+latency percentiles of all the workers are written to a json file and shown in
+the terminal summary.
+"""
+import json
+import math
+import re
+import threading
+from collections import defaultdict
+from collections import namedtuple
+
+Sample = namedtuple(
+    'Sample', ['group', 'host', 'wall', 'remote', 'bytes_sent', 'bytes_received', 'status']
+)
+
+PERCENTILES = (50, 95, 99)
+
+# the report appended to stderr by ``time -p``
+_time_report = re.compile(
+    r'(?:^|\n)real (?P<real>\d+(?:\.\d+)?)\nuser \d+(?:\.\d+)?\nsys \d+(?:\.\d+)?\n?$'
+)
+
+
+def parse_time_report(stderr):
+    """Split the ``time -p`` report from the end of a command stderr
+
+    :return: a tuple of the stderr without the report and the remote real time in
+        seconds, None if there is no report
+    """
+    match = _time_report.search(stderr)
+    if match is None:
+        return stderr, None
+    return stderr[: match.start()], float(match.group('real'))
+
+
+def command_group(command):
+    """Return the group of a command line: its first word, environment variables skipped"""
+    for word in command.split():
+        if '=' not in word:
+            return word
+    return ''
+
+
+def percentile(values, percent):
+    """Return the nearest-rank ``percent`` percentile of the sorted ``values``"""
+    if not values:
+        return None
+    return values[max(math.ceil(percent / 100 * len(values)) - 1, 0)]
+
+
+def summarize(samples):
+    """Compute the statistics of a list of samples
+
+    :return: a dict with the count, failures, bytes sent and received and the
+        percentiles and maximum of the wall and remote times
+    """
+    summary = {
+        'count': len(samples),
+        'failures': sum(1 for sample in samples if sample.status != 0),
+        'bytes_sent': sum(sample.bytes_sent for sample in samples),
+        'bytes_received': sum(sample.bytes_received for sample in samples),
+    }
+    for name in ('wall', 'remote'):
+        values = sorted(
+            getattr(sample, name) for sample in samples if getattr(sample, name) is not None
+        )
+        summary[name] = {f'p{percent}': percentile(values, percent) for percent in PERCENTILES}
+        summary[name]['max'] = values[-1] if values else None
+    return summary
+
+
+class CommandStats:
+    """Thread safe collection of the command samples of this process"""
+
+    def __init__(self):
+        self.samples = []
+        self._lock = threading.Lock()
+
+    def record(self, group, host, wall, remote=None, bytes_sent=0, bytes_received=0, status=0):
+        with self._lock:
+            self.samples.append(
+                Sample(group, host, round(wall, 4), remote, bytes_sent, bytes_received, status)
+            )
+
+    def clear(self):
+        with self._lock:
+            self.samples.clear()
+
+    def dump(self, path):
+        """Write the samples to ``path``, to be merged by :meth:`load`"""
+        with self._lock:
+            samples = list(self.samples)
+        with open(path, 'w') as dump_file:
+            json.dump(samples, dump_file)
+
+    def load(self, path):
+        """Add the samples dumped by another process"""
+        with open(path) as dump_file:
+            samples = [Sample(*sample) for sample in json.load(dump_file)]
+        with self._lock:
+            self.samples.extend(samples)
+
+    def report(self):
+        """Return the statistics of the samples grouped by command group and by host"""
+        with self._lock:
+            samples = list(self.samples)
+        groups, hosts = defaultdict(list), defaultdict(list)
+        for sample in samples:
+            groups[sample.group].append(sample)
+            hosts[sample.host].append(sample)
+        return {
+            'total': summarize(samples),
+            'groups': {group: summarize(values) for group, values in sorted(groups.items())},
+            'hosts': {host: summarize(values) for host, values in sorted(hosts.items())},
+        }
+
+
+def format_report(report, limit=20):
+    """Format the ``limit`` slowest command groups of a report as text table lines"""
+    lines = [
+        f'{"command":<50} {"count":>6} {"fail":>5} {"p50":>8} {"p95":>8} {"p99":>8} '
+        f'{"remote p95":>10} {"KiB recv":>9}'
+    ]
+    groups = sorted(
+        report['groups'].items(), key=lambda item: item[1]['wall']['p95'] or 0, reverse=True
+    )
+
+    def seconds(value):
+        return '-' if value is None else f'{value:.2f}'
+
+    for group, summary in groups[:limit]:
+        wall = summary['wall']
+        lines.append(
+            f'{group[:50]:<50} {summary["count"]:>6} {summary["failures"]:>5} '
+            f'{seconds(wall["p50"]):>8} {seconds(wall["p95"]):>8} {seconds(wall["p99"]):>8} '
+            f'{seconds(summary["remote"]["p95"]):>10} {summary["bytes_received"] / 1024:>9.1f}'
+        )
+    return lines
+
+
+command_stats = CommandStats()
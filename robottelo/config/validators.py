@@ -16,6 +16,8 @@ VALIDATORS = dict(
         Validator(
             'server.xdist_behavior', must_exist=True, is_in=['run-on-one', 'balance', 'on-demand']
         ),
+        Validator('server.on_demand_retry_limit', default=3, is_type_of=int),
+        Validator('server.on_demand_backoff', default=30),
         Validator('server.auto_checkin', default=False, is_type_of=bool),
         (
             Validator('server.ssh_key', must_exist=True)
@@ -30,10 +32,19 @@ VALIDATORS = dict(
         Validator('server.port', default=443),
         Validator('server.ssh_username', default='root'),
         Validator('server.ssh_password', default=None),
+        Validator('server.ssh_client.use_connection_pool', default=True, is_type_of=bool),
+        Validator('server.ssh_client.pool_idle_timeout', default=300),
+        Validator('server.ssh_client.stream_tail_lines', default=1000, is_type_of=int),
     ],
     content_host=[
         Validator('content_host.default_rhel_version', must_exist=True),
         Validator('content_host.deploy_workflow.default', must_exist=True),
+        Validator('content_host.fan_out_workers', default=10, is_type_of=int),
+        Validator('content_host.fact_ttl', default=60),
+        Validator('content_host.subscription_fact_ttl', default=0),
+        Validator('content_host.pool_size', default=0, gte=0),
+        Validator('content_host.pool_max_idle', default=1800),
+        Validator('content_host.pool_recycle', default=False, is_type_of=bool),
     ],
     subscription=[
         Validator('subscription.rhn_username', must_exist=True),
@@ -226,7 +237,25 @@ VALIDATORS = dict(
             must_exist=True,
         )
     ],
-    performance=[Validator('performance.time_hammer', default=False)],
+    performance=[
+        Validator('performance.time_hammer', default=False),
+        Validator('performance.hammer_shell', default=False),
+        Validator('performance.hammer_shell_pool_size', default=4, gte=1),
+        Validator('performance.list_page_size', default=0, gte=0),
+        Validator('performance.json_output', default=False),
+        Validator('performance.json_native_types', default=False),
+        Validator('performance.lazy_create', default=False),
+        Validator('performance.cli_cache', default=False),
+        Validator('performance.validate_hammer_options', default=False),
+        Validator(
+            'performance.hammer_commands_file', default='tests/foreman/data/hammer_commands.json'
+        ),
+        Validator('performance.command_stats', default=True),
+        Validator('performance.command_stats_file', default='command_stats.json'),
+        Validator('performance.ssh_transport.mode', default='', is_in=['', 'record', 'replay']),
+        Validator('performance.ssh_transport.file', default='ssh_recording.jsonl'),
+        Validator('performance.ssh_transport.simulate_latency', default=False),
+    ],
     report_portal=[
         Validator(
             'report_portal.portal_url',
@@ -0,0 +1,420 @@
+"""Warm pools of content hosts checked out by broker ahead of demand, and parallel
+checkouts of the hosts needed at once"""
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from broker import VMBroker
+
+from robottelo.command_stats import percentile
+from robottelo.hosts import ContentHost
+from robottelo.logging import logger
+
+
+def checkout_hosts(count, broker_args, host_class, retry_limit=3, backoff=30):
+    """Check out ``count`` hosts in parallel, retrying the failed checkouts together
+
+    The failed checkouts are retried up to ``retry_limit`` times, ``backoff`` seconds
+    after the first round, twice as long after each next one.
+
+    :param dict broker_args: the VMBroker arguments of the hosts
+    :param host_class: the class of the hosts returned by the checkouts
+    :return: the checked out hosts, fewer than ``count`` when some checkouts kept failing
+    """
+
+    def checkout(_):
+        try:
+            return VMBroker(host_classes={'host': host_class}, **broker_args).checkout() or None
+        except Exception as err:
+            logger.warning(f'Checkout of {broker_args} failed: {err!r}')
+
+    hosts = []
+    with ThreadPoolExecutor(max_workers=max(count, 1), thread_name_prefix='checkout') as workers:
+        for attempt in range(retry_limit + 1):
+            missing = count - len(hosts)
+            if not missing:
+                break
+            if attempt:
+                delay = backoff * 2 ** (attempt - 1)
+                logger.info(f'Retrying {missing} failed checkouts of {broker_args} in {delay}s')
+                time.sleep(delay)
+            hosts += [host for host in workers.map(checkout, range(missing)) if host]
+    return hosts
+
+
+class ContentHostPool:
+    """Content hosts of a broker configuration, checked out in the background
+
+    The pool keeps ``size`` hosts ready. Each host handed out by :meth:`acquire` is
+    replaced in the background, and the hosts given back to :meth:`release` are torn
+    down, then checked in in the background. A ready host unused for ``max_idle``
+    seconds is checked in and replaced in the background.
+
+    When the number of hosts the tests will acquire is known, the pool starts with a
+    single bulk checkout of the demand, up to ``size`` hosts. It does not keep more hosts
+    than the remaining demand, and keeps ``size`` hosts again once the tests acquire
+    more hosts than planned.
+
+    With ``recycle``, a released host is reset to the state it had when it was checked
+    out and handed out again, instead of being checked in and replaced. The acquired
+    hosts then count in the pool size, and a host left dirty by its test is checked in
+    and replaced.
+
+    Consecutive failed checkouts are retried ``backoff`` seconds later, twice as long
+    after each next failure. After ``retry_limit`` retries, the pool stops checking out
+    hosts and the next :meth:`acquire` raises the last checkout error.
+
+    :param dict conf: the VMBroker arguments of the hosts
+    :param int size: number of hosts kept ready
+    :param max_idle: seconds a ready host is kept, None keeps it until the pool is closed
+    :param demand: number of hosts the tests will acquire, None if unknown
+    :param bool recycle: reset the released hosts to hand them out again
+    :param int retry_limit: number of retries of the failed checkouts
+    :param backoff: seconds before retrying the first failed checkout
+    """
+
+    def __init__(
+        self,
+        conf,
+        size,
+        max_idle=None,
+        host_class=ContentHost,
+        demand=None,
+        recycle=False,
+        retry_limit=3,
+        backoff=30,
+    ):
+        self.conf = conf
+        self.size = size
+        self.max_idle = max_idle
+        self.demand = demand
+        self.recycle = recycle
+        self.host_class = host_class
+        self.retry_limit = retry_limit
+        self.backoff = backoff
+        self.waits = []  # seconds each acquire waited for its host
+        self.stats = {
+            'warm': 0,
+            'checkouts': 0,
+            'failures': 0,
+            'expired': 0,
+            'recycled': 0,
+            'dirty': 0,
+        }
+        self._ready = deque()  # (host, broker, ready since)
+        self._leased = {}  # id of the acquired hosts: their broker
+        self._pending = 0  # checkouts in progress
+        self._recycling = 0  # resets in progress
+        self._closed = False
+        self._failures = 0  # consecutive failed checkouts
+        self._retry_at = 0  # monotonic time before which no checkout is started
+        self._error = None  # the last checkout error
+        self._cond = threading.Condition()
+        self._workers = ThreadPoolExecutor(
+            max_workers=max(size, 1) + 1, thread_name_prefix='contenthost_pool'
+        )
+        if max_idle is not None:
+            threading.Thread(target=self._reap, name='contenthost_pool_reaper', daemon=True).start()
+        with self._cond:
+            count = self._target() if demand is not None else 0
+            if count > 1:
+                # a single broker call for the planned hosts
+                self._pending += count
+                self._workers.submit(self._checkout, count)
+            self._top_up()
+
+    def _broker(self, count=1):
+        kwargs = {'_count': count} if count > 1 else {}
+        return VMBroker(**self.conf, host_classes={'host': self.host_class}, **kwargs)
+
+    def _target(self):
+        return self.size if self.demand is None else min(self.size, self.demand)
+
+    def _held(self):
+        """Number of hosts counting in the pool size, with the lock held"""
+        held = len(self._ready) + self._pending
+        if self.recycle:
+            held += len(self._leased) + self._recycling
+        return held
+
+    def _gave_up(self):
+        return self._failures > self.retry_limit
+
+    def _top_up(self):
+        """Start the checkouts bringing the pool back to its size, with the lock held"""
+        if self._gave_up() or time.monotonic() < self._retry_at:
+            return
+        while not self._closed and self._held() < self._target():
+            self._pending += 1
+            self._workers.submit(self._checkout)
+
+    def _checkout(self, count=1):
+        """Check out ``count`` hosts with a single broker call and set them up"""
+        broker = self._broker(count)
+        error = Exception(f'Broker checked out fewer than {count} hosts of {self.conf}')
+        try:
+            hosts = broker.checkout()
+            hosts = hosts if isinstance(hosts, list) else [hosts]
+        except Exception as err:
+            logger.warning(f'Content host pool checkout of {self.conf} failed: {err!r}')
+            # the hosts of a bulk checkout which did not fail are checked in too
+            self._checkin(None, broker)
+            hosts, error = [], err
+        ready = []
+        for host in hosts:
+            try:
+                host.setup()
+                if self.recycle:
+                    host.save_baseline()
+                ready.append(host)
+            except Exception as err:
+                logger.warning(f'Setup of pooled content host {host.hostname} failed: {err!r}')
+                self._checkin(host, broker, teardown=False)
+                error = err
+        with self._cond:
+            self._pending -= count
+            self.stats['checkouts'] += len(ready)
+            self.stats['failures'] += count - len(ready)
+            if len(ready) < count:
+                self._checkout_failed(error)
+            else:
+                self._failures = 0
+            for host in ready:
+                if self._closed:
+                    self._workers.submit(self._checkin, host, broker)
+                else:
+                    self._ready.append((host, broker, time.monotonic()))
+            self._cond.notify_all()
+
+    def _checkout_failed(self, error):
+        """Delay the next checkouts after a failed one, with the lock held"""
+        self._error = error
+        if time.monotonic() < self._retry_at:
+            # started along with a checkout which already failed
+            return
+        self._failures += 1
+        if self._gave_up():
+            logger.error(
+                f'Content host pool of {self.conf} stopped checking out hosts after '
+                f'{self._failures} failed checkouts'
+            )
+            return
+        delay = self.backoff * 2 ** (self._failures - 1)
+        logger.info(f'Retrying the failed checkout of {self.conf} in {delay}s')
+        self._retry_at = time.monotonic() + delay
+
+    def _checkin(self, host, broker, teardown=True):
+        """Tear down ``host`` and check it in, all the hosts of ``broker`` when None"""
+        try:
+            if host is not None and teardown:
+                host.teardown()
+        except Exception as err:
+            logger.warning(f'Teardown of pooled content host {host.hostname} failed: {err!r}')
+        try:
+            broker.checkin(host=host)
+        except Exception as err:
+            logger.warning(f'Checkin of a pooled content host of {self.conf} failed: {err!r}')
+
+    def _recycle(self, host, broker):
+        """Reset a released host, to hand it out again if it is clean"""
+        try:
+            clean = host.reset()
+        except Exception as err:
+            logger.warning(f'Reset of pooled content host {host.hostname} failed: {err!r}')
+            clean = False
+        with self._cond:
+            self._recycling -= 1
+            self.stats['recycled' if clean else 'dirty'] += 1
+            # the demand may have dropped while the host was acquired
+            if clean and not self._closed and self._held() < self._target():
+                self._ready.append((host, broker, time.monotonic()))
+            else:
+                self._workers.submit(self._checkin, host, broker, teardown=False)
+                self._top_up()
+            self._cond.notify_all()
+
+    def _expire(self):
+        """Check in the ready hosts idle for more than max_idle, with the lock held"""
+        if self.max_idle is None:
+            return
+        now = time.monotonic()
+        while self._ready and now - self._ready[0][2] > self.max_idle:
+            host, broker, _ = self._ready.popleft()
+            self.stats['expired'] += 1
+            self._workers.submit(self._checkin, host, broker)
+
+    def _reap(self):
+        """Check in and replace the idle ready hosts until the pool is closed"""
+        with self._cond:
+            while not self._closed:
+                self._expire()
+                self._top_up()
+                # wait until the oldest ready host expires, the failed checkouts are
+                # retried, or the pool changes
+                now = time.monotonic()
+                timeout = self.max_idle
+                if self._ready:
+                    timeout -= now - self._ready[0][2]
+                if self._retry_at > now and not self._gave_up():
+                    timeout = min(timeout, self._retry_at - now)
+                self._cond.wait(timeout=max(timeout, 0) + 0.1)
+
+    def acquire(self):
+        """Return a ready host, waiting for the checkouts in progress if there is none
+
+        When no checkout is in progress, e.g. after failed ones, a host is checked out
+        directly, raising its checkout error.
+
+        :raises Exception: the last checkout error, once the pool stopped checking out
+            hosts after ``retry_limit`` retries; the pool retries again afterwards
+        """
+        start = time.monotonic()
+        with self._cond:
+            if self._gave_up():
+                error, self._error = self._error, None
+                self._failures, self._retry_at = 0, 0
+                raise error
+            if self.demand == 0:
+                # the tests scheduled on this worker acquire more hosts than planned
+                self.demand = None
+            self._expire()
+            if self._ready:
+                self.stats['warm'] += 1
+            # replace the expired hosts before waiting for them
+            self._top_up()
+            while not self._ready and (self._pending or self._recycling):
+                self._cond.wait()
+            entry = self._ready.popleft() if self._ready else None
+            if entry is not None:
+                host, broker, _ = entry
+                # a recycled host counts in the pool size while it is acquired
+                self._leased[id(host)] = broker
+            if self.demand:
+                self.demand -= 1
+            self._top_up()
+        if entry is None:
+            broker = self._broker()
+            try:
+                host = broker.checkout()
+                host.setup()
+                if self.recycle:
+                    host.save_baseline()
+            except Exception:
+                broker.checkin()
+                raise
+            with self._cond:
+                self._failures, self._retry_at = 0, 0
+                self._leased[id(host)] = broker
+        self.waits.append(time.monotonic() - start)
+        return host
+
+    def release(self, host):
+        """Tear down an acquired host, then check it in in the background, or reset it
+        in the background to hand it out again when recycling
+
+        The teardown is not run in the background, so the host is unregistered from the
+        satellite before the next test starts.
+        """
+        try:
+            host.teardown()
+        except Exception:
+            with self._cond:
+                broker = self._leased.pop(id(host))
+            self._workers.submit(self._checkin, host, broker, teardown=False)
+            raise
+        with self._cond:
+            broker = self._leased.pop(id(host))
+            if self.recycle and not self._closed:
+                self._recycling += 1
+                self._workers.submit(self._recycle, host, broker)
+                return
+        self._workers.submit(self._checkin, host, broker, teardown=False)
+
+    def close(self):
+        """Check in the ready hosts, waiting for the checkouts, resets and checkins in
+        progress"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            while self._ready:
+                host, broker, _ = self._ready.popleft()
+                self._workers.submit(self._checkin, host, broker)
+        # the checkouts and resets completing after the pool was closed submit their own
+        # checkin
+        while True:
+            with self._cond:
+                if not self._pending and not self._recycling:
+                    break
+                self._cond.wait()
+        self._workers.shutdown(wait=True)
+
+    def report(self):
+        """Return the wait time percentiles of the acquires with the pool statistics"""
+        waits = sorted(self.waits)
+        return dict(
+            self.stats,
+            acquired=len(waits),
+            wait={
+                'p50': percentile(waits, 50),
+                'p95': percentile(waits, 95),
+                'max': waits[-1] if waits else None,
+            },
+        )
+
+
+class ContentHostPools:
+    """The warm content host pools of a session, one per broker configuration
+
+    :param int size: number of hosts each pool keeps ready
+    :param max_idle: seconds a ready host is kept, None keeps it until the pools are closed
+    :param bool recycle: reset the released hosts to hand them out again
+    """
+
+    def __init__(self, size, max_idle=None, recycle=False):
+        self.size = size
+        self.max_idle = max_idle
+        self.recycle = recycle
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def get(self, conf, demand=None):
+        """Return the pool of the VMBroker arguments ``conf``, created on first use
+
+        :param demand: number of hosts the tests will acquire from a new pool
+        """
+        key = tuple(sorted(conf.items()))
+        with self._lock:
+            if key not in self._pools:
+                self._pools[key] = ContentHostPool(
+                    conf, self.size, max_idle=self.max_idle, demand=demand, recycle=self.recycle
+                )
+            return self._pools[key]
+
+    def plan(self, demands):
+        """Create the pools of the planned demands, their first hosts being checked out
+        in parallel, in a single broker call per pool
+
+        :param demands: ``(conf, count)`` tuples, the VMBroker arguments of the hosts and
+            the number of hosts the tests will acquire
+        """
+        for conf, count in demands:
+            self.get(conf, demand=count)
+
+    def close(self):
+        """Close the pools and log their reports"""
+        with self._lock:
+            pools = list(self._pools.values())
+        for pool in pools:
+            pool.close()
+        for conf, report in self.report().items():
+            logger.info(f'Content host pool {conf}: {report}')
+
+    def report(self):
+        """Return the report of each pool, keyed by its broker arguments"""
+        with self._lock:
+            pools = dict(self._pools)
+        return {
+            ', '.join(f'{name}={value}' for name, value in key): pool.report()
+            for key, pool in pools.items()
+        }
@@ -1,5 +1,12 @@
+import json
+import os
 import re
+import threading
 import time
+from collections import deque
+from collections import namedtuple
+from concurrent.futures import as_completed
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
 from functools import cached_property
 from pathlib import Path
@@ -11,17 +18,20 @@ from urllib.parse import urlunsplit
 import requests
 from broker import VMBroker
 from broker.hosts import Host
+from broker.session import Result
 from dynaconf.vendor.box.exceptions import BoxKeyError
 from fauxfactory import gen_alpha
 from fauxfactory import gen_string
 from nailgun import entities
 from packaging.version import Version
+from pytest_services.locks import file_lock
 from ssh2.exceptions import AuthenticationError
 from wait_for import TimedOutError
 from wait_for import wait_for
 from wrapanapi.entities.vm import VmState
 
 from robottelo import constants
+from robottelo import ssh
 from robottelo.api.utils import update_provisioning_template
 from robottelo.cli.factory import CLIFactoryError
 from robottelo.config import configure_airgun
@@ -48,19 +58,72 @@ POWER_OPERATIONS = {
 }
 
 
+# satellite facts resolved in this process, keyed by hostname
+_sat_facts = {}
+
+
+def _read_sat_facts(hostname):
+    """Read the satellite version and rhel version over ssh, None if not reachable"""
+    try:
+        satellite = Satellite(hostname)
+        # read the version and rhel version in a single round trip
+        package, release = satellite.execute_batch(['rpm -q satellite', 'cat /etc/redhat-release'])
+        satellite._redhat_release = _parse_redhat_release(release)
+        version = package.stdout.split('-')[1] if package.status == 0 else 'upstream'
+        return {'version': version, 'rhel_version': str(satellite.os_version)}
+    except (AuthenticationError, ContentHostError, BoxKeyError) as err:
+        logger.warning(f'Unable to read the version of satellite {hostname}: {err!r}')
+        return None
+
+
+def resolve_sat_facts(hostname=None):
+    """Return the version and rhel version of a satellite, reading them once per session
+
+    The facts are kept in memory for the later calls. When running with xdist, they
+    are also kept in a file shared by the workers of the test run, so only the first
+    worker asking for them connects to the satellite. The facts of an unreachable
+    satellite are not kept, so the later calls try to read them again.
+
+    :param str hostname: the satellite hostname, defaults to settings.server.hostname
+    :return: a dict with the version and rhel_version strings, None if the satellite
+        could not be reached
+    """
+    hostname = hostname or settings.server.hostname
+    if hostname in _sat_facts:
+        return _sat_facts[hostname]
+    run_id = os.environ.get('PYTEST_XDIST_TESTRUNUID')
+    if not run_id:
+        sat_facts = _read_sat_facts(hostname)
+        if sat_facts is not None:
+            _sat_facts[hostname] = sat_facts
+        return sat_facts
+    cache_file = robottelo_tmp_dir.joinpath(f'sat_facts_{run_id}.json')
+    with file_lock(f'{cache_file}.lock', remove=False, timeout=600):
+        facts = json.loads(cache_file.read_text()) if cache_file.exists() else {}
+        if hostname not in facts:
+            sat_facts = _read_sat_facts(hostname)
+            if sat_facts is not None:
+                # unreachable satellites are not stored, the other workers may reach them
+                facts[hostname] = sat_facts
+                cache_file.write_text(json.dumps(facts))
+    if hostname in facts:
+        _sat_facts[hostname] = facts[hostname]
+    return facts.get(hostname)
+
+
 def get_sat_version():
     """Try to read sat_version from envvar SATELLITE_VERSION
     if not available fallback to ssh connection to get it."""
 
-    try:
-        sat_version = Satellite().version
-    except (AuthenticationError, ContentHostError, BoxKeyError):
-        if hasattr(settings.server.version, 'release'):
-            sat_version = str(settings.server.version.release)
-        elif hasattr(settings.robottelo, 'satellite_version'):
-            sat_version = settings.robottelo.satellite_version
-        else:
-            sat_version = SATELLITE_VERSION
+    sat_facts = resolve_sat_facts()
+    if sat_facts:
+        sat_version = sat_facts['version']
+    elif hasattr(settings.server.version, 'release'):
+        sat_version = str(settings.server.version.release)
+    elif hasattr(settings.robottelo, 'satellite_version'):
+        sat_version = settings.robottelo.satellite_version
+    else:
+        sat_version = SATELLITE_VERSION
     return Version('9999' if 'nightly' in sat_version else sat_version)
 
 
@@ -68,13 +131,13 @@ def get_sat_rhel_version():
     """Try to read rhel_version from Satellite host
     if not available fallback to robottelo configuration."""
 
-    try:
-        rhel_version = Satellite().os_version
-    except (AuthenticationError, ContentHostError, BoxKeyError):
-        if hasattr(settings.server.version, 'rhel_version'):
-            rhel_version = str(settings.server.version.rhel_version)
-        elif hasattr(settings.robottelo, 'rhel_version'):
-            rhel_version = settings.robottelo.rhel_version
+    sat_facts = resolve_sat_facts()
+    if sat_facts:
+        rhel_version = sat_facts['rhel_version']
+    elif hasattr(settings.server.version, 'rhel_version'):
+        rhel_version = str(settings.server.version.rhel_version)
+    elif hasattr(settings.robottelo, 'rhel_version'):
+        rhel_version = settings.robottelo.rhel_version
     return Version(rhel_version)
 
 
@@ -116,9 +179,164 @@ class SatelliteHostError(Exception):
     pass
 
 
+class ContentHostFanOutError(ContentHostError):
+    """Raised when a method run by :meth:`ContentHost.fan_out` failed on some hosts
+
+    :param errors: dictionary of the exceptions raised, keyed by hostname
+    """
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__(
+            'Failed on {} host(s): {}'.format(
+                len(errors), ', '.join(f'{host}: {err!r}' for host, err in errors.items())
+            )
+        )
+
+
+class FanOutResult:
+    """Outcome of a method run on several hosts by :meth:`ContentHost.fan_out`
+
+    ``results`` holds the values returned and ``errors`` the exceptions raised,
+    both keyed by hostname in the order the hosts were given.
+    """
+
+    def __init__(self, results=None, errors=None):
+        self.results = results or {}
+        self.errors = errors or {}
+
+    @property
+    def ok(self):
+        return not self.errors
+
+    def raise_errors(self):
+        """Raise a ContentHostFanOutError if the method failed on any host"""
+        if self.errors:
+            raise ContentHostFanOutError(self.errors) from next(iter(self.errors.values()))
+
+
+class FactCache:
+    """Per host cache of the facts read from the host
+
+    A fact is kept until it is invalidated or, when it has a ttl, for ttl seconds.
+    ``stats`` counts the hits, misses and invalidations of the host cache and
+    ``FactCache.total_stats`` the ones of all the hosts.
+    """
+
+    total_stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+    def __init__(self):
+        self._facts = {}
+        self._lock = threading.RLock()
+        self.stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+    def __getstate__(self):
+        # the lock can not be pickled, and the facts are read again after unpickling
+        return {'stats': self.stats}
+
+    def __setstate__(self, state):
+        self.__init__()
+        self.stats.update(state['stats'])
+
+    def _count(self, stat):
+        self.stats[stat] += 1
+        FactCache.total_stats[stat] += 1
+
+    def get(self, name, compute, ttl=None):
+        """Return the cached value of the fact ``name``, calling ``compute`` on a miss
+
+        :param str name: the fact name
+        :param compute: callable returning the fact value
+        :param ttl: seconds the value is valid for, None to keep it until invalidated
+        """
+        with self._lock:
+            if name in self._facts:
+                value, expires = self._facts[name]
+                if expires is None or time.monotonic() < expires:
+                    self._count('hits')
+                    return value
+            self._count('misses')
+            value = compute()
+            self._facts[name] = (value, None if ttl is None else time.monotonic() + ttl)
+            return value
+
+    def peek(self, name, default=None):
+        """Return the cached value of the fact ``name`` if it is fresh, ``default`` otherwise"""
+        with self._lock:
+            if name in self._facts:
+                value, expires = self._facts[name]
+                if expires is None or time.monotonic() < expires:
+                    self._count('hits')
+                    return value
+            return default
+
+    def invalidate(self, *names):
+        """Forget the given facts, or all of them when no name is given"""
+        with self._lock:
+            for name in names or list(self._facts):
+                if self._facts.pop(name, None) is not None:
+                    self._count('invalidations')
+
+
+# Snapshot of the facts of a host read by ContentHost.profile: ``redhat_release`` holds
+# the distro, major and minor of /etc/redhat-release, None when it can not be read,
+# ``packages`` the ``rpm -q`` output of each of ContentHost.profile_packages, None when
+# not installed, and ``enabled_repos`` the ids of the enabled yum repositories
+HostProfile = namedtuple(
+    'HostProfile', ['redhat_release', 'ip_addr', 'packages', 'subscribed', 'enabled_repos']
+)
+
+
+def _parse_redhat_release(result):
+    """Return the distro, major and minor version of a ``cat /etc/redhat-release`` result"""
+    if result.status != 0:
+        raise ContentHostError(f'Not able to cat /etc/redhat-release "{result.stderr}"')
+    match = re.match(r'(?P<distro>.+) release (?P<major>\d+)(.(?P<minor>\d+))?', result.stdout)
+    if match is None:
+        raise ContentHostError(f'Not able to parse release string "{result.stdout}"')
+    return match.groupdict()
+
+
+class fact:
+    """Decorator turning a host method into a read-only property cached in the host facts
+
+    :param ttl: seconds the value is cached for, or the name of a setting holding it.
+        None keeps the value until the fact is invalidated, 0 does not cache it.
+    """
+
+    def __init__(self, ttl=None):
+        self.ttl = ttl
+
+    def __call__(self, func):
+        self.func = func
+        self.name = func.__name__
+        self.__doc__ = func.__doc__
+        return self
+
+    def __get__(self, host, owner=None):
+        if host is None:
+            return self
+        ttl = settings.get(self.ttl) if isinstance(self.ttl, str) else self.ttl
+        if ttl == 0:
+            return self.func(host)
+        return host.facts.get(self.name, lambda: self.func(host), ttl=ttl)
+
+
 class ContentHost(Host, ContentHostMixins):
     run = Host.execute
     default_timeout = settings.server.ssh_client.command_timeout
+    _subscription_commands = re.compile(
+        r'subscription-manager\s+(register|unregister|clean|remove|attach)|katello-ca-consumer'
+        # global registration and rhc
+        r'|/register\b|rhc\s+(connect|disconnect)'
+    )
+    # packages whose installed version is read by profile
+    profile_packages = ('satellite', 'satellite-capsule', 'subscription-manager')
+    # where save_baseline saves the host state restored by reset
+    _baseline_dir = '/root/.robottelo_baseline'
+    _baseline = None  # the profile saved by save_baseline
+    # configuration restored by reset, changed by the registration and content tests
+    baseline_paths = ('/etc/yum.repos.d', '/etc/rhsm', '/etc/dnf/modules.d', '/etc/insights-client')
 
     def __init__(self, hostname, auth=None, **kwargs):
         """ContentHost object with optional ssh connection
@@ -136,32 +354,264 @@ class ContentHost(Host, ContentHostMixins):
             kwargs.update({'key_filename': auth})
         super().__init__(hostname=hostname, **kwargs)
 
+    @classmethod
+    def fan_out(cls, hosts, method, *args, fail_fast=False, max_workers=None, **kwargs):
+        """Run the same method on several hosts at once, using a bounded thread pool
+
+        Example: ``ContentHost.fan_out(hosts, 'execute', 'yum -y update', fail_fast=True)``
+
+        The calls must not run commands on a host they share, like the satellite, its
+        ssh session can not be used by several threads at once. Run them before.
+
+        :param hosts: the ContentHost objects to run the method on
+        :param method: name of the host method to call, or a callable receiving the host
+            as first argument
+        :param args: positional arguments passed to the method, after the host for a callable
+        :param bool fail_fast: raise ContentHostFanOutError on the first failure, cancelling
+            the calls not started yet. When False, every call is run and the errors are
+            collected in the returned result.
+        :param int max_workers: maximum number of hosts handled at the same time,
+            defaults to ``settings.content_host.fan_out_workers``
+        :param kwargs: keyword arguments passed to the method
+        :return: a FanOutResult with the per-host return values and errors
+        """
+        hosts = list(hosts)
+        max_workers = max_workers or settings.content_host.fan_out_workers
+
+        def call(host):
+            if isinstance(method, str):
+                return getattr(host, method)(*args, **kwargs)
+            return method(host, *args, **kwargs)
+
+        results, errors = {}, {}
+        if hosts:
+            with ThreadPoolExecutor(
+                max_workers=min(max_workers, len(hosts)), thread_name_prefix='fan_out'
+            ) as executor:
+                futures = {executor.submit(call, host): host for host in hosts}
+                for future in as_completed(futures):
+                    hostname = futures[future].hostname
+                    try:
+                        results[hostname] = future.result()
+                    except Exception as err:
+                        logger.warning(f'{method} failed on {hostname}: {err!r}')
+                        errors[hostname] = err
+                        if fail_fast:
+                            for pending in futures:
+                                pending.cancel()
+                            break
+        ordered = [host.hostname for host in hosts]
+        outcome = FanOutResult(
+            results={host: results[host] for host in ordered if host in results},
+            errors={host: errors[host] for host in ordered if host in errors},
+        )
+        if fail_fast:
+            outcome.raise_errors()
+        return outcome
+
+    def execute_batch(self, commands, stop_on_failure=False, timeout=None):
+        """Run several commands in a single ssh round trip
+
+        The commands are sent as one script, each of them running in its own
+        subshell, and their framed output is split back per command.
+
+        :param list commands: the commands to run, in order
+        :param bool stop_on_failure: do not run the commands following a failed one,
+            their results have a -1 status
+        :param int timeout: time in ms to wait for all the commands to finish
+        :return: a list of result objects with status, stdout and stderr, one per
+            command, stderr being a ``(size, bytes)`` tuple as in :meth:`execute` results
+        :raises robottelo.hosts.ContentHostError: if the output of some commands is
+            missing, e.g. when the batch timed out
+        """
+        delimiter = ssh.batch_delimiter(commands)
+        result = self.execute(
+            ssh.batch_script(commands, delimiter, stop_on_failure=stop_on_failure),
+            timeout=timeout,
+        )
+        results = ssh.parse_batch_output(result.stdout, delimiter)
+        if stop_on_failure and results and results[-1].status != 0:
+            not_run = f'not run, command {len(results)} of the batch failed'.encode()
+            results += [
+                Result(status=-1, stdout='', stderr=(len(not_run), not_run))
+                for _ in commands[len(results) :]  # noqa: E203
+            ]
+        if len(results) != len(commands):
+            raise ContentHostError(
+                f'Batch on {self.hostname} returned {len(results)} results for '
+                f'{len(commands)} commands, status {result.status}'
+            )
+        return results
+
+    def stream(self, command, timeout=None):
+        """Run a command, iterating over its output lines as they arrive
+
+        :param str command: the command to run
+        :param timeout: time in ms to wait for the command to finish, 0 waits forever
+        :return: an iterable of ``(name, line)`` tuples, ``name`` being ``stdout`` or
+            ``stderr``, with the command exit status in its ``status`` attribute once
+            exhausted
+        """
+        timeout = self.default_timeout if timeout is None else timeout
+        logger.debug(f'{self.hostname} streaming command: {command}')
+        return ssh.OutputStream(self.session.session, command, timeout=timeout)
+
+    def execute_stream(self, command, timeout=None, abort_pattern=None, tail_lines=None):
+        """Run a long running command, logging its output lines as they arrive
+
+        Only the last lines of the output are kept in memory and returned, the callers
+        parsing the output must keep enough lines with ``tail_lines``. The command
+        invalidates the cached facts and is recorded in the command statistics like
+        with :meth:`execute`.
+
+        :param str command: the command to run
+        :param timeout: time in ms to wait for the command to finish, 0 waits forever
+        :param abort_pattern: regular expression, the command is terminated as soon as
+            an output line matches it and the result status is -1
+        :param int tail_lines: number of the last stdout and stderr lines to keep, 0
+            keeps all of them, defaults to ``settings.server.ssh_client.stream_tail_lines``
+        :return: a result object with status, stdout and stderr tails, stderr being a
+            ``(size, bytes)`` tuple as in :meth:`execute` results, and the line matching
+            ``abort_pattern`` in ``aborted``, if any
+        """
+        if ssh.get_transport() is not None:
+            # recorded and replayed commands are not streamed
+            result = self.execute(command, timeout=timeout)
+            return Result(
+                status=result.status, stdout=result.stdout, stderr=result.stderr, aborted=None
+            )
+        if tail_lines is None:
+            tail_lines = settings.server.ssh_client.stream_tail_lines
+        tail_lines = tail_lines or None
+        if isinstance(abort_pattern, str):
+            abort_pattern = re.compile(abort_pattern)
+        tails = {'stdout': deque(maxlen=tail_lines), 'stderr': deque(maxlen=tail_lines)}
+        aborted = None
+        self._invalidate_facts(command)
+        start = time.monotonic()
+        stream = self.stream(command, timeout=timeout)
+        for name, line in stream:
+            logger.debug(f'{self.hostname} {name}: {line}')
+            tails[name].append(line)
+            if abort_pattern and abort_pattern.search(line):
+                logger.error(f'{self.hostname} aborting {command}, output matched: {line}')
+                aborted = line
+                stream.close()
+                break
+        stderr = '\n'.join(tails['stderr']).encode('utf-8')
+        result = Result(
+            status=-1 if aborted else stream.status,
+            stdout='\n'.join(tails['stdout']),
+            stderr=(len(stderr), stderr),
+            aborted=aborted,
+        )
+        ssh.record_command(self.hostname, command, result, time.monotonic() - start)
+        return result
+
     @property
+    def facts(self):
+        """The cache of the facts read from this host"""
+        # broker may replace the cache by None when pickling the host
+        if not isinstance(self.__dict__.get('_fact_cache'), FactCache):
+            self._fact_cache = FactCache()
+        return self._fact_cache
+
+    @fact(ttl='content_host.subscription_fact_ttl')
     def nailgun_host(self):
         """If this host is subscribed, provide access to its nailgun object"""
         if self.subscribed:
             return entities.Host().search(query={'search': self.hostname})[0]
 
-    @property
+    @fact(ttl='content_host.subscription_fact_ttl')
     def subscribed(self):
         """Boolean representation of a content host's subscription status"""
+        # the status in the profile is as stale as a cached one
+        profile = (
+            self.facts.peek('profile') if settings.content_host.subscription_fact_ttl else None
+        )
+        if profile is not None:
+            return profile.subscribed
         return 'Status: Unknown' not in self.execute('subscription-manager status').stdout
 
-    @property
+    @fact()
     def ip_addr(self):
+        profile = self.facts.peek('profile')
+        if profile is not None:
+            return profile.ip_addr
         ipv4, ipv6 = self.execute('hostname -I').stdout.split()
         return ipv4
 
+    def invalidate_subscription_facts(self):
+        """Forget the cached facts depending on the host registration"""
+        self.facts.invalidate('subscribed', 'nailgun_host', 'profile')
+
+    def profile(self, refresh=False):
+        """Read the facts most used by the tests in a single round trip
+
+        The snapshot is cached for ``settings.content_host.fact_ttl`` seconds. While it
+        is fresh, the ``os_distro``, ``os_version``, ``ip_addr``, ``is_upstream`` and
+        ``version`` properties read it instead of running their own command, and so does
+        ``subscribed`` when ``settings.content_host.subscription_fact_ttl`` is set.
+
+        :param bool refresh: read the snapshot again even if the cached one is fresh
+        :return: a :class:`HostProfile`
+        """
+        if refresh:
+            self.facts.invalidate('profile')
+        return self.facts.get('profile', self._read_profile, ttl=settings.content_host.fact_ttl)
+
+    def _read_profile(self):
+        release, hostname, packages, status, repos = self.execute_batch(
+            [
+                'cat /etc/redhat-release',
+                'hostname -I',
+                'rpm -q {}'.format(' '.join(self.profile_packages)),
+                'subscription-manager status',
+                # the cached metadata is enough to list the enabled repositories
+                'yum -C -q repolist enabled',
+            ]
+        )
+        try:
+            redhat_release = _parse_redhat_release(release)
+        except ContentHostError:
+            redhat_release = None
+        # the package lines are in the order of the queried packages
+        package_lines = packages.stdout.splitlines()
+        return HostProfile(
+            redhat_release=redhat_release,
+            ip_addr=next(iter(hostname.stdout.split()), None),
+            packages={
+                name: None if line.endswith(' is not installed') else line
+                for name, line in zip(self.profile_packages, package_lines)
+            },
+            subscribed='Status: Unknown' not in status.stdout,
+            enabled_repos=tuple(
+                line.split()[0].lstrip('!*').split('/')[0]
+                for line in repos.stdout.splitlines()
+                if line.strip() and not line.startswith(('repo id', 'repolist:'))
+            ),
+        )
+
+    def _invalidate_facts(self, command):
+        """Forget the cached facts ``command`` changes"""
+        # registering, unregistering or cleaning the host changes its subscription facts
+        if isinstance(command, str) and self._subscription_commands.search(command):
+            self.invalidate_subscription_facts()
+
+    def execute(self, command, timeout=None):
+        self._invalidate_facts(command)
+        transport = ssh.get_transport()
+        if transport is not None:
+            return transport.execute(self, command, timeout, super().execute)
+        return super().execute(command, timeout=timeout)
+
     @cached_property
     def _redhat_release(self):
         """Process redhat-release file for distro and version information"""
-        result = self.execute('cat /etc/redhat-release')
-        if result.status != 0:
-            raise ContentHostError(f'Not able to cat /etc/redhat-release "{result.stderr}"')
-        match = re.match(r'(?P<distro>.+) release (?P<major>\d+)(.(?P<minor>\d+))?', result.stdout)
-        if match is None:
-            raise ContentHostError(f'Not able to parse release string "{result.stdout}"')
-        return match.groupdict()
+        profile = self.facts.peek('profile')
+        if profile is not None and profile.redhat_release is not None:
+            return profile.redhat_release
+        return _parse_redhat_release(self.execute('cat /etc/redhat-release'))
 
     @cached_property
     def os_distro(self):
@@ -187,8 +637,79 @@ class ContentHost(Host, ContentHostMixins):
     def teardown(self):
         if self.nailgun_host:
             self.nailgun_host.delete()
+            self.invalidate_subscription_facts()
         self.unregister()
 
+    def _config_hashes(self):
+        """Shell command listing the sha256 of the files of baseline_paths"""
+        paths = ' '.join(self.baseline_paths)
+        return f'find {paths} -type f 2>/dev/null | sort | xargs -r sha256sum'
+
+    def save_baseline(self):
+        """Save the installed packages and the configuration files of the host, to be
+        restored by :meth:`reset`"""
+        path = self._baseline_dir
+        paths = ' '.join(self.baseline_paths)
+        self.execute(
+            '\n'.join(
+                [
+                    f'mkdir -p {path}',
+                    f'rpm -qa | sort > {path}/rpms',
+                    f"rpm -qa --qf '%{{NAME}}\\n' | sort -u > {path}/names",
+                    f'{self._config_hashes()} > {path}/config.sha256',
+                    f'tar -czPf {path}/config.tar.gz $(ls -d {paths} 2>/dev/null)',
+                ]
+            )
+        )
+        self._baseline = self.profile(refresh=True)
+
+    def reset(self):
+        """Bring the host back to the state saved by :meth:`save_baseline` in a single
+        script, and check it with a fresh :meth:`profile`
+
+        The host is unregistered from the satellite and insights, the packages installed
+        since the baseline, like the katello-ca, are removed, and the files of
+        ``baseline_paths`` are restored, e.g. the yum repositories, the rhsm
+        configuration and facts, and the dnf modules. The hostname is kept, the tests
+        looking their host up by its hostname.
+
+        :return: True if the host is back to its baseline, False if it is dirty, e.g. when
+            packages of the baseline were updated or removed, or when no baseline was saved
+        """
+        if self._baseline is None:
+            return False
+        path = self._baseline_dir
+        paths = ' '.join(self.baseline_paths)
+        result = self.execute(
+            '\n'.join(
+                [
+                    'subscription-manager unregister',
+                    'subscription-manager clean',
+                    '[ ! -e /etc/insights-client/.registered ] || insights-client --unregister',
+                    f"rpm -qa --qf '%{{NAME}}\\n' | sort -u | comm -13 {path}/names - "
+                    '| xargs -r yum erase -y',
+                    '[ ! -f /usr/sbin/virt-what.old ] || mv -f /usr/sbin/virt-what.old '
+                    '/usr/sbin/virt-what',
+                    f'rm -rf {paths}',
+                    f'tar -xzPf {path}/config.tar.gz',
+                    f'restorecon -R $(ls -d {paths} 2>/dev/null)',
+                    f'echo "changed packages: $(rpm -qa | sort | comm -23 {path}/rpms - | wc -l)"',
+                    f'echo "changed files: $({self._config_hashes()} | diff - {path}/config.sha256'
+                    " | grep -c '^[<>]')\"",
+                ]
+            )
+        )
+        if not result.stdout.rstrip().endswith('changed packages: 0\nchanged files: 0'):
+            return False
+        # the enabled repositories are listed from the yum cache, read before cleaning it
+        profile = self.profile(refresh=True)
+        self.execute('yum clean all')
+        return (
+            not profile.subscribed
+            and profile[:3] == self._baseline[:3]
+            and set(profile.enabled_repos) <= set(self._baseline.enabled_repos)
+        )
+
     def power_control(self, state=VmState.RUNNING, ensure=True):
         """Lookup the host workflow for power on and execute
 
@@ -221,6 +742,8 @@ class ContentHost(Host, ContentHostMixins):
             == 'successful'
         )
 
+        # the host may get a new address on restart
+        self.facts.invalidate()
         if ensure and state in [VmState.RUNNING, 'reboot']:
             try:
                 wait_for(
@@ -546,20 +1069,22 @@ class ContentHost(Host, ContentHostMixins):
         key_content = key_content.strip()
         ssh_path = PurePath('~/.ssh')
         auth_file = ssh_path.joinpath('authorized_keys')
-        # ensure ssh directory exists
-        self.execute(f'mkdir -p {ssh_path}')
-        # append the key if doesn't exists
-        self.execute(
-            "grep -q '{key}' {dest} || echo '{key}' >> {dest}".format(
-                key=key_content, dest=auth_file
-            )
+        self.execute_batch(
+            [
+                # ensure ssh directory exists
+                f'mkdir -p {ssh_path}',
+                # append the key if doesn't exists
+                "grep -q '{key}' {dest} || echo '{key}' >> {dest}".format(
+                    key=key_content, dest=auth_file
+                ),
+                # set proper permissions
+                f'chmod 700 {ssh_path}',
+                f'chmod 600 {auth_file}',
+                f'chown -R {self.username} {ssh_path}',
+                # Restore SELinux context with restorecon, if it's available:
+                f'command -v restorecon && restorecon -RvF {ssh_path} || true',
+            ]
         )
-        # set proper permissions
-        self.execute(f'chmod 700 {ssh_path}')
-        self.execute(f'chmod 600 {auth_file}')
-        self.execute(f'chown -R {self.username} {ssh_path}')
-        # Restore SELinux context with restorecon, if it's available:
-        self.execute(f'command -v restorecon && restorecon -RvF {ssh_path} || true')
 
     def add_rex_key(self, satellite, key_path=None):
         """Read a public key from the passed Satellite, and add it to authorized_keys
@@ -956,7 +1481,7 @@ class ContentHost(Host, ContentHostMixins):
             result = self.execute('service virt-who stop')
             if result.status != 0:
                 raise CLIFactoryError(f'Failed to stop the virt-who service:\n{result.stderr}')
-            result = self.execute('virt-who --one-shot', timeout=900000)
+            result = self.execute_stream('virt-who --one-shot', timeout=900000)
             if result.status != 0:
                 raise CLIFactoryError(
                     f'Failed when executing virt-who --one-shot:\n{result.stderr}'
@@ -1029,12 +1554,16 @@ class ContentHost(Host, ContentHostMixins):
             'extensions.txt',
         ]:
             self.session.sftp_write(get_data_file(file), f'/root/{file}')
-        self.execute('echo 100001 > serial')
-        self.execute('bash generate-ca.sh')
-        result = self.execute(f'yes | bash generate-crt.sh {self.hostname}')
-        assert result.status == 0
-        result = self.execute('bash certs.sh')
-        assert result.status == 0
+        results = self.execute_batch(
+            [
+                'echo 100001 > serial',
+                'bash generate-ca.sh',
+                f'yes | bash generate-crt.sh {self.hostname}',
+                'bash certs.sh',
+            ]
+        )
+        assert results[2].status == 0
+        assert results[3].status == 0
 
     def custom_certs_cleanup(self):
         """cleanup all cert configuration files"""
@@ -1072,18 +1601,25 @@ class Capsule(ContentHost):
 
         return NailgunCapsule().search(query={'search': f'name={self.hostname}'})[0]
 
-    @cached_property
+    @fact()
     def is_upstream(self):
         """Figure out which product distribution is installed on the server.
 
         :return: True if no downstream satellite RPMS are installed
         :rtype: bool
         """
+        profile = self.facts.peek('profile')
+        if profile is not None and 'satellite-capsule' in profile.packages:
+            return profile.packages['satellite-capsule'] is None
         return self.execute('rpm -q satellite-capsule &>/dev/null').status != 0
 
-    @cached_property
+    @fact()
     def version(self):
         if not self.is_upstream:
+            profile = self.facts.peek('profile')
+            package = profile.packages.get('satellite-capsule') if profile else None
+            if package:
+                return package.split('-')[2]
             return self.execute('rpm -q satellite-capsule').stdout.split('-')[2]
         else:
             return 'upstream'
@@ -1116,13 +1652,20 @@ class Capsule(ContentHost):
             if error_msg in line:
                 return line.replace(error_msg, '').strip()
 
-    def install(self, installer_obj=None, cmd_args=None, cmd_kwargs=None):
-        """General purpose installer"""
+    def install(self, installer_obj=None, cmd_args=None, cmd_kwargs=None, tail_lines=None):
+        """General purpose installer
+
+        :param int tail_lines: number of the last output lines returned, see
+            :meth:`ContentHost.execute_stream`
+        """
         if not installer_obj:
             command_opts = {'scenario': self.__class__.__name__.lower()}
             command_opts.update(cmd_kwargs)
             installer_obj = InstallerCommand(*cmd_args, **command_opts)
-        return self.execute(installer_obj.get_command(), timeout=0)
+        result = self.execute_stream(installer_obj.get_command(), timeout=0, tail_lines=tail_lines)
+        # the installed product and its configuration may have changed
+        self.facts.invalidate('is_upstream', 'version', 'is_remote_db')
+        return result
 
     def get_features(self):
         """Get capsule features"""
@@ -1152,7 +1695,7 @@ class Capsule(ContentHost):
         self.satellite = sat_host or Satellite()
         self.register_to_dogfood(ak_type='capsule')
         # self.execute('yum repolist')
-        self.execute('yum -y update', timeout=0)
+        self.execute_stream('yum -y update', timeout=0)
 
         # workaround from DF for RHEL8
         if settings.server.version.rhel_version == 8:
@@ -1202,70 +1745,36 @@ class Satellite(Capsule, SatelliteMixins):
         hostname = hostname or settings.server.hostname  # instance attr set by broker.Host
         self.port = kwargs.get('port', settings.server.port)
         super().__init__(hostname=hostname, **kwargs)
-        # create dummy classes for later population
-        self._api = type('api', (), {'_configured': False})
-        self._cli = type('cli', (), {'_configured': False})
+        # namespaces of the api and cli entities, created on first use
+        self._api = None
+        self._cli = None
         self._ui_session = None
 
     @property
     def api(self):
-        """Import all nailgun entities and wrap them under self.api"""
-        if not self._api:
-            self._api = type('api', (), {'_configured': False})
-        if self._api._configured:
-            return self._api
-
-        from nailgun.config import ServerConfig
-        from nailgun.entity_mixins import Entity
-
-        def inject_config(cls, server_config):
-            """inject a nailgun server config into the init of nailgun entity classes"""
-            import functools
-
-            class DecClass(cls):
-                __init__ = functools.partialmethod(cls.__init__, server_config=server_config)
-
-            return DecClass
-
-        # set the server configuration to point to this satellite
-        self.nailgun_cfg = ServerConfig(
-            auth=(settings.server.admin_username, settings.server.admin_password),
-            url=f'{self.url}',
-            verify=False,
-        )
-        # add each nailgun entity to self.api, injecting our server config
-        for name, obj in entities.__dict__.items():
-            try:
-                if Entity in obj.mro():
-                    setattr(self._api, name, inject_config(obj, self.nailgun_cfg))
-            except AttributeError:
-                # not everything has an mro method, we don't care about them
-                pass
+        """nailgun entities injected with the server config of this satellite, wrapped on
+        first use"""
+        if self._api is None:
+            from nailgun.config import ServerConfig
+
+            from robottelo.api.registry import APINamespace
+
+            # set the server configuration to point to this satellite
+            self.nailgun_cfg = ServerConfig(
+                auth=(settings.server.admin_username, settings.server.admin_password),
+                url=f'{self.url}',
+                verify=False,
+            )
+            self._api = APINamespace(self.nailgun_cfg)
         return self._api
 
     @property
     def cli(self):
-        """Import all robottelo cli entities and wrap them under self.cli"""
-        if not self._cli:
-            self._cli = type('cli', (), {'_configured': False})
-        if self._cli._configured:
-            return self._cli
-
-        import importlib
-        from robottelo.cli.base import Base
-
-        for file in Path('robottelo/cli/').iterdir():
-            if file.suffix == '.py' and not file.name.startswith('_'):
-                cli_module = importlib.import_module(f'robottelo.cli.{file.stem}')
-                for name, obj in cli_module.__dict__.items():
-                    try:
-                        if Base in obj.mro():
-                            # set our hostname as a class attribute
-                            obj.hostname = self.hostname
-                            setattr(self._cli, name, obj)
-                    except AttributeError:
-                        # not everything has an mro method, we don't care about them
-                        pass
+        """robottelo cli entities bound to this satellite, imported on first use"""
+        if self._cli is None:
+            from robottelo.cli.registry import CLINamespace
+
+            self._cli = CLINamespace(self.hostname)
         return self._cli
 
     @property
@@ -1291,28 +1800,36 @@ class Satellite(Capsule, SatelliteMixins):
         )
         return self._ui_session
 
-    @cached_property
+    @fact()
     def is_upstream(self):
         """Figure out which product distribution is installed on the server.
 
         :return: True if no downstream satellite RPMS are installed
         :rtype: bool
         """
+        profile = self.facts.peek('profile')
+        if profile is not None and 'satellite' in profile.packages:
+            return profile.packages['satellite'] is None
         return self.execute('rpm -q satellite &>/dev/null').status != 0
 
-    @cached_property
+    @fact()
     def version(self):
         if not self.is_upstream:
+            profile = self.facts.peek('profile')
+            package = profile.packages.get('satellite') if profile else None
+            if package:
+                return package.split('-')[1]
             return self.execute('rpm -q satellite').stdout.split('-')[1]
         else:
             return 'upstream'
 
     def is_remote_db(self):
-        return (
-            self.execute(
+        return self.facts.get(
+            'is_remote_db',
+            lambda: self.execute(
                 'grep "db_manage: false" /etc/foreman-installer/scenarios.d/satellite-answers.yaml'
             ).status
-            == 0
+            == 0,
         )
 
     def capsule_certs_generate(self, capsule, cert_path=None, **extra_kwargs):
@@ -1423,7 +1940,7 @@ class Satellite(Capsule, SatelliteMixins):
         return default_setting_value
 
     def install_cockpit(self):
-        cmd_result = self.execute(
+        cmd_result = self.execute_stream(
             'satellite-installer --enable-foreman-plugin-remote-execution-cockpit', timeout='30m'
         )
         if cmd_result.status != 0:
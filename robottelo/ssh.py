@@ -1,5 +1,228 @@
 """Utility module to handle the shared ssh connection."""
+import gzip
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import defaultdict
+
+from broker.helpers import translate_timeout
+from broker.session import Result
+from ssh2.error_codes import LIBSSH2_ERROR_EAGAIN
+from ssh2.exceptions import SocketDisconnectError
+from ssh2.exceptions import SocketRecvError
+from ssh2.exceptions import SocketSendError
+
+from robottelo import command_stats
 from robottelo.cli import hammer
+from robottelo.logging import logger
+
+# errors raised when a pooled connection was dropped by the remote end
+CONNECTION_ERRORS = (SocketDisconnectError, SocketRecvError, SocketSendError, ConnectionError)
+
+
+class SSHConnectionPool:
+    """Keep ssh connections open between commands sent to the same host
+
+    Connections are keyed by (hostname, username, port, auth) and by the calling
+    thread, as a ssh2 session must not be used by two threads at the same time. So
+    a thread only closes its own connections not used for more than ``idle_timeout``
+    seconds, and the connections of the threads which ended. A connection unused
+    for more than ``check_after`` seconds is checked before being handed out again,
+    and replaced if the remote end dropped it.
+
+    :param factory: callable receiving hostname, username and password, returning a
+        host object. Defaults to :class:`robottelo.hosts.ContentHost`.
+    :param idle_timeout: seconds after which an unused connection is closed.
+        Defaults to ``settings.server.ssh_client.pool_idle_timeout``, a falsy value
+        keeps the connections open until :meth:`close_all` is called.
+    """
+
+    check_after = 30
+
+    def __init__(self, factory=None, idle_timeout=None):
+        self._factory = factory
+        self._idle_timeout = idle_timeout
+        self._connections = {}  # key: (client, last used, owning thread)
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'reconnects': 0, 'evictions': 0}
+
+    @property
+    def idle_timeout(self):
+        if self._idle_timeout is None:
+            from robottelo.config import settings
+
+            return settings.server.ssh_client.pool_idle_timeout
+        return self._idle_timeout
+
+    def _create_client(self, hostname, username, password):
+        if self._factory is not None:
+            return self._factory(hostname=hostname, username=username, password=password)
+        from robottelo.hosts import ContentHost
+
+        return ContentHost(hostname=hostname, username=username, password=password)
+
+    def _evict_idle(self, now):
+        """Close the connections of the current thread not used for more than
+        idle_timeout seconds, and the connections of the ended threads"""
+        idle_timeout = self.idle_timeout
+        current = threading.current_thread()
+        for key, (client, last_used, thread) in list(self._connections.items()):
+            if thread.is_alive() and not (
+                thread is current and idle_timeout and now - last_used > idle_timeout
+            ):
+                continue
+            del self._connections[key]
+            self.stats['evictions'] += 1
+            logger.debug(f'Closing ssh connection to {client.hostname} idle since {last_used}')
+            client.close()
+
+    def _check(self, client):
+        """Replace the connection of ``client`` if the remote end dropped it"""
+        try:
+            client.session.session.open_session().close()
+        except CONNECTION_ERRORS as err:
+            logger.warning(f'ssh connection to {client.hostname} was dropped: {err!r}')
+            self.reconnect(client)
+
+    def get(self, hostname, username, password=None, port=22):
+        """Return a live client for the current thread, creating it if needed"""
+        key = (hostname, username, port, password, threading.get_ident())
+        now = time.monotonic()
+        idle = 0
+        with self._lock:
+            self._evict_idle(now)
+            if key in self._connections:
+                client, last_used, _ = self._connections[key]
+                idle = now - last_used
+                self.stats['hits'] += 1
+            else:
+                client = self._create_client(hostname, username, password)
+                self.stats['misses'] += 1
+            self._connections[key] = (client, now, threading.current_thread())
+        if idle > self.check_after:
+            self._check(client)
+        return client
+
+    def release(self, client):
+        """Mark a client as used until now, once its command returned"""
+        now = time.monotonic()
+        with self._lock:
+            for key, (pooled, _, thread) in self._connections.items():
+                if pooled is client:
+                    self._connections[key] = (client, now, thread)
+                    break
+
+    def reconnect(self, client):
+        """Replace the dropped session of a pooled client by a new one"""
+        with self._lock:
+            self.stats['reconnects'] += 1
+        client.connect()
+
+    def close_all(self):
+        """Close every pooled connection"""
+        with self._lock:
+            for client, _, _ in self._connections.values():
+                client.close()
+            self._connections.clear()
+
+    def __len__(self):
+        return len(self._connections)
+
+
+_pool = SSHConnectionPool()
+
+
+class OutputStream:
+    """Run a command on a ssh2 session and iterate over its output lines as they arrive
+
+    Iterating yields ``(name, line)`` tuples, ``name`` being ``stdout`` or ``stderr``.
+    The session is only switched to non-blocking mode while polling the channel, so it
+    can be used by the caller between two lines. Once the iteration is over, the
+    command exit status is available in ``status``.
+
+    :param session: a connected ``ssh2.session.Session``
+    :param str command: the command to run
+    :param timeout: time in ms, or a broker timeout string like '30m', to wait for the
+        command to finish. 0 waits forever.
+    :param float poll_interval: seconds to wait before polling a silent channel again
+    """
+
+    def __init__(self, session, command, timeout=0, poll_interval=0.1):
+        self.session = session
+        self.command = command
+        self.timeout = translate_timeout(timeout)
+        self.poll_interval = poll_interval
+        self.status = None
+        self._channel = None
+
+    def _read_lines(self, buffers):
+        """Read the available data of both streams, returning the complete lines"""
+        lines = []
+        readers = (('stdout', self._channel.read), ('stderr', self._channel.read_stderr))
+        for name, read in readers:
+            size, data = read()
+            while size > 0:
+                *complete, buffers[name] = (buffers[name] + data).split(b'\n')
+                lines += [(name, line.decode('utf-8', errors='replace')) for line in complete]
+                size, data = read()
+            if size not in (0, LIBSSH2_ERROR_EAGAIN):
+                raise OSError(f'Failed to read the output of {self.command}: error {size}')
+        return lines
+
+    def __iter__(self):
+        self._channel = self.session.open_session()
+        self._channel.execute(self.command)
+        deadline = time.monotonic() + self.timeout / 1000 if self.timeout else None
+        buffers = {'stdout': b'', 'stderr': b''}
+        try:
+            while True:
+                self.session.set_blocking(False)
+                try:
+                    lines = self._read_lines(buffers)
+                    eof = self._channel.eof()
+                finally:
+                    self.session.set_blocking(True)
+                yield from lines
+                if eof:
+                    break
+                if not lines:
+                    if deadline and time.monotonic() > deadline:
+                        raise TimeoutError(f'{self.command} did not finish in {self.timeout}ms')
+                    time.sleep(self.poll_interval)
+            for name, rest in buffers.items():
+                if rest:
+                    yield name, rest.decode('utf-8', errors='replace')
+        except BaseException:
+            # timed out, failed or the caller stopped iterating
+            self.close()
+            raise
+        self._channel.close()
+        self._channel.wait_closed()
+        self.status = self._channel.get_exit_status()
+        self._channel = None
+
+    def close(self):
+        """Stop reading the output, asking the remote command to terminate"""
+        if self._channel is None:
+            return
+        try:
+            self._channel.signal('TERM')
+        except Exception as err:
+            logger.debug(f'Failed to send SIGTERM to {self.command}: {err!r}')
+        self._channel.close()
+        self._channel = None
+
+
+def pool_stats():
+    """Return the connection pool hit/miss counters"""
+    return dict(_pool.stats, connections=len(_pool))
+
+
+def close_connections():
+    """Close all the connections kept open by the connection pool"""
+    _pool.close_all()
 
 
 def get_client(
@@ -12,14 +235,23 @@ def get_client(
 
     Processes ssh credentials in the order: password, key_filename, ssh_key
     Config validation enforces one of the three must be set in settings.server
+
+    When ``settings.server.ssh_client.use_connection_pool`` is enabled, the host
+    object is reused by the later calls made from the same thread with the same
+    credentials, saving a ssh handshake per call.
     """
     from robottelo.config import settings
     from robottelo.hosts import ContentHost
 
+    hostname = hostname or settings.server.hostname
+    username = username or settings.server.ssh_username
+    password = password or settings.server.ssh_password
+    if settings.server.ssh_client.use_connection_pool:
+        return _pool.get(hostname, username, password=password, port=port)
     client = ContentHost(
-        hostname=hostname or settings.server.hostname,
-        username=username or settings.server.ssh_username,
-        password=password or settings.server.ssh_password,
+        hostname=hostname,
+        username=username,
+        password=password,
     )
     return client
 
@@ -32,6 +264,8 @@ def command(
     password=None,
     timeout=None,
     port=22,
+    stats_group=None,
+    native_types=False,
 ):
     """Executes SSH command(s) on remote hostname.
 
@@ -41,6 +275,9 @@ def command(
     :param str output_format: json, csv or None
     :param int timeout: Time to wait for the ssh command to finish.
     :param connection_timeout: Time to wait for establishing the connection.
+    :param str stats_group: group of the command in the command statistics, defaults
+        to the command first word
+    :param bool native_types: keep the integers of a json output as int
     """
     client = get_client(
         hostname=hostname,
@@ -48,11 +285,302 @@ def command(
         password=password,
         port=port,
     )
-    result = client.execute(cmd, timeout=timeout)
+    start = time.monotonic()
+    result = _execute(client, client.execute, cmd, timeout=timeout)
+    record_command(client.hostname, cmd, result, time.monotonic() - start, group=stats_group)
+    return parse_output(result, output_format, native_types=native_types)
+
+
+def record_command(hostname, cmd, result, wall, group=None):
+    """Record the statistics of a command in :data:`robottelo.command_stats.command_stats`
+
+    The ``time -p`` report of a timed command is removed from its stderr.
+
+    :param float wall: the time in seconds the command took
+    :param str group: group of the command, defaults to the command first word
+    """
+    from robottelo.config import settings
+
+    if not settings.performance.command_stats:
+        return
+    if isinstance(cmd, bytes):
+        cmd = cmd.decode('utf-8')
+    # results of other shapes, e.g. of mocked clients, are recorded without their output
+    stderr = getattr(result, 'stderr', None) or ''
+    if isinstance(stderr, tuple):
+        stderr = stderr[1]
+    if isinstance(stderr, bytes):
+        stderr = stderr.decode('utf-8', errors='replace')
+    stdout = getattr(result, 'stdout', None)
+    stdout = stdout if isinstance(stdout, str) else ''
+    bytes_received = len(stdout.encode('utf-8')) + len(stderr.encode('utf-8'))
+    remote = None
+    if 'time -p' in cmd:
+        stderr, remote = command_stats.parse_time_report(stderr)
+        if remote is not None:
+            encoded = stderr.encode('utf-8')
+            result.stderr = (len(encoded), encoded)
+    command_stats.command_stats.record(
+        group or command_stats.command_group(cmd),
+        hostname,
+        wall,
+        remote=remote,
+        bytes_sent=len(cmd.encode('utf-8')),
+        bytes_received=bytes_received,
+        status=getattr(result, 'status', None),
+    )
+
 
+def command_batch(
+    cmds,
+    hostname=None,
+    username=None,
+    password=None,
+    timeout=None,
+    port=22,
+    stop_on_failure=False,
+):
+    """Executes several SSH commands on remote hostname in a single round trip.
+
+    :param list cmds: The commands to run, in order
+    :param int timeout: Time to wait for all the commands to finish.
+    :param bool stop_on_failure: do not run the commands following a failed one
+    :return: a list of results, one per command run
+    """
+    client = get_client(
+        hostname=hostname,
+        username=username,
+        password=password,
+        port=port,
+    )
+    return _execute(
+        client, client.execute_batch, cmds, timeout=timeout, stop_on_failure=stop_on_failure
+    )
+
+
+def _execute(client, method, *args, **kwargs):
+    """Call a client execution method
+
+    A command failing on a connection error is not run again, as it may have been run
+    already. The pool replaces the dropped connections before handing them out instead.
+    """
+    try:
+        return method(*args, **kwargs)
+    finally:
+        _pool.release(client)
+
+
+def batch_script(cmds, delimiter, stop_on_failure=False):
+    """Build a shell script running each command and framing its output
+
+    Each command runs in its own subshell, as if executed alone, and its
+    output is framed by ``delimiter`` lines::
+
+        <delimiter> stdout
+        <stdout>
+        <delimiter> stderr
+        <stderr>
+        <delimiter> status <status>
+
+    :param list cmds: the commands to run, in order
+    :param str delimiter: a string that can not appear in the commands output
+    :param bool stop_on_failure: exit the script after the first failed command
+    """
+    lines = [
+        '__robottelo_tmp=$(mktemp -d)',
+        'trap \'rm -rf "$__robottelo_tmp"\' EXIT',
+    ]
+    for cmd in cmds:
+        lines += [
+            '(',
+            cmd,
+            ') </dev/null >"$__robottelo_tmp/stdout" 2>"$__robottelo_tmp/stderr"',
+            '__robottelo_status=$?',
+            f"printf '%s stdout\\n' '{delimiter}'",
+            'cat "$__robottelo_tmp/stdout"',
+            f"printf '\\n%s stderr\\n' '{delimiter}'",
+            'cat "$__robottelo_tmp/stderr"',
+            f"printf '\\n%s status %d\\n' '{delimiter}' $__robottelo_status",
+        ]
+        if stop_on_failure:
+            lines.append('[ $__robottelo_status -eq 0 ] || exit $__robottelo_status')
+    return '\n'.join(lines)
+
+
+def parse_batch_output(output, delimiter):
+    """Split the output of a :func:`batch_script` in one result per command run
+
+    :return: a list of result objects with status, stdout and stderr, stderr being a
+        ``(size, bytes)`` tuple like in the results of ``broker.session.Session.run``
+    """
+    pattern = re.compile(
+        rf'{re.escape(delimiter)} stdout\n(.*?)\n{re.escape(delimiter)} stderr\n(.*?)\n'
+        rf'{re.escape(delimiter)} status (\d+)\n',
+        re.DOTALL,
+    )
+    results = []
+    for stdout, stderr, status in pattern.findall(output):
+        stderr = stderr.encode('utf-8')
+        results.append(Result(status=int(status), stdout=stdout, stderr=(len(stderr), stderr)))
+    return results
+
+
+def batch_delimiter(cmds):
+    """Return a delimiter to frame the output of a :func:`batch_script` running ``cmds``
+
+    The delimiter is derived from the commands, so a batch can be recorded and replayed.
+    """
+    digest = hashlib.sha256('\n'.join(cmds).encode()).hexdigest()
+    return f'--robottelo-batch-{digest}--'
+
+
+def _open_recording(path, mode):
+    """Open the recording file ``path`` in text ``mode``, gzip compressed when it ends
+    with ``.gz``
+    """
+    if path.endswith('.gz'):
+        return gzip.open(path, f'{mode}t', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+class SSHRecorder:
+    """Transport recording the result and latency of the commands run on the hosts
+
+    Each command is appended as a json line to ``path``, gzip compressed when it
+    ends with ``.gz``.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._lock = threading.Lock()
+
+    def execute(self, host, command, timeout, execute):
+        """Run the command with ``execute`` and record its result"""
+        start = time.monotonic()
+        result = execute(command, timeout=timeout)
+        latency = time.monotonic() - start
+        stderr = result.stderr[1] if isinstance(result.stderr, tuple) else result.stderr
+        record = {
+            'host': host.hostname,
+            'command': _command_text(command),
+            'status': result.status,
+            'stdout': result.stdout,
+            'stderr': stderr.decode('utf-8', errors='replace')
+            if isinstance(stderr, bytes)
+            else stderr,
+            'latency': round(latency, 4),
+        }
+        with self._lock, _open_recording(self.path, 'a') as record_file:
+            record_file.write(json.dumps(record, separators=(',', ':')) + '\n')
+        return result
+
+
+class SSHReplayError(Exception):
+    """Raised when a command to replay was not recorded."""
+
+
+class SSHReplayer:
+    """Transport serving the results recorded by :class:`SSHRecorder` without connecting
+
+    The results are looked up by host and command. A command not recorded on the host
+    gets the results recorded on the first host running it, so a recording can be
+    replayed against other hostnames. A command recorded several times returns its
+    results in the recorded order, the last one being returned once exhausted.
+
+    :param bool simulate_latency: sleep for the recorded latency of each command
+    """
+
+    def __init__(self, path, simulate_latency=False):
+        self.path = str(path)
+        self.simulate_latency = simulate_latency
+        self._lock = threading.Lock()
+        self._index = defaultdict(list)
+        # the first host each command was recorded on
+        self._hosts = {}
+        # the position of the next result to replay per replaying host and command
+        self._positions = defaultdict(int)
+        with _open_recording(self.path, 'r') as record_file:
+            for line in record_file:
+                record = json.loads(line)
+                self._hosts.setdefault(record['command'], record['host'])
+                self._index[(record['host'], record['command'])].append(record)
+
+    def _lookup(self, hostname, command):
+        key = (hostname, command)
+        if key not in self._index:
+            if command not in self._hosts:
+                raise SSHReplayError(f'No recorded result for {command!r} on {hostname}')
+            records = self._index[(self._hosts[command], command)]
+        else:
+            records = self._index[key]
+        position = self._positions[key]
+        self._positions[key] = position + 1
+        return records[min(position, len(records) - 1)]
+
+    def execute(self, host, command, timeout, execute):
+        """Return the recorded result of the command"""
+        with self._lock:
+            record = self._lookup(host.hostname, _command_text(command))
+        if self.simulate_latency:
+            time.sleep(record['latency'])
+        stderr = record['stderr'].encode('utf-8')
+        # same shape as the results of broker.session.Session.run
+        return Result(
+            stdout=record['stdout'], status=record['status'], stderr=(len(stderr), stderr)
+        )
+
+
+def _command_text(command):
+    return command.decode('utf-8') if isinstance(command, bytes) else command
+
+
+_transport = None
+_transport_configured = False
+
+
+def set_transport(transport):
+    """Use ``transport`` to run the commands of all the hosts, None to use ssh again
+
+    :param transport: an object with an ``execute(host, command, timeout, execute)``
+        method, ``execute`` being the function running the command over ssh
+    """
+    global _transport, _transport_configured
+    _transport = transport
+    _transport_configured = True
+
+
+def get_transport():
+    """Return the transport set by :func:`set_transport` or by the
+    ``performance.ssh_transport`` settings, None for the regular ssh execution
+    """
+    if not _transport_configured:
+        from robottelo.config import settings
+
+        config = settings.performance.ssh_transport
+        if config.mode == 'record':
+            set_transport(SSHRecorder(config.file))
+        elif config.mode == 'replay':
+            set_transport(SSHReplayer(config.file, simulate_latency=config.simulate_latency))
+        else:
+            set_transport(None)
+    return _transport
+
+
+def parse_output(result, output_format=None, native_types=False):
+    """Parse the stdout of a successful hammer command result in place
+
+    :param result: a result object, with status and stdout
+    :param str output_format: json, csv or None
+    :param bool native_types: keep the integers of a json output as int, they are
+        converted to str by default to conform to csv parser
+    """
     if output_format and result.status == 0:
         if output_format == 'csv':
             result.stdout = hammer.parse_csv(result.stdout) if result.stdout else {}
         if output_format == 'json':
-            result.stdout = hammer.parse_json(result.stdout) if result.stdout else None
+            result.stdout = (
+                hammer.parse_json(result.stdout, native_types=native_types)
+                if result.stdout
+                else None
+            )
     return result
@@ -87,6 +87,20 @@ def runcmd(cmd, system=None, timeout=600000, output_format='base'):
     return result.status, result.stdout.strip()
 
 
+def runcmd_batch(cmds, system=None, timeout=600000, stop_on_failure=False):
+    """Return the retcode and stdout of each command, run in a single ssh round trip.
+
+    :param list cmds: The command lines will be executed in the target system.
+    :param dict system: the system account which ssh will connect to,
+        it will connect to the satellite host if the system is None.
+    :param int timeout: Time to wait for all the commands to finish.
+    :param bool stop_on_failure: do not run the commands following a failed one.
+    """
+    system = system or get_system('satellite')
+    results = ssh.command_batch(cmds, **system, timeout=timeout, stop_on_failure=stop_on_failure)
+    return [(result.status, result.stdout.strip()) for result in results]
+
+
 def register_system(system, activation_key=None, org='Default_Organization', env='Library'):
     """Return True if the system is registered to satellite successfully.
 
@@ -96,15 +110,6 @@ def register_system(system, activation_key=None, org='Default_Organization', env
     :param str env: Which environment will be used to register.
     :raises: VirtWhoError: If failed to register the system.
     """
-    runcmd('subscription-manager unregister', system)
-    runcmd('subscription-manager clean', system)
-    runcmd('rpm -qa | grep katello-ca-consumer | xargs rpm -e |sort', system)
-    runcmd(
-        'rpm -ihv http://{}/pub/katello-ca-consumer-latest.noarch.rpm'.format(
-            settings.server.hostname
-        ),
-        system,
-    )
     cmd = f'subscription-manager register --org={org} --environment={env} '
     if activation_key is not None:
         cmd += f'--activationkey={activation_key}'
@@ -112,7 +117,18 @@ def register_system(system, activation_key=None, org='Default_Organization', env
         cmd += '--username={} --password={}'.format(
             settings.server.admin_username, settings.server.admin_password
         )
-    ret, stdout = runcmd(cmd, system)
+    *_, (ret, stdout) = runcmd_batch(
+        [
+            'subscription-manager unregister',
+            'subscription-manager clean',
+            'rpm -qa | grep katello-ca-consumer | xargs rpm -e |sort',
+            'rpm -ihv http://{}/pub/katello-ca-consumer-latest.noarch.rpm'.format(
+                settings.server.hostname
+            ),
+            cmd,
+        ],
+        system,
+    )
     if ret == 0 or "system has been registered" in stdout:
         return True
     else:
@@ -127,11 +143,15 @@ def virtwho_cleanup():
     3. clean rhsm.log message, make sure there is no old message exist.
     4. clean all the configure files in /etc/virt-who.d/
     """
-    runcmd("systemctl stop virt-who")
-    runcmd("pkill -9 virt-who")
-    runcmd("rm -f /var/run/virt-who.pid")
-    runcmd("rm -f /var/log/rhsm/rhsm.log")
-    runcmd("rm -rf /etc/virt-who.d/*")
+    runcmd_batch(
+        [
+            "systemctl stop virt-who",
+            "pkill -9 virt-who",
+            "rm -f /var/run/virt-who.pid",
+            "rm -f /var/log/rhsm/rhsm.log",
+            "rm -rf /etc/virt-who.d/*",
+        ]
+    )
 
 
 def get_virtwho_status():
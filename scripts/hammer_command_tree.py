@@ -1,26 +1,84 @@
 """Generate hammer command tree in json format by inspecting every command's
 help.
 
+The tree is crawled breadth-first, the help of the commands of each level
+being fetched in parallel, each worker running its share in a single ssh round
+trip. The hammer version and its installed plugin packages are kept in
+``<output>.version``, and with ``--incremental`` the previous output is kept without
+crawling when they did not change, the help of the commands only changing with them.
+
+Usage: python scripts/hammer_command_tree.py [--workers 8] [--incremental] [--output FILE]
 """
+import argparse
 import json
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 
 from robottelo import ssh
 from robottelo.cli import hammer
 
 
-def generate_command_tree(command):
-    """Recursively walk trhough the hammer commands and subcommands and fetch
+def fetch_help(commands, workers):
+    """Return the help outputs of ``commands``, fetched by ``workers`` parallel batches"""
+    chunks = [commands[index::workers] for index in range(min(workers, len(commands)))]
+    with ThreadPoolExecutor(max_workers=len(chunks) or 1) as executor:
+        results = executor.map(
+            lambda chunk: ssh.command_batch([f'{command} --help' for command in chunk]), chunks
+        )
+        helps = {}
+        for chunk, chunk_results in zip(chunks, results):
+            helps.update((command, result.stdout) for command, result in zip(chunk, chunk_results))
+    return [helps[command] for command in commands]
+
+
+def hammer_version():
+    """Return the hammer version and the list of its installed packages, read in a
+    single ssh round trip"""
+    results = ssh.command_batch(['hammer --version', "rpm -qa 'rubygem-hammer_cli*' | sort"])
+    return ''.join(result.stdout for result in results)
+
+
+def generate_command_tree(command='hammer', workers=8):
+    """Walk through the hammer commands and subcommands level by level and fetch
     their help. Return a dictionary with the contents.
 
+    :param int workers: number of help batches run in parallel
     """
-    output = ssh.command(f'{command} --help').stdout
-    contents = hammer.parse_help(output)
-    if len(contents['subcommands']) > 0:
-        for subcommand in contents['subcommands']:
-            subcommand.update(generate_command_tree('{} {}'.format(command, subcommand['name'])))
-    return contents
+    tree = {}
+    level = [(command, tree)]
+    while level:
+        helps = fetch_help([name for name, _ in level], workers)
+        next_level = []
+        for (name, contents), output in zip(level, helps):
+            contents.update(hammer.parse_help(output))
+            for subcommand in contents['subcommands']:
+                next_level.append((f'{name} {subcommand["name"]}', subcommand))
+        level = next_level
+    return tree
 
 
-# Generate the json file in the working directory
-with open('hammer_commands.json', 'w') as f:
-    f.write(json.dumps(generate_command_tree('hammer'), indent=2, sort_keys=True))
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--workers', type=int, default=8, help='parallel help batches')
+    parser.add_argument(
+        '--incremental',
+        action='store_true',
+        help='keep the previous output if hammer and its plugins did not change',
+    )
+    # Generate the json file in the working directory by default
+    parser.add_argument('--output', default='hammer_commands.json', type=Path)
+    args = parser.parse_args()
+    version_file = args.output.with_name(f'{args.output.name}.version')
+    version = hammer_version()
+    if (
+        args.incremental
+        and args.output.exists()
+        and version_file.exists()
+        and version_file.read_text() == version
+    ):
+        print(f'hammer did not change, keeping {args.output}')
+    else:
+        tree = generate_command_tree(workers=args.workers)
+        with open(args.output, 'w') as f:
+            f.write(json.dumps(tree, indent=2, sort_keys=True))
+        version_file.write_text(version)
@@ -0,0 +1,34 @@
+"""Unit tests for :mod:`robottelo.api.registry`."""
+import pytest
+from nailgun import entities
+from nailgun.config import ServerConfig
+
+from robottelo.api.registry import APINamespace
+
+
+def server_config(url):
+    return ServerConfig(url, auth=['admin', 'changeme'], verify=False)
+
+
+def test_entities_injected_with_config():
+    """The entities are subclassed once per server config and get it injected"""
+    sat1 = APINamespace(server_config('https://sat1.example.com'))
+    assert issubclass(sat1.Organization, entities.Organization)
+    assert sat1.Organization is sat1.Organization
+    assert sat1.Organization().__dict__['_server_config'] is sat1.server_config
+    assert 'Organization' in vars(sat1) and 'Host' not in vars(sat1)
+    # the same config shares the classes, another one gets its own
+    assert APINamespace(server_config('https://sat1.example.com')).Organization is sat1.Organization
+    sat2 = APINamespace(server_config('https://sat2.example.com'))
+    assert sat2.Organization is not sat1.Organization
+    assert sat2.Organization()._server_config.url == 'https://sat2.example.com'
+
+
+def test_not_an_entity():
+    """Only the nailgun entity classes are exposed"""
+    namespace = APINamespace(server_config('https://sat1.example.com'))
+    assert 'Organization' in dir(namespace)
+    with pytest.raises(AttributeError):
+        namespace.EntityCreateMixin
+    with pytest.raises(AttributeError):
+        namespace.Unknown
@@ -1,14 +1,27 @@
+import importlib
+import threading
 import unittest
 from functools import partial
+from pathlib import Path
 from unittest import mock
 
 import pytest
+from broker.session import Result
 
+from robottelo.cli import base
+from robottelo.cli import hammer_shell
 from robottelo.cli.base import Base
 from robottelo.cli.base import CLIBaseError
+from robottelo.cli.base import CLICache
 from robottelo.cli.base import CLIDataBaseError
 from robottelo.cli.base import CLIError
 from robottelo.cli.base import CLIReturnCodeError
+from robottelo.cli.base import HammerCommand
+from robottelo.cli.base import LazyRecord
+from robottelo.cli.base import resolve_records
+from robottelo.cli.org import Org
+from robottelo.cli.registry import CLI_CLASSES
+from robottelo.cli.registry import CLINamespace
 
 
 class CLIClass(Base):
@@ -36,6 +49,50 @@ class BaseCliTestCase(unittest.TestCase):
         assert '--flag-two' not in command_parts
         assert len(command_parts) == 4
 
+    def test_construct_command_binding(self):
+        """_construct_command returns a command bound to the class hostname and user"""
+        BoundClass = type('BoundClass', (CLIClass,), {'hostname': 'sat.example.com'})
+        BoundClass.command_base = 'basecommand'
+        BoundClass.command_sub = 'subcommand'
+        command = BoundClass._construct_command({'argument': 'value'})
+
+        assert isinstance(command, HammerCommand)
+        assert command == 'basecommand subcommand --argument="value" '
+        assert command.command_sub == 'subcommand'
+        assert command.hostname == 'sat.example.com'
+        assert command.username == CLIClass.foreman_admin_username
+        assert Base.hostname is None
+
+    @mock.patch('robottelo.cli.base.settings')
+    def test_construct_command_validation(self, settings):
+        """_construct_command rejects the options hammer does not know when enabled"""
+        settings.performance.validate_hammer_options = True
+        settings.performance.hammer_commands_file = 'tests/foreman/data/hammer_commands.json'
+        ValidatedClass = type('ValidatedClass', (CLIClass,), {'command_base': 'repository'})
+        ValidatedClass.command_sub = 'create'
+        ValidatedClass._construct_command({'name': 'repo1', 'product-id': 1, 'mirror': None})
+        with pytest.raises(CLIError, match='Unknown option "--product_id"'):
+            ValidatedClass._construct_command({'name': 'repo1', 'product_id': 1})
+
+    def test_command_sub_per_thread(self):
+        """command_sub assigned by a thread is not seen by the other threads"""
+        barrier = threading.Barrier(2)
+        commands = {}
+
+        def construct(command_sub):
+            CLIClass.command_sub = command_sub
+            barrier.wait()
+            commands[command_sub] = CLIClass._construct_command()
+
+        threads = [threading.Thread(target=construct, args=(sub,)) for sub in ('info', 'list')]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert commands['info'].command_sub == 'info'
+        assert commands['list'].command_sub == 'list'
+
     def test_username_password_parameters_lookup(self):
         """Username and password returned are the parameters"""
         username, password = CLIClass._get_username_password('auser', 'apass')
@@ -160,6 +217,43 @@ class BaseCliTestCase(unittest.TestCase):
         construct.called_once_with({})
         execute.called_once_with(construct.return_value, output_format='csv')
 
+    @mock.patch('robottelo.cli.base.Base.info')
+    @mock.patch('robottelo.cli.base.Base.execute')
+    @mock.patch('robottelo.cli.base.Base._construct_command')
+    def test_json_output(self, construct, execute, info):
+        """Check create, info and list ask for json in json output mode"""
+
+        class JSONClass(Base):
+            command_requires_org = False
+            json_output = True
+
+        execute.return_value = {'message': 'Organization created.', 'id': '7', 'name': 'org'}
+        info.return_value = {'id': '7', 'name': 'org', 'label': 'org'}
+        assert JSONClass.create() == info.return_value
+        execute.assert_called_once_with(construct.return_value, output_format='json', timeout=None)
+        info.assert_called_once_with({'id': '7'})
+        execute.reset_mock()
+        execute.return_value = [{'id': '7', 'name': 'org'}]
+        assert JSONClass.list(per_page=False) == execute.return_value
+        execute.assert_called_once_with(construct.return_value, output_format='json')
+
+    @mock.patch('robottelo.cli.base.hammer.parse_info')
+    @mock.patch('robottelo.cli.base.Base.execute')
+    @mock.patch('robottelo.cli.base.Base._construct_command')
+    def test_info_json_output(self, construct, execute, parse):
+        """Check info is not parsed in json output mode"""
+
+        class JSONClass(Base):
+            command_requires_org = False
+            json_output = True
+
+        execute.return_value = {'id': '7', 'name': 'org'}
+        assert JSONClass.info({'id': 7}) == execute.return_value
+        execute.assert_called_once_with(
+            command=construct.return_value, output_format='json', return_raw_response=None
+        )
+        parse.assert_not_called()
+
     @mock.patch('robottelo.cli.base.Base.info')
     @mock.patch('robottelo.cli.base.Base.execute')
     @mock.patch('robottelo.cli.base.Base._construct_command')
@@ -248,7 +342,9 @@ class BaseCliTestCase(unittest.TestCase):
     def test_execute_with_raw_response(self, settings, command):
         """Check executed build ssh method and returns raw response"""
         settings.robottelo.locale = 'en_US'
+        settings.performance.json_native_types = False
         settings.performance.time_hammer = False
+        settings.performance.hammer_shell = False
         settings.server.admin_username = 'admin'
         settings.server.admin_password = 'password'
         response = Base.execute('some_cmd', return_raw_response=True)
@@ -258,15 +354,74 @@ class BaseCliTestCase(unittest.TestCase):
             hostname=mock.ANY,
             output_format=None,
             timeout=None,
+            stats_group=mock.ANY,
+            native_types=False,
         )
         assert response is command.return_value
 
+    @mock.patch('robottelo.cli.base.ssh.command')
+    @mock.patch('robottelo.cli.base.settings')
+    def test_execute_bound_command(self, settings, command):
+        """Check a bound command is run on its hostname with its credentials"""
+        settings.robottelo.locale = 'en_US'
+        settings.performance.json_native_types = False
+        settings.performance.time_hammer = False
+        settings.performance.hammer_shell = False
+        cmd = HammerCommand(
+            'org list',
+            command_base='org',
+            command_sub='list',
+            hostname='sat.example.com',
+            username='auser',
+            password='apass',
+        )
+        Base.execute(cmd, return_raw_response=True)
+        ssh_cmd = 'LANG=en_US  hammer -v -u auser -p apass  org list'
+        command.assert_called_once_with(
+            ssh_cmd.encode('utf-8'),
+            hostname='sat.example.com',
+            output_format=None,
+            timeout=None,
+            stats_group='hammer org list',
+            native_types=False,
+        )
+
+    @mock.patch('robottelo.cli.base.hammer_shell.execute')
+    @mock.patch('robottelo.cli.base.ssh.command')
+    @mock.patch('robottelo.cli.base.settings')
+    def test_execute_hammer_shell_lost_result(self, settings, command, shell_execute):
+        """Check a command whose hammer shell result was lost is not run over ssh"""
+        settings.performance.time_hammer = False
+        settings.performance.hammer_shell = True
+        shell_execute.side_effect = hammer_shell.HammerShellCommandError('lost')
+        with pytest.raises(CLIReturnCodeError):
+            Base.execute('org create --name=org1')
+        assert not command.called
+
+    @mock.patch('robottelo.cli.base.ssh.command')
+    @mock.patch('robottelo.cli.base.settings')
+    def test_execute_native_types(self, settings, command):
+        """Check the class json_native_types attribute is passed down to the parser"""
+        settings.robottelo.locale = 'en_US'
+        settings.performance.time_hammer = False
+        settings.performance.hammer_shell = False
+        settings.performance.json_native_types = False
+
+        class NativeClass(Base):
+            json_native_types = True
+
+        NativeClass.execute('some_cmd', output_format='json', return_raw_response=True)
+        assert command.call_args.kwargs['native_types'] is True
+        Base.execute('some_cmd', output_format='json', return_raw_response=True)
+        assert command.call_args.kwargs['native_types'] is False
+
     @mock.patch('robottelo.cli.base.Base._handle_response')
     @mock.patch('robottelo.cli.base.ssh.command')
     @mock.patch('robottelo.cli.base.settings')
     def test_execute_with_performance(self, settings, command, handle_resp):
         """Check executed build ssh method and delegate response handling"""
         settings.robottelo.locale = 'en_US'
+        settings.performance.json_native_types = False
         settings.performance.timer_hammer = True
         settings.server.admin_username = 'admin'
         settings.server.admin_password = 'password'
@@ -277,6 +432,8 @@ class BaseCliTestCase(unittest.TestCase):
             hostname=mock.ANY,
             output_format='json',
             timeout=None,
+            stats_group=mock.ANY,
+            native_types=False,
         )
         handle_resp.assert_called_once_with(command.return_value, ignore_stderr=None)
         assert response is handle_resp.return_value
@@ -286,7 +443,7 @@ class BaseCliTestCase(unittest.TestCase):
         """Check exists method without options and empty return"""
         lst_method.return_value = []
         response = Base.exists(search=['id', 1])
-        lst_method.assert_called_once_with({'search': 'id=\\"1\\"'})
+        lst_method.assert_called_once_with({'search': 'id=\\"1\\"', 'per-page': 1})
         assert [] == response
 
     @mock.patch('robottelo.cli.base.Base.list')
@@ -295,9 +452,66 @@ class BaseCliTestCase(unittest.TestCase):
         lst_method.return_value = [1, 2]
         my_options = {'search': 'foo=bar'}
         response = Base.exists(my_options, search=['id', 1])
-        lst_method.assert_called_once_with(my_options)
+        lst_method.assert_called_once_with({'search': 'foo=bar', 'per-page': 1})
         assert 1 == response
 
+    @mock.patch('robottelo.cli.base.Base.execute')
+    def test_list_paged(self, execute):
+        """Check list_paged fetches the pages until a partial one"""
+        pages = {1: [{'id': '1'}, {'id': '2'}], 2: [{'id': '3'}, {'id': '4'}], 3: [{'id': '5'}]}
+        execute.side_effect = lambda command, output_format: pages[
+            int(command.split('--page="')[1].split('"')[0])
+        ]
+        rows = list(Base.list_paged({'organization-id': 1, 'page': 7}, page_size=2))
+        assert rows == [{'id': str(index)} for index in range(1, 6)]
+        assert execute.call_count == 3
+        assert all(
+            '--organization-id="1"' in call[0][0] and '--per-page="2"' in call[0][0]
+            for call in execute.call_args_list
+        )
+
+    @mock.patch('robottelo.cli.base.Base.execute')
+    def test_list_paged_limit(self, execute):
+        """Check list_paged does not fetch the pages past the limit"""
+        execute.return_value = [{'id': '1'}, {'id': '2'}]
+        rows = list(Base.list_paged(page_size=2, limit=3))
+        assert rows == [{'id': '1'}, {'id': '2'}, {'id': '1'}]
+        assert execute.call_count == 2
+
+    @mock.patch('robottelo.cli.base.Base.execute')
+    def test_list_paged_command_sub(self, execute):
+        """Check the pages fetched in background are run with the list subcommand"""
+        subs = []
+
+        def list_page(command, output_format):
+            subs.append(Base.command_sub)
+            return [{'id': '1'}] if len(subs) < 3 else []
+
+        execute.side_effect = list_page
+        assert len(list(Base.list_paged(page_size=1))) == 2
+        assert subs == ['list', 'list', 'list']
+
+    @mock.patch('robottelo.cli.base.ThreadPoolExecutor')
+    @mock.patch('robottelo.cli.base.Base.execute')
+    def test_list_paged_single_page(self, execute, executor):
+        """Check a single page is fetched in the calling thread"""
+        execute.return_value = [{'id': '1'}]
+        assert list(Base.list_paged(page_size=2)) == [{'id': '1'}]
+        executor.assert_not_called()
+
+    @mock.patch('robottelo.cli.base.Base.list_paged')
+    @mock.patch('robottelo.cli.base.settings')
+    def test_list_with_page_size(self, settings, list_paged):
+        """Check list is paged when a page size is set"""
+        settings.performance.list_page_size = 500
+        settings.performance.json_output = False
+        settings.performance.validate_hammer_options = False
+        list_paged.return_value = iter([{'id': '1'}])
+        assert Base.list({'organization-id': 1}) == [{'id': '1'}]
+        list_paged.assert_called_once_with(
+            {'organization-id': 1}, page_size=500, output_format='csv'
+        )
+
     @mock.patch('robottelo.cli.base.Base.command_requires_org')
     def test_info_requires_organization_id(self, _):
         """Check info raises CLIError with organization-id is not present in
@@ -358,6 +572,35 @@ class BaseCliTestCase(unittest.TestCase):
         )
         self.assert_cmd_execution(construct, execute, list_with_per_page_false, 'list')
 
+    @mock.patch('robottelo.cli.base.get_client')
+    @mock.patch('robottelo.cli.base.ssh.get_transport', return_value=None)
+    @mock.patch('robottelo.cli.base.settings')
+    def test_list_iter(self, settings, transport, get_client):
+        """Check list_iter parses the rows lazily and stops the command when closed"""
+        settings.robottelo.locale = 'en_US'
+        settings.performance.validate_hammer_options = False
+        stream = get_client.return_value.stream.return_value
+        stream.__iter__.return_value = [
+            ('stdout', 'Id,Name'),
+            ('stderr', 'Warning: slow query'),
+            ('stdout', '1,foo'),
+            ('stdout', '2,bar'),
+        ]
+        stream.status = 0
+        rows = Base.list_iter(options={'organization-id': 1})
+        assert 'list' == Base.command_sub
+        assert next(rows) == {'id': '1', 'name': 'foo'}
+        command = get_client.return_value.stream.call_args[0][0]
+        assert command.startswith('LANG=en_US hammer -v')
+        assert '--output=csv' in command
+        assert '--per-page="10000"' in command
+        rows.close()
+        stream.close.assert_called_once_with()
+        assert list(Base.list_iter()) == [{'id': '1', 'name': 'foo'}, {'id': '2', 'name': 'bar'}]
+        stream.status = 70
+        with pytest.raises(CLIReturnCodeError, match='slow query'):
+            list(Base.list_iter())
+
     @mock.patch('robottelo.cli.base.Base.execute')
     @mock.patch('robottelo.cli.base.Base._construct_command')
     def test_puppet_classes(self, construct, execute):
@@ -391,6 +634,165 @@ class BaseCliTestCase(unittest.TestCase):
         self.assert_cmd_execution(construct, execute, Base.update, 'update')
 
 
+class TestLazyCreate:
+    """Tests for the lazy mode of ``Base.create``"""
+
+    class LazyClass(Base):
+        command_base = 'lazy'
+        command_requires_org = False
+
+    @mock.patch('robottelo.cli.base.Base.info')
+    @mock.patch('robottelo.cli.base.Base.execute')
+    def test_create_lazy(self, execute, info):
+        """The record is read the first time a field other than its id is read"""
+        execute.return_value = [{'message': 'Created', 'id': '7', 'name': 'foo'}]
+        info.return_value = {'id': '7', 'name': 'foo', 'label': 'foo'}
+        record = self.LazyClass.create({'name': 'foo'}, lazy=True)
+        assert record['id'] == '7'
+        assert record
+        assert not info.called
+        assert record['label'] == 'foo'
+        assert record == info.return_value
+        info.assert_called_once_with({'id': '7'})
+
+    @mock.patch('robottelo.cli.base.ssh.command_batch')
+    @mock.patch('robottelo.cli.base.Base.info')
+    @mock.patch('robottelo.cli.base.settings')
+    def test_resolve_records(self, settings, info, command_batch):
+        """Pending records are read in a single round trip, failures are read again alone"""
+        settings.performance.json_output = False
+        settings.performance.validate_hammer_options = False
+        records = [LazyRecord(self.LazyClass, {'id': str(index)}) for index in range(3)]
+        command_batch.return_value = [
+            Result(status=0, stdout='Id: 0\nName: zero\n', stderr=''),
+            Result(status=70, stdout='', stderr='Resource lazy not found by id 1'),
+            Result(status=0, stdout='Id: 2\nName: two\n', stderr=''),
+        ]
+        info.return_value = {'id': '1', 'name': 'one'}
+        resolve_records(records + [{'id': '3'}])
+        commands = command_batch.call_args[0][0]
+        assert len(commands) == 3
+        assert 'lazy info --id="1"' in commands[1]
+        info.assert_called_once_with({'id': '1'})
+        assert [record['name'] for record in records] == ['zero', 'one', 'two']
+        resolve_records(records)
+        assert command_batch.call_count == 1
+
+    @mock.patch('robottelo.cli.base.ssh.command_batch')
+    @mock.patch('robottelo.cli.base.settings')
+    def test_info_batch_database_error(self, settings, command_batch):
+        """A database error is returned in place of the information, like other errors"""
+        settings.performance.json_output = False
+        settings.performance.validate_hammer_options = False
+        command_batch.return_value = [
+            Result(status=0, stdout='Id: 0\nName: zero\n', stderr=''),
+            Result(status=70, stdout='', stderr='ERROR: SELECT * FROM lazies failed'),
+        ]
+        infos = self.LazyClass.info_batch([{'id': '0'}, {'id': '1'}])
+        assert infos[0] == {'id': '0', 'name': 'zero'}
+        assert isinstance(infos[1], CLIDataBaseError)
+
+
+class TestCLICache:
+    """Tests for the cache of the cli info and list results"""
+
+    class Repo(Base):
+        command_base = 'repository'
+        command_requires_org = False
+        cache_dependents = ('product',)
+
+    class Product(Base):
+        command_base = 'product'
+        command_requires_org = False
+
+    @pytest.fixture(autouse=True)
+    def settings(self):
+        with mock.patch('robottelo.cli.base.settings') as settings, mock.patch.object(
+            Base, 'cache', CLICache()
+        ):
+            settings.performance.cli_cache = True
+            settings.performance.json_output = False
+            settings.performance.list_page_size = 0
+            settings.performance.hammer_shell = False
+            settings.performance.validate_hammer_options = False
+            settings.server.hostname = 'sat.example.com'
+            yield settings
+
+    @pytest.fixture
+    def command(self):
+        with mock.patch('robottelo.cli.base.ssh.command') as command:
+            command.return_value = Result(status=0, stdout='Id: 1\nName: repo1\n', stderr='')
+            yield command
+
+    def test_info_cached(self, command):
+        """The same info is read once and copies of the result are returned"""
+        first = self.Repo.info({'id': 1})
+        first['name'] = 'changed'
+        assert self.Repo.info({'id': 1}) == {'id': '1', 'name': 'repo1'}
+        assert command.call_count == 1
+        self.Repo.info({'id': 2})
+        assert command.call_count == 2
+        assert Base.cache.report() == {
+            'hits': 1,
+            'misses': 2,
+            'invalidations': 0,
+            'hit_rate': 0.333,
+        }
+
+    def test_write_invalidates(self, command):
+        """Writes invalidate the results of their command base and its dependents"""
+        self.Repo.info({'id': 1})
+        self.Product.info({'id': 1})
+        self.Product.update({'id': 1, 'name': 'product2'})
+        self.Repo.info({'id': 1})
+        assert command.call_count == 3
+        self.Product.info({'id': 1})
+        self.Repo.delete({'id': 1})
+        self.Product.info({'id': 1})
+        self.Repo.info({'id': 1})
+        assert command.call_count == 7
+
+    def test_cache_per_satellite(self, command):
+        """The results of each satellite are cached apart"""
+        self.Repo.info({'id': 1})
+        type('Repo2', (self.Repo,), {'hostname': 'sat2.example.com'}).info({'id': 1})
+        assert command.call_count == 2
+        assert {call[1]['hostname'] for call in command.call_args_list} == {
+            'sat.example.com',
+            'sat2.example.com',
+        }
+
+
+class TestCLINamespace:
+    """Tests for the cli classes bound to a satellite"""
+
+    def test_registry_complete(self):
+        """Every cli entity class of robottelo.cli is registered with its module"""
+        classes = {}
+        for file in Path(base.__file__).parent.glob('[!_]*.py'):
+            module = importlib.import_module(f'robottelo.cli.{file.stem}')
+            classes.update(
+                (name, obj.__module__.split('.')[-1])
+                for name, obj in vars(module).items()
+                if isinstance(obj, type) and issubclass(obj, Base)
+            )
+        assert classes == CLI_CLASSES
+
+    def test_bound_classes(self):
+        """Each namespace binds its own subclasses once, the shared classes are untouched"""
+        sat1, sat2 = CLINamespace('sat1.example.com'), CLINamespace('sat2.example.com')
+        assert sat1.Org is sat1.Org
+        assert issubclass(sat1.Org, Org) and sat1.Org is not sat2.Org
+        assert (sat1.Org.hostname, sat2.Org.hostname, Org.hostname) == (
+            'sat1.example.com',
+            'sat2.example.com',
+            None,
+        )
+        assert 'Repository' in dir(sat1)
+        with pytest.raises(AttributeError):
+            sat1.Unknown
+
+
 class CLIErrorTests(unittest.TestCase):
     """Tests for the CLIError cli class"""
 
@@ -0,0 +1,61 @@
+"""Tests for module ``robottelo.command_stats``."""
+from unittest import mock
+
+import pytest
+from broker.session import Result
+
+from robottelo import ssh
+from robottelo.command_stats import command_group
+from robottelo.command_stats import CommandStats
+from robottelo.command_stats import parse_time_report
+
+
+@pytest.mark.parametrize(
+    'stderr, expected',
+    [
+        ('real 1.52\nuser 0.83\nsys 0.11\n', ('', 1.52)),
+        ('Warning: deprecated\nreal 12.00\nuser 2.10\nsys 0.40\n', ('Warning: deprecated', 12.0)),
+        ('Warning: deprecated\n', ('Warning: deprecated\n', None)),
+    ],
+)
+def test_parse_time_report(stderr, expected):
+    assert parse_time_report(stderr) == expected
+
+
+def test_command_group():
+    assert command_group('LANG=en_US.UTF-8 time -p hammer -v org list') == 'time'
+    assert command_group('subscription-manager status') == 'subscription-manager'
+
+
+def test_report(tmp_path):
+    """The samples dumped by the workers are merged and summarized per group and host"""
+    worker = CommandStats()
+    for wall in range(1, 101):
+        worker.record('hammer org list', 'sat1', wall / 10, bytes_received=100)
+    worker.record('hammer org create', 'sat2', 3, remote=2.5, bytes_sent=50, status=65)
+    worker.dump(tmp_path / 'gw0.json')
+    master = CommandStats()
+    master.load(tmp_path / 'gw0.json')
+    report = master.report()
+    org_list = report['groups']['hammer org list']
+    assert org_list['count'] == 100
+    assert org_list['bytes_received'] == 10000
+    assert org_list['wall'] == {'p50': 5.0, 'p95': 9.5, 'p99': 9.9, 'max': 10.0}
+    assert org_list['remote']['p50'] is None
+    org_create = report['groups']['hammer org create']
+    assert (org_create['failures'], org_create['remote']['p99']) == (1, 2.5)
+    assert report['hosts']['sat2']['bytes_sent'] == 50
+    assert report['total']['count'] == 101
+
+
+@mock.patch('robottelo.ssh.command_stats.command_stats', new_callable=CommandStats)
+def test_record_command(stats):
+    """The ``time -p`` report is parsed and removed from the stderr of timed commands"""
+    result = Result(status=0, stdout='id,name\n', stderr=(29, b'real 0.80\nuser 0.50\nsys 0.10\n'))
+    ssh.record_command(
+        'sat.example.com', b'LANG=C time -p hammer org list', result, 1.2, group='hammer org'
+    )
+    assert result.stderr == (0, b'')
+    assert stats.samples == [
+        ('hammer org', 'sat.example.com', 1.2, 0.8, 30, 8 + 29, 0),
+    ]
@@ -1,6 +1,12 @@
 """Tests for Robottelo's hammer helpers"""
+from pathlib import Path
+
+import pytest
+
 from robottelo.cli import hammer
 
+DATA_DIR = Path(__file__).parent.parent / 'foreman' / 'data'
+
 
 class TestParseCSV:
     """Tests for parsing CSV hammer output"""
@@ -22,6 +28,15 @@ class TestParseCSV:
             {'header': 'unicode', 'header-2': 'chårs'},
         ]
 
+    def test_parse_csv_iter(self):
+        """Rows are parsed one at a time, as the lines are read"""
+        lines = iter(['ID,Name', '1,foo', '', '2,bar', 'unread'])
+        rows = hammer.parse_csv_iter(lines)
+        assert next(rows) == {'id': '1', 'name': 'foo'}
+        assert next(rows) == {'id': '2', 'name': 'bar'}
+        assert next(lines) == 'unread'
+        assert list(hammer.parse_csv_iter([])) == []
+
 
 class TestParseJSON:
     """Tests for parsing JSON hammer output"""
@@ -81,6 +96,21 @@ class TestParseJSON:
             'name': 'Default Organization View',
         }
 
+    def test_parse_json_last_document(self):
+        """The last of several json documents is parsed"""
+        output = '{\n  "Message": "Task started",\n  "Id": 1\n}\n{\n  "Id": 2,\n  "Name": "a"\n}\n'
+        assert hammer.parse_json(output) == {'id': '2', 'name': 'a'}
+
+    def test_parse_json_native_types(self):
+        """The values keep their types, only the keys are normalized"""
+        output = '[{"ID": 1, "Enabled": true, "Sub Items": [{"Item ID": 2}, 3.5, null]}]'
+        assert hammer.parse_json(output, native_types=True) == [
+            {'id': 1, 'enabled': True, 'sub-items': [{'item-id': 2}, 3.5, None]}
+        ]
+        assert hammer.parse_json(output) == [
+            {'id': '1', 'enabled': True, 'sub-items': [{'item-id': '2'}, 3.5, None]}
+        ]
+
     def test_parsed_json_match_parsed_csv(self):
         """Output generated by:
         JSON:
@@ -109,6 +139,63 @@ class TestParseJSON:
         assert hammer.parse_json(json_output) == hammer.parse_csv(csv_ouput_lines)[0]
 
 
+class TestHammerCommandIndex:
+    """Tests for checking hammer commands against the command tree"""
+
+    @staticmethod
+    def command(name, subcommands=(), options=()):
+        return {
+            'name': name,
+            'subcommands': list(subcommands),
+            'options': [{'name': option} for option in options],
+        }
+
+    @pytest.fixture
+    def index(self):
+        return hammer.HammerCommandIndex(
+            self.command(
+                'hammer',
+                [
+                    self.command(
+                        'content-view',
+                        [
+                            self.command('create', options=['name', 'organization-id']),
+                            self.command('filter', [self.command('create', options=['inclusion'])]),
+                        ],
+                    )
+                ],
+                options=['output'],
+            )
+        )
+
+    def test_check_valid(self, index):
+        """Known subcommands, options, global options and negated flags are valid"""
+        assert index.check('content-view create', ['name', 'organization-id', 'output']) == []
+        assert index.check('content-view filter create', ['no-inclusion']) == []
+
+    def test_check_unknown(self, index):
+        """Unknown subcommands and options are reported with the closest known names"""
+        assert index.check('content-view craete', ['name']) == [
+            'Unknown subcommand "craete" of "hammer content-view", did you mean create?'
+        ]
+        assert index.check('content-view create', ['organisation-id', 'label']) == [
+            'Unknown option "--organisation-id" of "hammer content-view create", '
+            'did you mean organization-id?',
+            'Unknown option "--label" of "hammer content-view create"',
+        ]
+
+    def test_check_other_command(self, index):
+        """Commands which are not hammer commands are not checked"""
+        assert index.check('backup offline', ['assumeyes']) == []
+
+    def test_load_command_index(self):
+        """The generated command tree is indexed"""
+        index = hammer.load_command_index(DATA_DIR / 'hammer_commands.json')
+        assert index is hammer.load_command_index(DATA_DIR / 'hammer_commands.json')
+        assert index.check('repository create', ['name', 'product-id', 'url']) == []
+        assert index.check('repository create', ['product_id'])
+
+
 class TestParseHelp:
     """Tests for parsing hammer help output"""
 
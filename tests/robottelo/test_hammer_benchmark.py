@@ -0,0 +1,120 @@
+"""Benchmarks for parsing large hammer outputs.
+
+Run with ``pytest tests/robottelo/test_hammer_benchmark.py``, or with
+``--benchmark-disable`` to only check the parsed results.
+"""
+import pytest
+
+from robottelo.cli import hammer
+
+pytest.importorskip('pytest_benchmark')
+
+
+def host_info_output(facts=2000, parameters=500, errata=200):
+    """Host info of a registered host with many facts, parameters and host collections"""
+    lines = [
+        'Id: 31',
+        'Name: host1.example.com',
+        'Organization: Default Organization',
+        'Location: Default Location',
+        'Status:',
+        '    Global Status: Warning',
+        '    Build Status:  Installed',
+        'Network interfaces:',
+        ' 1) Id: 34',
+        '    Identifier: ens3',
+        '    Type: interface (primary, provision)',
+        '    MAC address: 52:54:00:b2:2d:01',
+        ' 2) Id: 35',
+        '    Identifier: ens4',
+        '    Type: interface',
+        '    MAC address: 52:54:00:b2:2d:02',
+        'All parameters:',
+    ]
+    lines += [f'    parameter_{index} => value {index}' for index in range(parameters)]
+    lines += ['Facts:']
+    lines += [f'    network.interface{index}.mtu: {index}' for index in range(facts)]
+    lines += [
+        'Content Information:',
+        '    Content View:',
+        '        ID: 38',
+        '        Name: content view1',
+        '    Lifecycle Environment:',
+        '        ID: 40',
+        '        Name: Library',
+        '    Applicable Errata:',
+        '        Enhancement: 0',
+        '        Bug Fix: 0',
+        f'        Security: {errata}',
+        'Subscription Information:',
+        '    UUID: 8f0a1c6e-1b2d-4c3e-9f4a-5b6c7d8e9f00',
+        '    Registered by Activation Keys:',
+    ]
+    lines += [f'     {index}) ak{index}' for index in range(1, 51)]
+    lines += ['Host Collections:']
+    lines += [f' {index}) collection{index}' for index in range(1, errata + 1)]
+    return '\n'.join(lines)
+
+
+def content_view_info_output(versions=1000, repositories=200):
+    """Content view info of a content view published many times"""
+    lines = [
+        'Id: 10',
+        'Name: content view1',
+        'Label: content_view1',
+        'Composite: false',
+        'Organization: Default Organization',
+        'Yum Repositories:',
+    ]
+    for index in range(1, repositories + 1):
+        lines += [f' {index}) Id: {index}', f'    Name: repo{index}', f'    Label: repo{index}']
+    lines += ['Lifecycle Environments:']
+    lines += [' 1) Id: 1', '    Name: Library', ' 2) Id: 2', '    Name: Dev']
+    lines += ['Versions:']
+    for index in range(1, versions + 1):
+        lines += [
+            f' {index}) Id: {index + 100}',
+            f'    Version: {index}.0',
+            '    Published: 2021/09/01 12:00:00',
+        ]
+    lines += ['Activation Keys:']
+    return '\n'.join(lines)
+
+
+@pytest.mark.parametrize('facts', [200, 2000, 20000])
+def test_parse_info_host(benchmark, facts):
+    output = host_info_output(facts=facts)
+    result = benchmark(hammer.parse_info, output)
+    assert len(result['facts']) == facts
+    assert len(result['all-parameters']) == 500
+    assert result['subscription-information']['registered-by-activation-keys'][-1] == 'ak50'
+    assert result['content-information']['applicable-errata']['security'] == '200'
+    assert result['host-collections'][-1] == 'collection200'
+
+
+@pytest.mark.parametrize('versions', [100, 1000, 10000])
+def test_parse_info_content_view(benchmark, versions):
+    output = content_view_info_output(versions=versions)
+    result = benchmark(hammer.parse_info, output)
+    assert len(result['versions']) == versions
+    assert result['versions'][-1] == {
+        'id': str(versions + 100),
+        'version': f'{versions}.0',
+        'published': '2021/09/01 12:00:00',
+    }
+    assert len(result['yum-repositories']) == 200
+
+
+@pytest.mark.parametrize('values', [500, 5000])
+def test_parse_info_second_level_list(benchmark, values):
+    """A long list of values under the last key of a large property"""
+    output = '\n'.join(
+        ['Subscription Information:']
+        + [f'    Attribute {index}: value {index}' for index in range(values)]
+        + ['    Registered by Activation Keys:']
+        + [f'     {index}) ak{index}' for index in range(1, values + 1)]
+    )
+    result = benchmark(hammer.parse_info, output)
+    subscription = result['subscription-information']
+    assert len(subscription) == values + 1
+    assert len(subscription['registered-by-activation-keys']) == values
@@ -0,0 +1,152 @@
+"""Tests for module ``robottelo.cli.hammer_shell``."""
+from unittest import mock
+
+import pytest
+from ssh2.exceptions import Timeout
+
+from robottelo.cli import hammer_shell
+
+
+class MockChannel:
+    """A mock ssh2 channel returning the output of the driver in small chunks"""
+
+    def __init__(self, output, chunk_size=7):
+        self.output = output
+        self.chunk_size = chunk_size
+        self.written = []
+        self.closed = False
+
+    def write(self, data):
+        self.written.append(data)
+
+    def read(self):
+        data = self.output[: self.chunk_size]
+        self.output = self.output[len(data) :]  # noqa: E203
+        return len(data), data
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def shell():
+    shell = hammer_shell.HammerShell('sat.example.com')
+    shell._client = mock.Mock(default_timeout=300000)
+    return shell
+
+
+@pytest.mark.parametrize(
+    'command, expected',
+    [
+        (
+            '-v -u admin -p changeme --output=csv org list --search="name=\\"Org 1\\""',
+            [
+                '-v',
+                '-u',
+                'admin',
+                '-p',
+                'changeme',
+                '--output=csv',
+                'org',
+                'list',
+                '--search=name="Org 1"',
+            ],
+        ),
+        (
+            '-v --interactive no  host info --id="1" ',
+            ['-v', '--interactive', 'no', 'host', 'info', '--id=1'],
+        ),
+        ('-v -u admin -p changeme org create --name="$HOME"', None),
+        ('-v -u admin -p changeme org list | grep foo', None),
+    ],
+)
+def test_split_command(command, expected):
+    """Check commands are split as a shell would, unless a shell is needed"""
+    assert hammer_shell.split_command(command) == expected
+
+
+def test_execute(shell):
+    """Check the framed stdout, stderr and status are read for each command"""
+    delimiter = shell._delimiter
+    shell._channel = MockChannel(
+        delimiter + b' 0 13 0\nid,name\n1,foo' + delimiter + b' 70 0 8\nerror: !'
+    )
+    result = shell.execute(['org', 'list'])
+    assert shell._channel.written == ['["org", "list"]\n']
+    assert (result.status, result.stdout, result.stderr) == (0, 'id,name\n1,foo', (0, b''))
+    result = shell.execute(['org', 'info'])
+    assert (result.status, result.stdout, result.stderr) == (70, '', (8, b'error: !'))
+
+
+def test_execute_unexpected_exit(shell):
+    """Check the shell is closed when the driver stops in the middle of a command"""
+    channel = shell._channel = MockChannel(shell._delimiter + b' 0 12 0\nid,na')
+    with pytest.raises(hammer_shell.HammerShellCommandError):
+        shell.execute(['org', 'list'])
+    assert channel.closed
+    assert not shell.running
+
+
+def test_execute_timeout(shell):
+    """Check a ssh timeout reading the result is reported as a lost result"""
+    channel = shell._channel = mock.Mock()
+    channel.read.side_effect = Timeout
+    with pytest.raises(hammer_shell.HammerShellCommandError):
+        shell.execute(['org', 'list'])
+    assert not shell.running
+
+
+@pytest.fixture
+def shells(monkeypatch):
+    """HammerShell mocks, created by the pools of hammer shells"""
+    monkeypatch.setattr(hammer_shell, '_pools', {})
+    monkeypatch.setattr(hammer_shell, '_unsupported_hosts', set())
+    with mock.patch('robottelo.cli.hammer_shell.settings') as settings, mock.patch(
+        'robottelo.cli.hammer_shell.HammerShell'
+    ) as shell_class:
+        settings.performance.hammer_shell_pool_size = 2
+        shell_class.return_value.running = False
+        yield shell_class
+
+
+def test_execute_fallback(shells):
+    """Check commands are not sent to a shell on hosts not supporting it"""
+    shells.return_value.start.side_effect = hammer_shell.HammerShellError('no ruby')
+    assert hammer_shell.execute('org list', 'old.example.com') is None
+    assert hammer_shell.execute('org list', 'old.example.com') is None
+    shells.return_value.start.assert_called_once()
+    assert not shells.return_value.execute.called
+
+
+def test_execute_failure_fallback(shells):
+    """Check a command is run over ssh when its shell stopped before it was sent"""
+    shells.return_value.execute.side_effect = hammer_shell.HammerShellError('exited')
+    assert hammer_shell.execute('-u admin org list', 'sat.example.com') is None
+    assert hammer_shell.get_pool('sat.example.com', 'admin')._count == 0
+    assert 'sat.example.com' not in hammer_shell._unsupported_hosts
+
+
+def test_execute_lost_result(shells):
+    """Check a command whose result was lost is not run again"""
+    shells.return_value.execute.side_effect = hammer_shell.HammerShellCommandError('lost')
+    with pytest.raises(hammer_shell.HammerShellCommandError):
+        hammer_shell.execute('-u admin org create --name=org1', 'sat.example.com')
+    assert hammer_shell.get_pool('sat.example.com', 'admin')._count == 0
+
+
+def test_pool(shells):
+    """Check the shells are shared by the threads, per satellite and user, and bounded"""
+    shells.side_effect = lambda hostname: mock.Mock(running=True)
+    pool = hammer_shell.get_pool('sat.example.com', 'admin')
+    assert hammer_shell.get_pool('sat.example.com', 'admin') is pool
+    assert hammer_shell.get_pool('sat.example.com', 'viewer') is not pool
+    with pool.shell() as first:
+        with pool.shell() as second:
+            assert first is not second
+        with pool.shell() as third:
+            assert third is second
+    hammer_shell.execute('-u admin org list', 'sat.example.com')
+    assert (pool._count, shells.call_count) == (2, 2)
+    hammer_shell.close_shells()
+    first.close.assert_called_once_with()
+    assert hammer_shell._pools == {}
@@ -0,0 +1,259 @@
+"""Tests for module ``robottelo.host_pool``."""
+import threading
+import time
+from unittest import mock
+
+import pytest
+
+from robottelo.host_pool import checkout_hosts
+from robottelo.host_pool import ContentHostPool
+from robottelo.host_pool import ContentHostPools
+from robottelo.hosts import Satellite
+
+
+@pytest.fixture
+def broker():
+    """VMBroker whose checkouts return numbered hosts, blocked until ``go`` is set"""
+    go = threading.Event()
+    go.set()
+    hosts = iter(range(100))
+    brokers = []
+
+    def make_broker(**kwargs):
+        vmb = mock.Mock(kwargs=kwargs)
+        brokers.append(vmb)
+
+        def checkout():
+            go.wait()
+            checked_out = [
+                mock.Mock(hostname=f'host{next(hosts)}.example.com')
+                for _ in range(kwargs.get('_count', 1))
+            ]
+            return checked_out if '_count' in kwargs else checked_out[0]
+
+        vmb.checkout.side_effect = checkout
+        return vmb
+
+    with mock.patch('robottelo.host_pool.VMBroker', side_effect=make_broker) as vmbroker:
+        vmbroker.go, vmbroker.brokers = go, brokers
+        yield vmbroker
+
+
+def test_acquire_warm(broker):
+    """Hosts are checked out ahead of demand, in parallel, and replaced once acquired"""
+    pool = ContentHostPool({'workflow': 'deploy-rhel', 'deploy_rhel_version': '7'}, size=2)
+    first = pool.acquire()
+    second = pool.acquire()
+    assert first.hostname != second.hostname
+    first.setup.assert_called_once_with()
+    assert broker.call_args.kwargs['workflow'] == 'deploy-rhel'
+    pool.release(first)
+    pool.close()
+    first.teardown.assert_called_once_with()
+    # the two replacements were checked in unused when the pool was closed, the second
+    # host was not released
+    assert broker.call_count == 4
+    assert sum(vmb.checkin.call_count for vmb in broker.brokers) == 3
+    assert mock.call(host=first) in [
+        call for vmb in broker.brokers for call in vmb.checkin.call_args_list
+    ]
+    report = pool.report()
+    assert (report['acquired'], report['checkouts'], report['failures']) == (2, 4, 0)
+    assert report['wait']['max'] is not None
+
+
+def test_acquire_waits_for_checkout(broker):
+    """An acquire waits for the checkout in progress instead of starting another one"""
+    broker.go.clear()
+    pool = ContentHostPool({'workflow': 'deploy-rhel'}, size=1)
+    threading.Timer(0.1, broker.go.set).start()
+    host = pool.acquire()
+    assert pool.report()['warm'] == 0
+    assert pool.report()['wait']['max'] >= 0.05
+    pool.release(host)
+    pool.close()
+
+
+def test_acquire_without_pending_checkout(broker):
+    """The host is checked out directly when no checkout is in progress"""
+    pool = ContentHostPool({'workflow': 'deploy-rhel'}, size=0)
+    host = pool.acquire()
+    assert host.hostname == 'host0.example.com'
+    pool.release(host)
+    pool.close()
+    assert pool.report()['checkouts'] == 0
+
+
+@mock.patch('robottelo.host_pool.time.monotonic')
+def test_expire(monotonic, broker):
+    """Hosts ready for longer than max_idle are checked in instead of handed out"""
+    monotonic.return_value = 1000
+    pool = ContentHostPool({'workflow': 'deploy-rhel'}, size=1, max_idle=60)
+    with pool._cond:
+        pool._cond.wait_for(lambda: pool._ready)
+    monotonic.return_value = 1061
+    host = pool.acquire()
+    assert host.hostname == 'host1.example.com'
+    assert pool.report()['expired'] == 1
+    pool.release(host)
+    pool.close()
+
+
+def test_expire_in_background(broker):
+    """Idle hosts are checked in and replaced without waiting for an acquire"""
+    pool = ContentHostPool({'workflow': 'deploy-rhel'}, size=1, max_idle=0.2)
+    with pool._cond:
+        assert pool._cond.wait_for(
+            lambda: pool.stats['expired'] and pool._ready and pool.stats['checkouts'] == 2,
+            timeout=5,
+        )
+    host = pool.acquire()
+    assert host.hostname == 'host1.example.com'
+    assert pool.report()['warm'] == 1
+    pool.release(host)
+    pool.close()
+
+
+def test_checkout_backoff(broker):
+    """Failed checkouts are retried with a growing delay, then reported by acquire"""
+    checkouts = []
+
+    def failing_broker(**kwargs):
+        vmb = mock.Mock()
+        vmb.checkout.side_effect = lambda: checkouts.append(1) or 1 / 0
+        return vmb
+
+    broker.side_effect = failing_broker
+    pool = ContentHostPool(
+        {'workflow': 'deploy-rhel'}, size=2, max_idle=60, retry_limit=2, backoff=0.1
+    )
+    with pool._cond:
+        assert pool._cond.wait_for(pool._gave_up, timeout=5)
+    time.sleep(0.2)
+    # the two first checkouts, then two retries of the two hosts
+    assert len(checkouts) == 6
+    with pytest.raises(ZeroDivisionError):
+        pool.acquire()
+    pool.close()
+
+
+def test_release_teardown(broker):
+    """The teardown is run by release, the checkin in the background"""
+    pool = ContentHostPool({'workflow': 'deploy-rhel'}, size=1)
+    host = pool.acquire()
+    with mock.patch.object(pool, '_workers') as workers:
+        pool.release(host)
+    host.teardown.assert_called_once_with()
+    workers.submit.assert_called_once_with(pool._checkin, host, mock.ANY, teardown=False)
+    pool.close()
+
+
+def test_demand(broker):
+    """A pool planned for a number of hosts does not check out more of them"""
+    pools = ContentHostPools(size=2)
+    pools.plan([({'workflow': 'deploy-rhel'}, 3)])
+    pool = pools.get({'workflow': 'deploy-rhel'})
+    hosts = [pool.acquire() for _ in range(3)]
+    assert pool.demand == 0
+    # a bulk checkout of the two first hosts, then a single one
+    assert broker.call_count == 2
+    assert broker.call_args_list[0].kwargs['_count'] == 2
+    # the tests acquiring more hosts than planned get hosts checked out ahead again
+    hosts.append(pool.acquire())
+    assert pool.demand is None
+    for host in hosts:
+        pool.release(host)
+    pools.close()
+    # two hosts checked out again for the fourth acquire, one more to replace it
+    assert pool.report()['checkouts'] == 6
+
+
+def test_bulk_checkout_failure(broker):
+    """The hosts of a failed bulk checkout are checked in, the next hosts checked out alone"""
+    make_broker = broker.side_effect
+
+    def failing_bulk(**kwargs):
+        vmb = make_broker(**kwargs)
+        if '_count' in kwargs:
+            vmb.checkout.side_effect = Exception('one of the hosts failed')
+        return vmb
+
+    broker.side_effect = failing_bulk
+    pool = ContentHostPool({'workflow': 'deploy-rhel'}, size=2, demand=2)
+    host = pool.acquire()
+    bulk = broker.brokers[0]
+    bulk.checkin.assert_called_once_with(host=None)
+    assert pool.report()['failures'] == 2
+    pool.release(host)
+    pool.close()
+
+
+def test_pools_per_conf(broker):
+    pools = ContentHostPools(size=0)
+    rhel7 = pools.get({'workflow': 'deploy-rhel', 'deploy_rhel_version': '7'})
+    assert pools.get({'deploy_rhel_version': '7', 'workflow': 'deploy-rhel'}) is rhel7
+    assert pools.get({'workflow': 'deploy-rhel', 'deploy_rhel_version': '8'}) is not rhel7
+    assert list(pools.report()) == [
+        'deploy_rhel_version=7, workflow=deploy-rhel',
+        'deploy_rhel_version=8, workflow=deploy-rhel',
+    ]
+    pools.close()
+
+
+def test_recycle(broker):
+    """A released host is reset and handed out again instead of being checked in"""
+    pool = ContentHostPool({'workflow': 'deploy-rhel'}, size=1, recycle=True)
+    host = pool.acquire()
+    host.save_baseline.assert_called_once_with()
+    pool.release(host)
+    assert pool.acquire() is host
+    host.teardown.assert_called_once_with()
+    host.reset.assert_called_once_with()
+    pool.release(host)
+    pool.close()
+    report = pool.report()
+    assert (report['checkouts'], report['recycled'], report['dirty']) == (1, 2, 0)
+    broker.brokers[0].checkin.assert_called_once_with(host=host)
+
+
+def test_recycle_dirty(broker):
+    """A host left dirty by its test is checked in and replaced"""
+    pool = ContentHostPool({'workflow': 'deploy-rhel'}, size=1, recycle=True)
+    host = pool.acquire()
+    host.reset.return_value = False
+    pool.release(host)
+    replacement = pool.acquire()
+    assert replacement is not host
+    pool.release(replacement)
+    pool.close()
+    host.teardown.assert_called_once_with()
+    broker.brokers[0].checkin.assert_called_once_with(host=host)
+    report = pool.report()
+    assert (report['checkouts'], report['recycled'], report['dirty']) == (2, 1, 1)
+
+
+@mock.patch('robottelo.host_pool.time.sleep')
+def test_checkout_hosts(sleep, broker):
+    """The hosts are checked out in parallel, the failed checkouts being retried together
+    with an exponential backoff"""
+    failures = iter([True, True, True, True])
+
+    def make_broker(**kwargs):
+        vmb = mock.Mock()
+        failed = next(failures, False)
+        vmb.checkout.side_effect = Exception('deploy failed') if failed else None
+        vmb.checkout.return_value = mock.Mock(hostname=f'sat{broker.call_count}.example.com')
+        return vmb
+
+    broker.side_effect = make_broker
+    hosts = checkout_hosts(3, {'workflow': 'deploy-sat'}, Satellite, backoff=10)
+    assert len(hosts) == 3
+    assert [call.args for call in sleep.call_args_list] == [(10,), (20,)]
+    assert broker.call_args.kwargs == {
+        'workflow': 'deploy-sat',
+        'host_classes': {'host': Satellite},
+    }
+    sleep.reset_mock()
+    failures = iter([True] * 10)
+    assert checkout_hosts(2, {'workflow': 'deploy-sat'}, Satellite, retry_limit=2) == []
+    assert sleep.call_count == 2
@@ -0,0 +1,375 @@
+"""Tests for module ``robottelo.hosts``."""
+import pickle
+import subprocess
+import threading
+import time
+from unittest import mock
+
+import pytest
+from broker.session import Result
+
+from robottelo import hosts
+from robottelo.hosts import ContentHost
+from robottelo.hosts import ContentHostFanOutError
+from robottelo.hosts import FactCache
+from robottelo.hosts import Satellite
+
+
+def make_hosts(count):
+    return [mock.Mock(hostname=f'host{index}.example.com') for index in range(count)]
+
+
+class TestContentHostFanOut:
+    """Tests for ``ContentHost.fan_out``"""
+
+    def test_fan_out_method(self):
+        """The method is called on each host and the results are keyed by hostname"""
+        hosts = make_hosts(3)
+        for host in hosts:
+            host.execute.return_value = f'{host.hostname} updated'
+        outcome = ContentHost.fan_out(hosts, 'execute', 'yum -y update', max_workers=2)
+        assert outcome.ok
+        assert list(outcome.results) == [host.hostname for host in hosts]
+        for host in hosts:
+            host.execute.assert_called_once_with('yum -y update')
+            assert outcome.results[host.hostname] == f'{host.hostname} updated'
+
+    def test_fan_out_concurrent(self):
+        """The hosts are handled at the same time"""
+        hosts = make_hosts(3)
+        barrier = threading.Barrier(len(hosts), timeout=5)
+        outcome = ContentHost.fan_out(hosts, lambda host: barrier.wait(), max_workers=3)
+        assert outcome.ok, outcome.errors
+
+    def test_fan_out_collect_all(self):
+        """Every host is called and the errors are collected"""
+        hosts = make_hosts(3)
+        hosts[1].register.side_effect = RuntimeError('registration failed')
+        outcome = ContentHost.fan_out(hosts, 'register', max_workers=1)
+        assert not outcome.ok
+        assert list(outcome.results) == [hosts[0].hostname, hosts[2].hostname]
+        assert list(outcome.errors) == [hosts[1].hostname]
+        assert hosts[2].register.called
+        with pytest.raises(ContentHostFanOutError) as context:
+            outcome.raise_errors()
+        assert context.value.errors == outcome.errors
+
+    def test_fan_out_fail_fast(self):
+        """The first failure is raised and the calls not started are cancelled"""
+        hosts = make_hosts(3)
+        hosts[0].register.side_effect = RuntimeError('registration failed')
+        # keep the single worker busy until the failure is handled
+        hosts[1].register.side_effect = lambda: time.sleep(0.5)
+        with pytest.raises(ContentHostFanOutError) as context:
+            ContentHost.fan_out(hosts, 'register', fail_fast=True, max_workers=1)
+        assert list(context.value.errors) == [hosts[0].hostname]
+        assert not hosts[2].register.called
+
+
+class TestContentHostExecuteStream:
+    """Tests for ``ContentHost.execute_stream``"""
+
+    @pytest.fixture
+    def stream(self):
+        with mock.patch.object(ContentHost, 'stream') as stream:
+            stream.return_value = mock.MagicMock(status=0)
+            stream.return_value.__iter__.return_value = [
+                ('stdout', 'Resolving dependencies'),
+                ('stdout', 'Installing package 1'),
+                ('stderr', 'Error: package 2 conflicts'),
+                ('stdout', 'Installing package 3'),
+            ]
+            yield stream
+
+    def test_execute_stream_tail(self, stream):
+        """Only the last lines of the output are returned"""
+        host = ContentHost('host.example.com')
+        result = host.execute_stream('yum -y update', timeout=0, tail_lines=2)
+        stream.assert_called_once_with('yum -y update', timeout=0)
+        assert result.status == 0
+        assert result.stdout == 'Installing package 1\nInstalling package 3'
+        assert result.stderr == (26, b'Error: package 2 conflicts')
+        assert result.aborted is None
+
+    @mock.patch('robottelo.hosts.ssh.record_command')
+    def test_execute_stream_hooks(self, record_command, stream):
+        """The command invalidates the facts and is recorded, all lines kept with 0"""
+        host = ContentHost('host.example.com')
+        with mock.patch.object(host, 'invalidate_subscription_facts') as invalidate:
+            result = host.execute_stream('subscription-manager unregister', tail_lines=0)
+        invalidate.assert_called_once_with()
+        record_command.assert_called_once_with(
+            'host.example.com', 'subscription-manager unregister', result, mock.ANY
+        )
+        assert len(result.stdout.splitlines()) == 3
+
+    def test_execute_stream_abort(self, stream):
+        """The command is stopped on the first line matching the abort pattern"""
+        host = ContentHost('host.example.com')
+        result = host.execute_stream('yum -y update', abort_pattern=r'^Error:', tail_lines=10)
+        stream.return_value.close.assert_called_once_with()
+        assert result.status == -1
+        assert result.aborted == 'Error: package 2 conflicts'
+        assert 'Installing package 3' not in result.stdout
+
+
+class TestFactCache:
+    """Tests for ``robottelo.hosts.FactCache``"""
+
+    @mock.patch('robottelo.hosts.time.monotonic')
+    def test_get_ttl(self, monotonic):
+        """A fact is computed again once its ttl expired"""
+        cache = FactCache()
+        compute = mock.Mock(side_effect=['7.9', '8.5'])
+        monotonic.return_value = 1000
+        assert cache.get('release', compute, ttl=60) == '7.9'
+        monotonic.return_value = 1059
+        assert cache.get('release', compute, ttl=60) == '7.9'
+        monotonic.return_value = 1061
+        assert cache.get('release', compute, ttl=60) == '8.5'
+        assert cache.stats == {'hits': 1, 'misses': 2, 'invalidations': 0}
+
+    def test_invalidate(self):
+        """Invalidated facts are computed again"""
+        cache = FactCache()
+        assert cache.get('version', lambda: '6.10') == '6.10'
+        assert cache.get('upstream', lambda: False) is False
+        cache.invalidate('version')
+        assert cache.get('version', lambda: '6.11') == '6.11'
+        assert cache.get('upstream', lambda: True) is False
+        cache.invalidate()
+        assert cache.get('upstream', lambda: True) is True
+        assert cache.stats['invalidations'] == 3
+
+
+@mock.patch('robottelo.hosts.settings')
+@mock.patch('broker.hosts.Host.execute')
+def test_subscription_facts(execute, settings):
+    """The subscription status is cached until the host is registered again"""
+    settings.get.return_value = 60
+    execute.return_value.stdout = 'Overall Status: Current'
+    host = ContentHost('host.example.com')
+    assert host.subscribed
+    assert host.subscribed
+    execute.assert_called_once_with('subscription-manager status', timeout=None)
+    execute.return_value.stdout = 'Overall Status: Unknown'
+    host.execute('subscription-manager unregister')
+    assert not host.subscribed
+    assert host.facts.stats == {'hits': 1, 'misses': 2, 'invalidations': 1}
+    host.subscribed
+    host.execute('curl -sS https://sat.example.com/register | bash')
+    assert host.facts.stats['invalidations'] == 2
+
+
+@mock.patch('robottelo.hosts.settings')
+@mock.patch('broker.hosts.Host.execute')
+def test_subscription_facts_not_cached(execute, settings):
+    """The subscription status is read on each access by default"""
+    settings.get.return_value = 0
+    settings.content_host.subscription_fact_ttl = 0
+    execute.return_value.stdout = 'Overall Status: Current'
+    host = ContentHost('host.example.com')
+    assert host.subscribed
+    assert host.subscribed
+    assert execute.call_count == 2
+
+
+def test_fact_cache_pickle():
+    """The facts cache can be pickled with its host, the facts being read again"""
+    cache = FactCache()
+    cache.get('version', lambda: '6.10')
+    cache = pickle.loads(pickle.dumps(cache))
+    assert cache.get('version', lambda: '6.11') == '6.11'
+    assert cache.stats['misses'] == 2
+    host = ContentHost('host.example.com')
+    host._fact_cache = None
+    assert isinstance(host.facts, FactCache)
+
+
+@mock.patch('robottelo.hosts.settings')
+@mock.patch('broker.hosts.Host.execute')
+def test_profile(execute, settings):
+    """The profile is read in a single round trip and used by the host properties"""
+    settings.content_host.fact_ttl = 60
+    settings.content_host.subscription_fact_ttl = 60
+    settings.get.return_value = 60
+    batch = [
+        Result(status=0, stdout='Red Hat Enterprise Linux Server release 7.9 (Maipo)', stderr=''),
+        Result(status=0, stdout='192.168.0.10 fe80::1\n', stderr=''),
+        Result(
+            status=1,
+            stdout='satellite-6.11.0-1.el7sat.noarch\n'
+            'package satellite-capsule is not installed\n'
+            'subscription-manager-1.24.50-1.el7.x86_64\n',
+            stderr='',
+        ),
+        Result(status=0, stdout='Overall Status: Current\n', stderr=''),
+        Result(
+            status=0,
+            stdout='repo id                          repo name                    status\n'
+            '!rhel-7-server-rpms/7Server/x86_64 Red Hat Enterprise Linux 7  34,121\n'
+            'satellite-6.11/x86_64           Satellite 6.11               1,024\n'
+            'repolist: 35,145\n',
+            stderr='',
+        ),
+    ]
+    satellite = Satellite('sat.example.com')
+    with mock.patch.object(Satellite, 'execute_batch', return_value=batch) as execute_batch:
+        profile = satellite.profile()
+        assert satellite.profile() is profile
+    execute_batch.assert_called_once()
+    assert profile.packages == {
+        'satellite': 'satellite-6.11.0-1.el7sat.noarch',
+        'satellite-capsule': None,
+        'subscription-manager': 'subscription-manager-1.24.50-1.el7.x86_64',
+    }
+    assert profile.enabled_repos == ('rhel-7-server-rpms', 'satellite-6.11')
+    assert (satellite.version, satellite.is_upstream) == ('6.11.0', False)
+    assert (satellite.os_distro, satellite.os_version) == (
+        'Red Hat Enterprise Linux Server',
+        hosts.Version('7.9'),
+    )
+    assert (satellite.ip_addr, satellite.subscribed) == ('192.168.0.10', True)
+    execute.assert_not_called()
+
+
+class TestExecuteBatch:
+    """Tests for ``ContentHost.execute_batch``"""
+
+    @pytest.fixture
+    def host(self):
+        def run(script, timeout=None):
+            process = subprocess.run(['bash', '-c', script], capture_output=True, text=True)
+            return Result(status=process.returncode, stdout=self.output(process.stdout), stderr='')
+
+        self.output = lambda output: output
+        with mock.patch.object(ContentHost, 'execute', side_effect=run):
+            yield ContentHost('host.example.com')
+
+    def test_stop_on_failure(self, host):
+        """The commands not run after a failed one have explicit results"""
+        results = host.execute_batch(['echo 1', 'exit 3', 'echo 2'], stop_on_failure=True)
+        assert [result.status for result in results] == [0, 3, -1]
+        assert results[2].stderr[1].startswith(b'not run')
+
+    def test_truncated(self, host):
+        """A batch returning fewer results than commands raises"""
+        self.output = lambda output: output[: len(output) // 2]
+        with pytest.raises(hosts.ContentHostError):
+            host.execute_batch(['echo 1', 'echo 2'])
+
+
+@mock.patch('robottelo.hosts.settings')
+@mock.patch('broker.hosts.Host.execute')
+def test_profile_without_packages(execute, settings):
+    """The version is read directly when the profile lacks the package"""
+    settings.get.return_value = 60
+    profile = hosts.HostProfile(None, None, {}, False, ())
+    execute.return_value = Result(status=0, stdout='satellite-6.11.0-1.el7sat.noarch', stderr='')
+    satellite = Satellite('sat.example.com')
+    satellite.facts.get('profile', lambda: profile)
+    assert satellite.version == '6.11.0'
+    assert execute.call_count == 2
+
+
+def test_read_sat_facts():
+    """The satellite facts are read by a single batch of two commands"""
+    batch = [
+        Result(status=0, stdout='satellite-6.11.0-1.el7sat.noarch\n', stderr=''),
+        Result(status=0, stdout='Red Hat Enterprise Linux Server release 7.9 (Maipo)', stderr=''),
+    ]
+    with mock.patch.object(Satellite, 'execute_batch', return_value=batch) as execute_batch:
+        assert hosts._read_sat_facts('sat.example.com') == {
+            'version': '6.11.0',
+            'rhel_version': '7.9',
+        }
+    execute_batch.assert_called_once_with(['rpm -q satellite', 'cat /etc/redhat-release'])
+
+
+@mock.patch('broker.hosts.Host.execute')
+def test_reset(execute):
+    """The host is reset in a single round trip, and is clean only if its profile matches
+    the baseline one"""
+    baseline = hosts.HostProfile(
+        '7.9', '192.168.0.10', {'subscription-manager': '1.24'}, False, ('rhel-7',)
+    )
+    host = ContentHost('host.example.com')
+    assert not host.reset()
+    execute.return_value = Result(status=0, stdout='', stderr='')
+    with mock.patch.object(ContentHost, 'profile', return_value=baseline):
+        host.save_baseline()
+    execute.return_value = Result(
+        status=0, stdout='Unregistered\nchanged packages: 0\nchanged files: 0\n', stderr=''
+    )
+    with mock.patch.object(ContentHost, 'profile', return_value=baseline) as profile:
+        assert host.reset()
+        profile.assert_called_once_with(refresh=True)
+        # the yum cache is cleaned once the enabled repositories were read
+        assert execute.call_count == 3
+        assert execute.call_args[0][0] == 'yum clean all'
+        profile.return_value = baseline._replace(subscribed=True)
+        assert not host.reset()
+        profile.return_value = baseline._replace(enabled_repos=('rhel-7', 'custom'))
+        assert not host.reset()
+    execute.return_value = Result(
+        status=0, stdout='changed packages: 1\nchanged files: 0', stderr=''
+    )
+    assert not host.reset()
+    # e.g. the rhsm.conf written by the global registration was not restored
+    execute.return_value = Result(
+        status=0, stdout='changed packages: 0\nchanged files: 1', stderr=''
+    )
+    assert not host.reset()
+
+
+class TestResolveSatFacts:
+    """Tests for ``robottelo.hosts.resolve_sat_facts``"""
+
+    facts = {'version': '6.11.0', 'rhel_version': '7.9'}
+
+    @pytest.fixture(autouse=True)
+    def read_sat_facts(self, monkeypatch, tmp_path):
+        monkeypatch.setattr(hosts, '_sat_facts', {})
+        monkeypatch.setattr(hosts, 'robottelo_tmp_dir', tmp_path)
+        monkeypatch.delenv('PYTEST_XDIST_TESTRUNUID', raising=False)
+        with mock.patch('robottelo.hosts._read_sat_facts', return_value=self.facts) as read:
+            yield read
+
+    def test_resolve_once(self, read_sat_facts):
+        """The satellite facts are read once per hostname"""
+        assert hosts.resolve_sat_facts('sat1.example.com') == self.facts
+        assert hosts.resolve_sat_facts('sat1.example.com') == self.facts
+        assert hosts.resolve_sat_facts('sat2.example.com') == self.facts
+        assert read_sat_facts.call_args_list == [
+            mock.call('sat1.example.com'),
+            mock.call('sat2.example.com'),
+        ]
+
+    def test_resolve_shared_by_workers(self, read_sat_facts, monkeypatch):
+        """The satellite facts read by a xdist worker are used by the other workers"""
+        monkeypatch.setenv('PYTEST_XDIST_TESTRUNUID', 'run1')
+        assert hosts.resolve_sat_facts('sat1.example.com') == self.facts
+        # another worker process, with its own memory
+        monkeypatch.setattr(hosts, '_sat_facts', {})
+        assert hosts.resolve_sat_facts('sat1.example.com') == self.facts
+        read_sat_facts.assert_called_once_with('sat1.example.com')
+
+    @pytest.mark.parametrize('run_id', [None, 'run1'])
+    def test_resolve_unreachable(self, read_sat_facts, monkeypatch, run_id):
+        """An unreachable satellite is not stored, its facts are read again later"""
+        if run_id:
+            monkeypatch.setenv('PYTEST_XDIST_TESTRUNUID', run_id)
+        read_sat_facts.return_value = None
+        assert hosts.resolve_sat_facts('sat1.example.com') is None
+        assert hosts.resolve_sat_facts('sat1.example.com') is None
+        assert read_sat_facts.call_count == 2
+        read_sat_facts.return_value = self.facts
+        assert hosts.resolve_sat_facts('sat1.example.com') == self.facts
+        assert hosts.resolve_sat_facts('sat1.example.com') == self.facts
+        assert read_sat_facts.call_count == 3
+
+    @mock.patch('robottelo.hosts.resolve_sat_facts')
+    def test_get_sat_version(self, resolve_sat_facts):
+        resolve_sat_facts.return_value = self.facts
+        assert hosts.get_sat_version() == hosts.Version('6.11.0')
+        assert hosts.get_sat_rhel_version() == hosts.Version('7.9')
@@ -1,6 +1,11 @@
 """Tests for module ``robottelo.ssh``."""
+import subprocess
+import threading
 from unittest import mock
 
+import pytest
+from ssh2.error_codes import LIBSSH2_ERROR_EAGAIN
+
 from robottelo import ssh
 
 
@@ -39,6 +44,7 @@ class MockSSHClient:
         self.set_missing_host_key_policy_ = 0
         self.connect_ = 0
         self.close_ = 0
+        self.session = mock.MagicMock()
         # The tests look for these vars
         self.hostname = None
         self.username = None
@@ -101,3 +107,281 @@ class TestSSH:
 
         ret = ssh.command('ls -la')
         assert ret[1].cmd == 'ls -la'
+
+
+class MockPooledClient:
+    """A mock ``robottelo.hosts.ContentHost`` object counting its connections."""
+
+    def __init__(self, hostname, username, password):
+        self.hostname = hostname
+        self.username = username
+        self.password = password
+        self.connect_ = 0
+        self.close_ = 0
+        self.session = mock.MagicMock()
+
+    def connect(self):
+        self.connect_ += 1
+
+    def close(self):
+        self.close_ += 1
+
+
+class TestSSHConnectionPool:
+    """Tests for ``robottelo.ssh.SSHConnectionPool``."""
+
+    def test_reuse_connection(self):
+        pool = ssh.SSHConnectionPool(factory=MockPooledClient, idle_timeout=300)
+        client = pool.get('example.com', 'root', 'password')
+        assert pool.get('example.com', 'root', 'password') is client
+        assert pool.get('example.com', 'nobody', 'password') is not client
+        assert pool.get('other.example.com', 'root', 'password') is not client
+        assert pool.stats['hits'] == 1
+        assert pool.stats['misses'] == 3
+        assert len(pool) == 3
+
+    def test_connection_per_thread(self):
+        pool = ssh.SSHConnectionPool(factory=MockPooledClient, idle_timeout=300)
+        client = pool.get('example.com', 'root', 'password')
+        clients = []
+        thread = threading.Thread(
+            target=lambda: clients.append(pool.get('example.com', 'root', 'password'))
+        )
+        thread.start()
+        thread.join()
+        assert clients[0] is not client
+
+    @mock.patch('robottelo.ssh.time.monotonic')
+    def test_close_idle_connection(self, monotonic):
+        pool = ssh.SSHConnectionPool(factory=MockPooledClient, idle_timeout=300)
+        monotonic.return_value = 1000
+        client = pool.get('example.com', 'root', 'password')
+        monotonic.return_value = 1200
+        assert pool.get('example.com', 'root', 'password') is client
+        monotonic.return_value = 1501
+        assert pool.get('example.com', 'root', 'password') is not client
+        assert client.close_ == 1
+        assert pool.stats['evictions'] == 1
+
+    @mock.patch('robottelo.ssh.time.monotonic')
+    def test_keep_other_thread_connection(self, monotonic):
+        """A thread does not close the idle connections of the other running threads,
+        which may be running a long command, only the ones of the ended threads"""
+        pool = ssh.SSHConnectionPool(factory=MockPooledClient, idle_timeout=300)
+        monotonic.return_value = 1000
+        running, done = threading.Event(), threading.Event()
+        clients = []
+
+        def run():
+            clients.append(pool.get('example.com', 'root', 'password'))
+            running.set()
+            done.wait()
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        running.wait()
+        monotonic.return_value = 1501
+        pool.get('example.com', 'root', 'password')
+        assert clients[0].close_ == 0
+        done.set()
+        thread.join()
+        pool.get('example.com', 'root', 'password')
+        assert clients[0].close_ == 1
+        assert len(pool) == 1
+
+    @mock.patch('robottelo.ssh.time.monotonic')
+    def test_check_idle_connection(self, monotonic):
+        """A connection idle for a while is replaced if it was dropped, a connection
+        used by a long command is not idle"""
+        pool = ssh.SSHConnectionPool(factory=MockPooledClient, idle_timeout=300)
+        monotonic.return_value = 1000
+        client = pool.get('example.com', 'root', 'password')
+        monotonic.return_value = 1400
+        pool.release(client)
+        monotonic.return_value = 1410
+        assert pool.get('example.com', 'root', 'password') is client
+        assert client.connect_ == 0
+        monotonic.return_value = 1500
+        client.session.session.open_session.side_effect = ssh.SocketDisconnectError
+        assert pool.get('example.com', 'root', 'password') is client
+        assert client.connect_ == 1
+
+    def test_reconnect_and_close_all(self):
+        pool = ssh.SSHConnectionPool(factory=MockPooledClient, idle_timeout=300)
+        client = pool.get('example.com', 'root', 'password')
+        pool.reconnect(client)
+        assert client.connect_ == 1
+        assert pool.stats['reconnects'] == 1
+        pool.close_all()
+        assert client.close_ == 1
+        assert len(pool) == 0
+
+
+class TestBatch:
+    """Tests for the batched execution of ssh commands."""
+
+    commands = [
+        'echo out; echo err >&2',
+        'printf "no newline"',
+        'cd /tmp; exit 3',
+        'pwd',
+    ]
+
+    def run_script(self, stop_on_failure=False):
+        delimiter = ssh.batch_delimiter(self.commands)
+        script = ssh.batch_script(self.commands, delimiter, stop_on_failure=stop_on_failure)
+        output = subprocess.run(['bash', '-c', script], capture_output=True, text=True).stdout
+        return ssh.parse_batch_output(output, delimiter)
+
+    def test_batch_script(self):
+        results = self.run_script()
+        assert [(result.status, result.stdout, result.stderr) for result in results] == [
+            (0, 'out\n', (4, b'err\n')),
+            (0, 'no newline', (0, b'')),
+            (3, '', (0, b'')),
+            (0, subprocess.run('pwd', capture_output=True, text=True).stdout, (0, b'')),
+        ]
+
+    def test_batch_script_stop_on_failure(self):
+        results = self.run_script(stop_on_failure=True)
+        assert [result.status for result in results] == [0, 0, 3]
+
+    @mock.patch('robottelo.ssh.get_client')
+    def test_command_batch(self, get_client):
+        client = get_client.return_value
+        assert ssh.command_batch(self.commands, stop_on_failure=True) is (
+            client.execute_batch.return_value
+        )
+        client.execute_batch.assert_called_once_with(
+            self.commands, timeout=None, stop_on_failure=True
+        )
+
+
+class MockStreamChannel:
+    """A mock ssh2 channel returning chunks of output, then reaching end of file"""
+
+    def __init__(self, stdout, stderr, status=0):
+        self.stdout = list(stdout)
+        self.stderr = list(stderr)
+        self.status = status
+        self.closed = False
+        self.signals = []
+
+    def _read(self, chunks):
+        if chunks:
+            chunk = chunks.pop(0)
+            if chunk is None:
+                return LIBSSH2_ERROR_EAGAIN, b''
+            return len(chunk), chunk
+        return 0, b''
+
+    def read(self):
+        return self._read(self.stdout)
+
+    def read_stderr(self):
+        return self._read(self.stderr)
+
+    def execute(self, command):
+        self.command = command
+
+    def eof(self):
+        return not self.stdout and not self.stderr
+
+    def signal(self, name):
+        self.signals.append(name)
+
+    def close(self):
+        self.closed = True
+
+    def wait_closed(self):
+        pass
+
+    def get_exit_status(self):
+        return self.status
+
+
+class TestOutputStream:
+    """Tests for ``robottelo.ssh.OutputStream``."""
+
+    def test_stream_lines(self):
+        session = mock.Mock()
+        session.open_session.return_value = channel = MockStreamChannel(
+            [b'Installing pack', None, b'age\nDone\n', None, b'no newline'],
+            [None, b'warning\n'],
+            status=6,
+        )
+        stream = ssh.OutputStream(session, 'yum -y update', poll_interval=0)
+        assert list(stream) == [
+            ('stdout', 'Installing package'),
+            ('stdout', 'Done'),
+            ('stderr', 'warning'),
+            ('stdout', 'no newline'),
+        ]
+        assert channel.command == 'yum -y update'
+        assert stream.status == 6
+        assert channel.closed
+        assert session.set_blocking.call_args == mock.call(True)
+
+    @mock.patch('robottelo.ssh.time.monotonic')
+    def test_stream_timeout(self, monotonic):
+        session = mock.Mock()
+        session.open_session.return_value = channel = MockStreamChannel(
+            [b'start\n'] + [None] * 10, []
+        )
+        monotonic.side_effect = [1000, 1000, 1002]
+        stream = ssh.OutputStream(session, 'sleep 10', timeout='1s', poll_interval=0)
+        lines = iter(stream)
+        assert next(lines) == ('stdout', 'start')
+        with pytest.raises(TimeoutError):
+            next(lines)
+        assert channel.signals == ['TERM']
+        assert channel.closed
+
+
+class TestTransport:
+    """Tests for the recording and replay of the commands run on the hosts."""
+
+    @pytest.fixture(params=['recording.jsonl', 'recording.jsonl.gz'])
+    def path(self, request, tmp_path):
+        return tmp_path / request.param
+
+    def record(self, path, outputs):
+        host = mock.Mock(hostname='sat.example.com')
+        execute = mock.Mock(side_effect=outputs)
+        recorder = ssh.SSHRecorder(path)
+        for result in outputs:
+            assert recorder.execute(host, 'hostname', 10, execute) is result
+        execute.assert_called_with('hostname', timeout=10)
+
+    def test_replay(self, path):
+        """Repeated commands are replayed in order, the last result being kept"""
+        self.record(
+            path,
+            [
+                ssh.Result(status=0, stdout='first\n', stderr=(0, b'')),
+                ssh.Result(status=1, stdout='', stderr=(5, b'error')),
+            ],
+        )
+        replayer = ssh.SSHReplayer(path)
+        host = mock.Mock(hostname='sat.example.com')
+        execute = mock.Mock()
+        results = [replayer.execute(host, 'hostname', None, execute) for _ in range(3)]
+        assert [(result.status, result.stdout, result.stderr) for result in results] == [
+            (0, 'first\n', (0, b'')),
+            (1, '', (5, b'error')),
+            (1, '', (5, b'error')),
+        ]
+        assert not execute.called
+        # a recording can be replayed on another host, from its first result
+        other_host = mock.Mock(hostname='other.example.com')
+        assert replayer.execute(other_host, 'hostname', None, None).stdout == 'first\n'
+        assert replayer.execute(other_host, 'hostname', None, None).status == 1
+        with pytest.raises(ssh.SSHReplayError):
+            replayer.execute(host, 'uptime', None, execute)
+
+    @mock.patch('robottelo.ssh.time.sleep')
+    def test_replay_latency(self, sleep, path):
+        self.record(path, [ssh.Result(status=0, stdout='', stderr='')])
+        replayer = ssh.SSHReplayer(path, simulate_latency=True)
+        replayer.execute(mock.Mock(hostname='sat.example.com'), 'hostname', None, None)
+        assert sleep.called